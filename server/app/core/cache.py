@@ -1,16 +1,72 @@
 """
 Redis caching utilities for high-performance data access.
+
+Reads go through two tiers:
+
+- L1: a bounded in-process LRU of decoded values (entry count, encoded
+  bytes and a per-entry TTL of at most L1_CACHE_TTL_SECONDS)
+- L2: Redis, shared by every worker
+
+Deletes and pattern clears are broadcast over Redis pub/sub so every
+worker drops its L1 copies. Overwrites are not broadcast; a worker may
+serve its previous copy for up to L1_CACHE_TTL_SECONDS, which also bounds
+the effect of a missed invalidation message.
+
+The async routes read through the same L1 and codecs with a redis.asyncio
+client (the *_async functions), so a cache hit never leaves the event loop.
+
+Values are stored as one header byte (codec tag, compression flag) plus
+the codec's payload:
+
+- "packed": 1-D numpy arrays, or tuples of them, as raw little-endian
+  buffers (int64 IDs that fit are narrowed to int32); decoded zero-copy
+  into read-only arrays
+- "msgpack": general objects (when msgpack is installed)
+- "json": general objects
+
+Payloads of at least CACHE_COMPRESS_MIN_BYTES are zlib-compressed when
+that makes them smaller. json.dumps never emits a tag byte first, so
+untagged JSON written before the codec layer still decodes.
+
+get_or_compute protects expensive keys from stampedes:
+
+- request coalescing: one computation per key runs at a time. Callers in
+  the same process wait for it (single-flight); other processes see the
+  key's Redis lock and poll for the result.
+- stale-while-revalidate: entries store the time they stop being fresh
+  and live CACHE_STALE_GRACE_SECONDS longer in Redis. Within that grace
+  window the expired value is still served while one background refresh
+  recomputes it.
 """
+import asyncio
+import fnmatch
 import json
 import logging
-from typing import Any, Optional, Callable
+import struct
+import threading
+import time
+import uuid
+import zlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Dict, Iterable, List, Optional, Callable, Tuple
 from functools import wraps
 import hashlib
 
+import numpy as np
+
+from .config import settings
+
 logger = logging.getLogger(__name__)
 
-# Redis client will be initialized in main.py
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - msgpack is listed in requirements.txt
+    msgpack = None
+
+# Redis clients will be initialized in main.py (the asyncio one serves the async routes)
 redis_client = None
+async_redis_client = None
 
 
 def init_redis(redis_url: str = None):
@@ -23,7 +79,8 @@ def init_redis(redis_url: str = None):
     
     try:
         import redis
-        redis_client = redis.from_url(redis_url, decode_responses=True)
+        # Values are binary (see encode_value)
+        redis_client = redis.from_url(redis_url)
         redis_client.ping()
         logger.info("Redis connection established")
         return redis_client
@@ -35,15 +92,292 @@ def init_redis(redis_url: str = None):
         return None
 
 
-def get_cache(key: str) -> Optional[Any]:
-    """Get value from cache"""
+async def init_async_redis(redis_url: str = None):
+    """Initialize the redis.asyncio connection pool (on the serving event loop)"""
+    global async_redis_client
+    
+    if not redis_url:
+        return None
+    
+    try:
+        import redis.asyncio as aioredis
+        client = aioredis.from_url(redis_url)
+        await client.ping()
+        async_redis_client = client
+        logger.info("Async Redis connection established")
+        return async_redis_client
+    except ImportError:
+        logger.warning("Redis package not installed, async caching disabled")
+        return None
+    except Exception as e:
+        logger.error(f"Failed to connect to Redis (async): {e}")
+        return None
+
+
+async def close_async_redis():
+    global async_redis_client
+    
+    if async_redis_client is not None:
+        await async_redis_client.aclose()
+        async_redis_client = None
+
+
+class LocalCache:
+    """
+    Bounded in-process LRU of decoded cache values (the L1 in front of Redis).
+    
+    Bounded by entry count and by the encoded size of the values; each
+    entry expires after its own TTL. Values are shared between callers and
+    must be treated as read-only.
+    """
+    
+    def __init__(self, max_entries: int, max_bytes: int, ttl: int):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        # key -> (value, expires at (monotonic), encoded size)
+        self._entries: "OrderedDict[str, Tuple[Any, float, int]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def get(self, key: str) -> Tuple[bool, Any]:
+        """(True, value) on a live hit, (False, None) otherwise"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return True, entry[0]
+            if entry is not None:
+                self._remove(key)
+            self.misses += 1
+            return False, None
+    
+    def set(self, key: str, value: Any, size: int, ttl: Optional[int] = None):
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        if ttl <= 0 or size > self.max_bytes // 8:
+            return  # one large value shouldn't flush the whole cache
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, time.monotonic() + ttl, size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+    
+    def _remove(self, key: str):
+        self._bytes -= self._entries.pop(key)[2]
+    
+    def delete(self, key: str):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+    
+    def delete_pattern(self, pattern: str):
+        """Drop the keys matching a Redis glob pattern"""
+        with self._lock:
+            for key in [key for key in self._entries if fnmatch.fnmatchcase(key, pattern)]:
+                self._remove(key)
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+    
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+            'entries': len(self._entries),
+            'bytes': self._bytes,
+            'evictions': self.evictions,
+        }
+
+
+local_cache: Optional[LocalCache] = (
+    LocalCache(settings.L1_CACHE_MAX_ENTRIES, settings.L1_CACHE_MAX_BYTES, settings.L1_CACHE_TTL_SECONDS)
+    if settings.L1_CACHE_ENABLED else None
+)
+
+# Redis lookups (L1 misses)
+_l2_stats = {'hits': 0, 'misses': 0}
+_l2_stats_lock = threading.Lock()
+
+
+def cache_stats() -> Dict[str, Any]:
+    """L1 and L2 hit ratios; the L2 ratio counts only lookups that missed L1"""
+    with _l2_stats_lock:
+        l2 = dict(_l2_stats)
+    lookups = l2['hits'] + l2['misses']
+    l2['hit_ratio'] = round(l2['hits'] / lookups, 4) if lookups else 0.0
+    return {
+        'l1': local_cache.stats() if local_cache is not None else None,
+        'l2': l2,
+    }
+
+
+class JsonCodec:
+    """General objects as JSON text"""
+    
+    name = "json"
+    tag = 0x01
+    
+    def encode(self, value: Any) -> bytes:
+        return json.dumps(value).encode()
+    
+    def decode(self, payload: bytes) -> Any:
+        return json.loads(payload)
+
+
+class MsgpackCodec:
+    """General objects as msgpack (tuples decode as lists, as with JSON)"""
+    
+    name = "msgpack"
+    tag = 0x02
+    
+    def encode(self, value: Any) -> bytes:
+        return msgpack.packb(value, use_bin_type=True)
+    
+    def decode(self, payload: bytes) -> Any:
+        return msgpack.unpackb(payload, raw=False, strict_map_key=False)
+
+
+class PackedArraysCodec:
+    """
+    1-D numeric numpy arrays, or a tuple of them such as (product ids, scores).
+    
+    Layout: array count (0 = one bare array), then per array a dtype code,
+    its length (uint32) and the raw little-endian values.
+    """
+    
+    name = "packed"
+    tag = 0x03
+    _DTYPES = {b'i': np.dtype('<i4'), b'q': np.dtype('<i8'), b'f': np.dtype('<f4'), b'd': np.dtype('<f8')}
+    _CODES = {dtype: code for code, dtype in _DTYPES.items()}
+    
+    @staticmethod
+    def handles(value: Any) -> bool:
+        arrays = value if isinstance(value, tuple) else (value,)
+        return 0 < len(arrays) < 256 and all(
+            isinstance(a, np.ndarray) and a.ndim == 1 and a.dtype.kind in "iuf" for a in arrays
+        )
+    
+    def _pack(self, array: np.ndarray) -> bytes:
+        if array.dtype.kind in "iu":
+            narrow = len(array) == 0 or (array.min() >= -2 ** 31 and array.max() < 2 ** 31)
+            array = array.astype('<i4' if narrow else '<i8', copy=False)
+        else:
+            array = array.astype('<f4' if array.dtype.itemsize <= 4 else '<f8', copy=False)
+        return self._CODES[array.dtype] + struct.pack('<I', len(array)) + array.tobytes()
+    
+    def encode(self, value: Any) -> bytes:
+        arrays = value if isinstance(value, tuple) else (value,)
+        count = len(arrays) if isinstance(value, tuple) else 0
+        return bytes([count]) + b''.join(self._pack(a) for a in arrays)
+    
+    def decode(self, payload: bytes) -> Any:
+        count = payload[0]
+        offset = 1
+        arrays = []
+        for _ in range(max(count, 1)):
+            dtype = self._DTYPES[payload[offset:offset + 1]]
+            length = struct.unpack_from('<I', payload, offset + 1)[0]
+            offset += 5
+            arrays.append(np.frombuffer(payload, dtype=dtype, count=length, offset=offset))
+            offset += length * dtype.itemsize
+        return tuple(arrays) if count else arrays[0]
+
+
+# Header byte: codec tag, plus this bit when the payload is zlib-compressed.
+# Tags stay below 0x20, which JSON text never starts with.
+_COMPRESSED = 0x10
+
+_codecs_by_tag: Dict[int, Any] = {}
+_codecs_by_name: Dict[str, Any] = {}
+
+
+def register_codec(codec):
+    """Make a codec (name, tag < 0x10, encode, decode) available for reading and CACHE_CODEC"""
+    if not 0 < codec.tag < _COMPRESSED:
+        raise ValueError(f"Codec tag must be between 1 and {_COMPRESSED - 1}")
+    _codecs_by_tag[codec.tag] = codec
+    _codecs_by_name[codec.name] = codec
+
+
+register_codec(JsonCodec())
+register_codec(PackedArraysCodec())
+if msgpack is not None:
+    register_codec(MsgpackCodec())
+
+_packed_codec = _codecs_by_name["packed"]
+
+
+def _general_codec():
+    codec = _codecs_by_name.get(settings.CACHE_CODEC)
+    if codec is None:
+        logger.warning(f"Cache codec {settings.CACHE_CODEC!r} unavailable, using json")
+        codec = _codecs_by_name[settings.CACHE_CODEC] = _codecs_by_name["json"]
+    return codec
+
+
+def encode_value(value: Any) -> bytes:
+    """Header byte + payload: packed for numeric arrays, CACHE_CODEC otherwise"""
+    codec = _packed_codec if PackedArraysCodec.handles(value) else _general_codec()
+    payload = codec.encode(value)
+    header = codec.tag
+    if settings.CACHE_COMPRESS_MIN_BYTES and len(payload) >= settings.CACHE_COMPRESS_MIN_BYTES:
+        compressed = zlib.compress(payload, settings.CACHE_COMPRESS_LEVEL)
+        if len(compressed) < len(payload):
+            payload = compressed
+            header |= _COMPRESSED
+    return bytes([header]) + payload
+
+
+def decode_value(raw: bytes) -> Any:
+    """Inverse of encode_value; untagged values are read as JSON"""
+    if isinstance(raw, str):
+        return json.loads(raw)
+    header = raw[0]
+    if header >= 0x20:
+        return json.loads(raw)
+    payload = raw[1:]
+    if header & _COMPRESSED:
+        payload = zlib.decompress(payload)
+    return _codecs_by_tag[header & ~_COMPRESSED].decode(payload)
+
+
+def get_cache(key: str, use_local: bool = True) -> Optional[Any]:
+    """
+    Get value from cache (L1, then Redis).
+    
+    Args:
+        key: Cache key
+        use_local: False reads Redis even if L1 holds the key (the result
+            still refreshes L1)
+    """
     if not redis_client:
         return None
     
+    if use_local and local_cache is not None:
+        found, value = local_cache.get(key)
+        if found:
+            return value
+    
     try:
-        value = redis_client.get(key)
-        if value:
-            return json.loads(value)
+        raw = redis_client.get(key)
+        with _l2_stats_lock:
+            _l2_stats['hits' if raw else 'misses'] += 1
+        if raw:
+            value = decode_value(raw)
+            if local_cache is not None:
+                local_cache.set(key, value, len(raw))
+            return value
         return None
     except Exception as e:
         logger.error(f"Cache get error for key {key}: {e}")
@@ -56,41 +390,380 @@ def set_cache(key: str, value: Any, ttl: int = 300) -> bool:
         return False
     
     try:
-        redis_client.setex(key, ttl, json.dumps(value))
+        raw = encode_value(value)
+        redis_client.setex(key, ttl, raw)
+        if local_cache is not None:
+            local_cache.set(key, value, len(raw), ttl)
         return True
     except Exception as e:
         logger.error(f"Cache set error for key {key}: {e}")
         return False
 
 
+async def get_cache_async(key: str, use_local: bool = True) -> Optional[Any]:
+    """get_cache over redis.asyncio; shares L1 and the codecs with the sync client"""
+    if async_redis_client is None:
+        return None
+    
+    if use_local and local_cache is not None:
+        found, value = local_cache.get(key)
+        if found:
+            return value
+    
+    try:
+        raw = await async_redis_client.get(key)
+        with _l2_stats_lock:
+            _l2_stats['hits' if raw else 'misses'] += 1
+        if raw:
+            value = decode_value(raw)
+            if local_cache is not None:
+                local_cache.set(key, value, len(raw))
+            return value
+        return None
+    except Exception as e:
+        logger.error(f"Cache get error for key {key}: {e}")
+        return None
+
+
+def mget_cache(keys: List[str], use_local: bool = True, chunk_size: Optional[int] = None) -> List[Optional[Any]]:
+    """
+    Get many values: L1 first, then one MGET round trip per chunk of the rest.
+    
+    Returns:
+        Values aligned to keys (None for misses)
+    """
+    values: List[Optional[Any]] = [None] * len(keys)
+    if not redis_client or not keys:
+        return values
+    
+    missing = []
+    for i, key in enumerate(keys):
+        found = False
+        if use_local and local_cache is not None:
+            found, values[i] = local_cache.get(key)
+        if not found:
+            missing.append(i)
+    
+    chunk_size = chunk_size or settings.CACHE_PIPELINE_CHUNK_SIZE
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        for start in range(0, len(missing), chunk_size):
+            chunk = missing[start:start + chunk_size]
+            pipe.mget([keys[i] for i in chunk])
+            raws = pipe.execute()[0]
+            hits = 0
+            for i, raw in zip(chunk, raws):
+                if raw:
+                    hits += 1
+                    values[i] = decode_value(raw)
+                    if local_cache is not None:
+                        local_cache.set(keys[i], values[i], len(raw))
+            with _l2_stats_lock:
+                _l2_stats['hits'] += hits
+                _l2_stats['misses'] += len(chunk) - hits
+    except Exception as e:
+        logger.error(f"Cache bulk get error for {len(keys)} keys: {e}")
+    return values
+
+
+def mset_cache(
+    mapping: Dict[str, Any],
+    ttl: int = 300,
+    ttls: Optional[Dict[str, int]] = None,
+    chunk_size: Optional[int] = None
+) -> bool:
+    """
+    Set many values with one pipelined round trip per chunk.
+    
+    Args:
+        mapping: Key -> value
+        ttl: TTL of keys without an entry in ttls
+        ttls: Per-key TTLs
+        chunk_size: SETEX commands per round trip (None = CACHE_PIPELINE_CHUNK_SIZE)
+    """
+    if not redis_client:
+        return False
+    
+    chunk_size = chunk_size or settings.CACHE_PIPELINE_CHUNK_SIZE
+    ttls = ttls or {}
+    try:
+        items = list(mapping.items())
+        pipe = redis_client.pipeline(transaction=False)
+        for start in range(0, len(items), chunk_size):
+            for key, value in items[start:start + chunk_size]:
+                raw = encode_value(value)
+                key_ttl = ttls.get(key, ttl)
+                pipe.setex(key, key_ttl, raw)
+                if local_cache is not None:
+                    local_cache.set(key, value, len(raw), key_ttl)
+            pipe.execute()
+        return True
+    except Exception as e:
+        logger.error(f"Cache bulk set error for {len(mapping)} keys: {e}")
+        return False
+
+
+def set_hash(key: str, mapping: Dict[str, Any], ttl: int = 300, chunk_size: int = 1000) -> bool:
+    """Write a hash (encoded field values) in pipelined chunks and set its TTL"""
+    if not redis_client:
+        return False
+    
+    try:
+        items = list(mapping.items())
+        pipe = redis_client.pipeline(transaction=False)
+        for start in range(0, len(items), chunk_size):
+            pipe.hset(key, mapping={field: encode_value(value) for field, value in items[start:start + chunk_size]})
+            pipe.execute()
+        redis_client.expire(key, ttl)
+        return True
+    except Exception as e:
+        logger.error(f"Cache hash set error for key {key}: {e}")
+        return False
+
+
+def get_hash_field(key: str, field: str) -> Optional[Any]:
+    """Get one field of a hash"""
+    if not redis_client:
+        return None
+    
+    try:
+        value = redis_client.hget(key, field)
+        if value:
+            return decode_value(value)
+        return None
+    except Exception as e:
+        logger.error(f"Cache hash get error for key {key}: {e}")
+        return None
+
+
 def delete_cache(key: str) -> bool:
-    """Delete value from cache"""
+    """Delete value from cache, including every worker's L1 copy"""
     if not redis_client:
         return False
     
+    if local_cache is not None:
+        local_cache.delete(key)
     try:
         redis_client.delete(key)
+        publish_invalidation(keys=[key])
         return True
     except Exception as e:
         logger.error(f"Cache delete error for key {key}: {e}")
         return False
 
 
-def clear_pattern(pattern: str) -> int:
-    """Clear all keys matching pattern"""
-    if not redis_client:
+def mdelete_cache(keys: List[str]) -> int:
+    """Delete many values in one round trip, including every worker's L1 copies"""
+    if not redis_client or not keys:
         return 0
     
+    if local_cache is not None:
+        for key in keys:
+            local_cache.delete(key)
     try:
-        keys = redis_client.keys(pattern)
-        if keys:
-            return redis_client.delete(*keys)
+        deleted = redis_client.delete(*keys)
+        publish_invalidation(keys=keys)
+        return deleted
+    except Exception as e:
+        logger.error(f"Cache bulk delete error for {len(keys)} keys: {e}")
         return 0
+
+
+def clear_pattern(pattern: str, count: Optional[int] = None) -> int:
+    """
+    Sweep all keys matching pattern, including every worker's L1 copies.
+    
+    Walks the keyspace with incremental SCAN and unlinks each batch, so
+    Redis is never blocked for the whole keyspace as with KEYS. Routine
+    invalidation bumps a namespace generation instead (see CacheManager).
+    """
+    if not redis_client:
+        return 0
+    
+    count = count or settings.CACHE_PIPELINE_CHUNK_SIZE
+    if local_cache is not None:
+        local_cache.delete_pattern(pattern)
+    try:
+        publish_invalidation(patterns=[pattern])
+        deleted = 0
+        batch = []
+        for key in redis_client.scan_iter(match=pattern, count=count):
+            batch.append(key)
+            if len(batch) >= count:
+                deleted += redis_client.unlink(*batch)
+                batch = []
+        if batch:
+            deleted += redis_client.unlink(*batch)
+        return deleted
     except Exception as e:
         logger.error(f"Cache clear error for pattern {pattern}: {e}")
         return 0
 
 
+def get_generations(namespaces: List[str]) -> List[int]:
+    """
+    Current generation of each namespace (0 if never bumped).
+    
+    Generations are read through L1; bumps are broadcast like deletes, so
+    other workers see a new generation right away.
+    """
+    generations = [0] * len(namespaces)
+    if not redis_client or not namespaces:
+        return generations
+    
+    keys = [f"{CacheManager.PREFIX_GENERATION}:{namespace}" for namespace in namespaces]
+    missing = []
+    for i, key in enumerate(keys):
+        found = False
+        if local_cache is not None:
+            found, generation = local_cache.get(key)
+            if found:
+                generations[i] = generation
+        if not found:
+            missing.append(i)
+    
+    chunk_size = settings.CACHE_PIPELINE_CHUNK_SIZE
+    try:
+        for start in range(0, len(missing), chunk_size):
+            chunk = missing[start:start + chunk_size]
+            for i, raw in zip(chunk, redis_client.mget([keys[i] for i in chunk])):
+                generations[i] = int(raw) if raw else 0
+                if local_cache is not None:
+                    local_cache.set(keys[i], generations[i], 8)
+    except Exception as e:
+        logger.error(f"Cache generation read error: {e}")
+    return generations
+
+
+async def get_generations_async(namespaces: List[str]) -> List[int]:
+    """get_generations over redis.asyncio"""
+    generations = [0] * len(namespaces)
+    if async_redis_client is None or not namespaces:
+        return generations
+    
+    keys = [f"{CacheManager.PREFIX_GENERATION}:{namespace}" for namespace in namespaces]
+    missing = []
+    for i, key in enumerate(keys):
+        found = False
+        if local_cache is not None:
+            found, generation = local_cache.get(key)
+            if found:
+                generations[i] = generation
+        if not found:
+            missing.append(i)
+    
+    chunk_size = settings.CACHE_PIPELINE_CHUNK_SIZE
+    try:
+        for start in range(0, len(missing), chunk_size):
+            chunk = missing[start:start + chunk_size]
+            for i, raw in zip(chunk, await async_redis_client.mget([keys[i] for i in chunk])):
+                generations[i] = int(raw) if raw else 0
+                if local_cache is not None:
+                    local_cache.set(keys[i], generations[i], 8)
+    except Exception as e:
+        logger.error(f"Cache generation read error: {e}")
+    return generations
+
+
+def get_generation(namespace: str) -> int:
+    return get_generations([namespace])[0]
+
+
+def bump_generations(namespaces: List[str]) -> List[int]:
+    """
+    Increment namespace generations, orphaning every key built with the old
+    ones; orphaned entries are never read again and expire by their TTL.
+    
+    Returns:
+        The new generations (empty if Redis is unavailable)
+    """
+    if not redis_client or not namespaces:
+        return []
+    
+    keys = [f"{CacheManager.PREFIX_GENERATION}:{namespace}" for namespace in namespaces]
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        for key in keys:
+            pipe.incr(key)
+            # Outlive every key embedding the generation, or it would restart at 0
+            pipe.expire(key, settings.CACHE_GENERATION_TTL)
+        generations = [int(g) for g in pipe.execute()[::2]]
+        if local_cache is not None:
+            for key, generation in zip(keys, generations):
+                local_cache.set(key, generation, 8)
+        publish_invalidation(keys=keys)
+        return generations
+    except Exception as e:
+        logger.error(f"Cache generation bump error: {e}")
+        return []
+
+
+# Identifies this process's own invalidation messages
+_INSTANCE_ID = uuid.uuid4().hex
+_invalidation_thread = None
+
+
+def publish_invalidation(keys: Iterable[str] = (), patterns: Iterable[str] = ()):
+    """Tell the other workers to drop keys / patterns from their L1"""
+    if not redis_client or local_cache is None:
+        return
+    
+    message = {'origin': _INSTANCE_ID, 'keys': list(keys), 'patterns': list(patterns)}
+    try:
+        redis_client.publish(settings.CACHE_INVALIDATION_CHANNEL, json.dumps(message))
+    except Exception as e:
+        logger.error(f"Cache invalidation publish error: {e}")
+
+
+def _on_invalidation(message: Dict[str, Any]):
+    try:
+        data = json.loads(message['data'])
+    except (TypeError, ValueError):
+        return
+    if data.get('origin') == _INSTANCE_ID:
+        return  # already applied locally
+    for key in data.get('keys', []):
+        local_cache.delete(key)
+    for pattern in data.get('patterns', []):
+        local_cache.delete_pattern(pattern)
+
+
+def _on_invalidation_error(error: Exception, pubsub, thread):
+    # Messages may have been lost while disconnected: start L1 over
+    logger.warning(f"Cache invalidation listener error, clearing L1: {error}")
+    local_cache.clear()
+    time.sleep(1.0)
+
+
+def start_invalidation_listener():
+    """Subscribe this worker's L1 to invalidations from the other workers"""
+    global _invalidation_thread
+    
+    if not redis_client or local_cache is None or _invalidation_thread is not None:
+        return None
+    
+    try:
+        pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(**{settings.CACHE_INVALIDATION_CHANNEL: _on_invalidation})
+        _invalidation_thread = pubsub.run_in_thread(
+            sleep_time=1.0, daemon=True, exception_handler=_on_invalidation_error
+        )
+        logger.info("L1 cache invalidation listener started")
+        return _invalidation_thread
+    except Exception as e:
+        logger.error(f"Failed to start cache invalidation listener, disabling L1: {e}")
+        local_cache.clear()
+        return None
+
+
+def stop_invalidation_listener():
+    global _invalidation_thread
+    
+    if _invalidation_thread is not None:
+        _invalidation_thread.stop()
+        _invalidation_thread = None
+
+
 def cache_key(*args, **kwargs) -> str:
     """Generate cache key from arguments"""
     key_parts = [str(arg) for arg in args]
@@ -99,10 +772,360 @@ def cache_key(*args, **kwargs) -> str:
     return hashlib.md5(key_string.encode()).hexdigest()
 
 
-def cached(ttl: int = 300, key_prefix: str = ""):
+# Stale-while-revalidate entries: {"value": ..., "_fresh_until": unix time}
+_FRESH_UNTIL = "_fresh_until"
+
+
+def get_cache_entry(key: str, use_local: bool = True) -> Tuple[Optional[Any], bool]:
+    """
+    Get a value written by set_cache_entry (or set_cache) and whether it is fresh.
+    
+    Returns:
+        (value, fresh); (None, False) on a miss. Plain set_cache values
+        count as fresh until their TTL removes them.
+    """
+    data = get_cache(key, use_local)
+    if isinstance(data, dict) and _FRESH_UNTIL in data:
+        return data.get("value"), time.time() < data[_FRESH_UNTIL]
+    return data, data is not None
+
+
+async def get_cache_entry_async(key: str, use_local: bool = True) -> Tuple[Optional[Any], bool]:
+    """get_cache_entry over redis.asyncio"""
+    data = await get_cache_async(key, use_local)
+    if isinstance(data, dict) and _FRESH_UNTIL in data:
+        return data.get("value"), time.time() < data[_FRESH_UNTIL]
+    return data, data is not None
+
+
+def set_cache_entry(key: str, value: Any, ttl: int = 300, grace: Optional[int] = None) -> bool:
+    """Cache a value that is fresh for ttl seconds and servable as stale for grace more"""
+    grace = settings.CACHE_STALE_GRACE_SECONDS if grace is None else grace
+    return set_cache(key, {"value": value, _FRESH_UNTIL: time.time() + ttl}, ttl + grace)
+
+
+def mget_cache_entries(keys: List[str]) -> List[Tuple[Optional[Any], bool]]:
+    """get_cache_entry for many keys, read with mget_cache"""
+    entries = []
+    now = time.time()
+    for data in mget_cache(keys):
+        if isinstance(data, dict) and _FRESH_UNTIL in data:
+            entries.append((data.get("value"), now < data[_FRESH_UNTIL]))
+        else:
+            entries.append((data, data is not None))
+    return entries
+
+
+def mset_cache_entries(mapping: Dict[str, Any], ttl: int = 300, grace: Optional[int] = None) -> bool:
+    """set_cache_entry for many keys, written with mset_cache"""
+    grace = settings.CACHE_STALE_GRACE_SECONDS if grace is None else grace
+    fresh_until = time.time() + ttl
+    return mset_cache(
+        {key: {"value": value, _FRESH_UNTIL: fresh_until} for key, value in mapping.items()}, ttl + grace
+    )
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls per key within this process: the first
+    caller runs the function, later callers wait for and share its result
+    (or its exception).
+    """
+    
+    class _Call:
+        def __init__(self):
+            self.done = threading.Event()
+            self.result = None
+            self.error: Optional[BaseException] = None
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[str, "SingleFlight._Call"] = {}
+    
+    def do(self, key: str, func: Callable[[], Any]) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = SingleFlight._Call()
+        
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        
+        try:
+            call.result = func()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+
+class AsyncSingleFlight:
+    """SingleFlight for coroutines running on one event loop"""
+    
+    def __init__(self):
+        self._calls: Dict[str, asyncio.Future] = {}
+    
+    async def do(self, key: str, func: Callable[[], Awaitable[Any]]) -> Any:
+        future = self._calls.get(key)
+        if future is not None:
+            return await asyncio.shield(future)
+        
+        future = self._calls[key] = asyncio.get_running_loop().create_future()
+        try:
+            result = await func()
+            future.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # waiters re-raise it; don't warn if there were none
+            raise
+        finally:
+            del self._calls[key]
+
+
+single_flight = SingleFlight()
+async_single_flight = AsyncSingleFlight()
+
+_refresh_executor: Optional[ThreadPoolExecutor] = None
+_refreshing = set()
+_refreshing_lock = threading.Lock()
+# Background refreshes of get_or_compute_async; the loop only keeps weak references to tasks
+_refresh_tasks = set()
+
+
+def refresh_in_background(key: str, func: Callable[[], Any]) -> bool:
+    """
+    Run func on the refresh pool unless a refresh of key is already pending.
+    
+    The refresh goes through single_flight, so it never overlaps a
+    foreground computation of the same key.
+    
+    Returns:
+        True if a refresh was scheduled
+    """
+    global _refresh_executor
+    
+    with _refreshing_lock:
+        if key in _refreshing:
+            return False
+        _refreshing.add(key)
+        if _refresh_executor is None:
+            _refresh_executor = ThreadPoolExecutor(
+                max_workers=settings.CACHE_REFRESH_WORKERS, thread_name_prefix="cache-refresh"
+            )
+    
+    def run():
+        try:
+            single_flight.do(key, func)
+        except Exception as e:
+            logger.error(f"Background refresh failed for key {key}: {e}", exc_info=True)
+        finally:
+            with _refreshing_lock:
+                _refreshing.discard(key)
+    
+    _refresh_executor.submit(run)
+    return True
+
+
+def _acquire_lock(key: str) -> Optional[str]:
+    """Take key's recompute lock across processes; a token, "" without Redis, None if held"""
+    if not redis_client:
+        return ""
+    
+    token = uuid.uuid4().hex
+    try:
+        if redis_client.set(f"lock:{key}", token, nx=True, ex=settings.CACHE_LOCK_SECONDS):
+            return token
+        return None
+    except Exception as e:
+        logger.error(f"Cache lock error for key {key}: {e}")
+        return ""
+
+
+def _release_lock(key: str, token: str):
+    if not token:
+        return
+    try:
+        # Only release our own lock (it may have expired and been retaken)
+        if redis_client.get(f"lock:{key}") == token.encode():
+            redis_client.delete(f"lock:{key}")
+    except Exception as e:
+        logger.error(f"Cache unlock error for key {key}: {e}")
+
+
+def _compute_and_store(
+    key: str,
+    compute: Callable[[], Any],
+    ttl: int,
+    grace: int,
+    wait: bool,
+    validate: Optional[Callable[[Any], bool]] = None
+) -> Any:
+    """
+    Compute key under its Redis lock and cache the result.
+    
+    If another process holds the lock, either wait (up to
+    CACHE_LOCK_WAIT_SECONDS) for its fresh result, or with wait=False
+    return None and leave the refresh to it.
+    """
+    if not wait:
+        # Another worker may have refreshed it already (this one read a stale L1 copy)
+        value, fresh = get_cache_entry(key, use_local=False)
+        if value is not None and fresh and (validate is None or validate(value)):
+            return value
+    
+    token = _acquire_lock(key)
+    if token is None:
+        if not wait:
+            return None
+        deadline = time.monotonic() + settings.CACHE_LOCK_WAIT_SECONDS
+        while time.monotonic() < deadline:
+            time.sleep(0.02)
+            value, fresh = get_cache_entry(key, use_local=False)
+            if value is not None and fresh and (validate is None or validate(value)):
+                return value
+        logger.warning(f"Timed out waiting for the holder of {key}, computing it here")
+    
+    try:
+        value = compute()
+        if value is not None:
+            set_cache_entry(key, value, ttl, grace)
+        return value
+    finally:
+        _release_lock(key, token)
+
+
+def get_or_compute(
+    key: str,
+    compute: Callable[[], Any],
+    ttl: int = 300,
+    grace: Optional[int] = None,
+    refresh: Optional[Callable[[], Any]] = None,
+    validate: Optional[Callable[[Any], bool]] = None
+) -> Any:
+    """
+    Cached value of key, computed at most once at a time.
+    
+    Args:
+        key: Cache key
+        compute: Produces the value on a miss (None results are not cached)
+        ttl: Seconds the value stays fresh
+        grace: Seconds an expired value is still served while it is
+            refreshed in the background (None = CACHE_STALE_GRACE_SECONDS)
+        refresh: Background replacement for compute, for when compute
+            captures request-scoped resources such as a DB session
+        validate: Cached values failing this check count as misses
+    
+    Returns:
+        The fresh, stale or newly computed value
+    """
+    grace = settings.CACHE_STALE_GRACE_SECONDS if grace is None else grace
+    
+    value, fresh = get_cache_entry(key)
+    if value is not None and (validate is None or validate(value)):
+        if fresh:
+            return value
+        # Still inside the grace window, or Redis would have dropped it
+        refresh_in_background(
+            key, lambda: _compute_and_store(key, refresh or compute, ttl, grace, wait=False)
+        )
+        logger.debug(f"Serving stale value for {key} while it refreshes")
+        return value
+    
+    value = single_flight.do(key, lambda: _compute_and_store(key, compute, ttl, grace, True, validate))
+    if value is None:
+        # Joined a background refresh that left the work to another process
+        value = _compute_and_store(key, compute, ttl, grace, True, validate)
+    return value
+
+
+async def get_or_compute_async(
+    key: str,
+    compute: Callable[[], Awaitable[Any]],
+    ttl: int = 300,
+    grace: Optional[int] = None
+) -> Any:
+    """
+    get_or_compute for coroutine functions; the refresh runs as a task on the same loop.
+    
+    Redis calls go through the sync client on worker threads (asyncio.to_thread),
+    so they share L1, the codecs and the recompute lock with get_or_compute
+    without blocking the event loop.
+    """
+    grace = settings.CACHE_STALE_GRACE_SECONDS if grace is None else grace
+    
+    async def compute_and_store(wait: bool) -> Any:
+        if not wait:
+            value, fresh = await asyncio.to_thread(get_cache_entry, key, False)
+            if value is not None and fresh:
+                return value
+        token = await asyncio.to_thread(_acquire_lock, key)
+        if token is None:
+            if not wait:
+                return None
+            deadline = time.monotonic() + settings.CACHE_LOCK_WAIT_SECONDS
+            while time.monotonic() < deadline:
+                await asyncio.sleep(0.02)
+                value, fresh = await asyncio.to_thread(get_cache_entry, key, False)
+                if value is not None and fresh:
+                    return value
+            logger.warning(f"Timed out waiting for the holder of {key}, computing it here")
+        try:
+            value = await compute()
+            if value is not None:
+                await asyncio.to_thread(set_cache_entry, key, value, ttl, grace)
+            return value
+        finally:
+            await asyncio.to_thread(_release_lock, key, token)
+    
+    async def refresh():
+        try:
+            await async_single_flight.do(key, lambda: compute_and_store(wait=False))
+        except Exception as e:
+            logger.error(f"Background refresh failed for key {key}: {e}", exc_info=True)
+        finally:
+            with _refreshing_lock:
+                _refreshing.discard(key)
+    
+    value, fresh = await asyncio.to_thread(get_cache_entry, key)
+    if value is not None:
+        if fresh:
+            return value
+        with _refreshing_lock:
+            scheduled = key not in _refreshing
+            _refreshing.add(key)
+        if scheduled:
+            task = asyncio.ensure_future(refresh())
+            _refresh_tasks.add(task)
+            task.add_done_callback(_refresh_tasks.discard)
+        return value
+    
+    value = await async_single_flight.do(key, lambda: compute_and_store(wait=True))
+    if value is None:
+        # Joined a background refresh that left the work to another process
+        value = await compute_and_store(wait=True)
+    return value
+
+
+def cached(ttl: int = 300, key_prefix: str = "", grace: Optional[int] = None):
     """
     Decorator for caching function results.
     
+    Concurrent misses of one key run the function once, and an expired
+    result is served for `grace` seconds while one call refreshes it
+    (see get_or_compute).
+    
     Usage:
         @cached(ttl=600, key_prefix="recommendations")
         def get_recommendations(user_id: int):
@@ -113,41 +1136,13 @@ def cached(ttl: int = 300, key_prefix: str = ""):
         async def async_wrapper(*args, **kwargs):
             # Generate cache key
             key = f"{key_prefix}:{func.__name__}:{cache_key(*args, **kwargs)}"
-            
-            # Try to get from cache
-            cached_value = get_cache(key)
-            if cached_value is not None:
-                logger.debug(f"Cache hit for {key}")
-                return cached_value
-            
-            # Execute function
-            logger.debug(f"Cache miss for {key}")
-            result = await func(*args, **kwargs)
-            
-            # Store in cache
-            set_cache(key, result, ttl)
-            
-            return result
+            return await get_or_compute_async(key, lambda: func(*args, **kwargs), ttl, grace)
         
         @wraps(func)
         def sync_wrapper(*args, **kwargs):
             # Generate cache key
             key = f"{key_prefix}:{func.__name__}:{cache_key(*args, **kwargs)}"
-            
-            # Try to get from cache
-            cached_value = get_cache(key)
-            if cached_value is not None:
-                logger.debug(f"Cache hit for {key}")
-                return cached_value
-            
-            # Execute function
-            logger.debug(f"Cache miss for {key}")
-            result = func(*args, **kwargs)
-            
-            # Store in cache
-            set_cache(key, result, ttl)
-            
-            return result
+            return get_or_compute(key, lambda: func(*args, **kwargs), ttl, grace)
         
         # Return appropriate wrapper based on function type
         import inspect
@@ -168,17 +1163,57 @@ class CacheManager:
     TTL_VERY_LONG = 3600    # 1 hour
     TTL_DAY = 86400         # 24 hours
     
+    # Domain TTLs (configurable via settings)
+    TTL_RECOMMENDATIONS = settings.CACHE_TTL_RECOMMENDATIONS
+    TTL_TRENDING = settings.CACHE_TTL_TRENDING
+    TTL_PRODUCT = settings.CACHE_TTL_PRODUCT
+    TTL_SIMILARITY = settings.CACHE_TTL_SIMILARITY
+    
     # Cache key prefixes
     PREFIX_RECOMMENDATIONS = "rec"
     PREFIX_TRENDING = "trending"
     PREFIX_PRODUCT = "product"
     PREFIX_USER = "user"
     PREFIX_SIMILARITY = "similarity"
+    PREFIX_MATERIALIZED = "materialized"
+    PREFIX_GENERATION = "gen"
+    
+    # Invalidation is O(1): keys embed namespace generations, and bumping a
+    # generation orphans the old keys (they expire by TTL). Recommendation
+    # keys also embed the model generation (the artifact version), so a
+    # retrain moves each worker to a fresh namespace when it installs the
+    # new model.
+    
+    @staticmethod
+    def get_user_generations(user_ids: List[int]) -> List[int]:
+        return get_generations([f"{CacheManager.PREFIX_USER}:{user_id}" for user_id in user_ids])
+    
+    @staticmethod
+    def get_product_generations(product_ids: List[int]) -> List[int]:
+        return get_generations([f"{CacheManager.PREFIX_PRODUCT}:{product_id}" for product_id in product_ids])
+    
+    @staticmethod
+    async def get_user_generations_async(user_ids: List[int]) -> List[int]:
+        return await get_generations_async([f"{CacheManager.PREFIX_USER}:{user_id}" for user_id in user_ids])
+    
+    @staticmethod
+    async def get_product_generations_async(product_ids: List[int]) -> List[int]:
+        return await get_generations_async([f"{CacheManager.PREFIX_PRODUCT}:{product_id}" for product_id in product_ids])
     
     @staticmethod
-    def get_recommendations_key(user_id: int, context: str = "default") -> str:
-        """Generate cache key for user recommendations"""
-        return f"{CacheManager.PREFIX_RECOMMENDATIONS}:{user_id}:{context}"
+    def get_recommendations_key(
+        user_id: int,
+        context: str = "default",
+        model_generation: str = "0",
+        user_generation: Optional[int] = None
+    ) -> str:
+        """Generate cache key for user recommendations (user generation looked up if not given)"""
+        if user_generation is None:
+            user_generation = CacheManager.get_user_generations([user_id])[0]
+        return (
+            f"{CacheManager.PREFIX_RECOMMENDATIONS}:{model_generation}:"
+            f"{user_id}.{user_generation}:{context}"
+        )
     
     @staticmethod
     def get_trending_key(category: str = "all") -> str:
@@ -186,29 +1221,35 @@ class CacheManager:
         return f"{CacheManager.PREFIX_TRENDING}:{category}"
     
     @staticmethod
-    def get_product_key(product_id: int) -> str:
+    def get_product_key(product_id: int, generation: Optional[int] = None) -> str:
         """Generate cache key for product data"""
-        return f"{CacheManager.PREFIX_PRODUCT}:{product_id}"
+        if generation is None:
+            generation = CacheManager.get_product_generations([product_id])[0]
+        return f"{CacheManager.PREFIX_PRODUCT}:{product_id}.{generation}"
     
     @staticmethod
-    def get_similarity_key(product_id: int) -> str:
+    def get_similarity_key(product_id: int, generation: Optional[int] = None) -> str:
         """Generate cache key for product similarity"""
-        return f"{CacheManager.PREFIX_SIMILARITY}:{product_id}"
+        if generation is None:
+            generation = CacheManager.get_product_generations([product_id])[0]
+        return f"{CacheManager.PREFIX_SIMILARITY}:{product_id}.{generation}"
+    
+    @staticmethod
+    def get_materialized_key(version: str, kind: str) -> str:
+        """Generate the hash key of an artifact version's materialized lists"""
+        return f"{CacheManager.PREFIX_MATERIALIZED}:{version}:{kind}"
     
     @staticmethod
     def invalidate_user_cache(user_id: int):
-        """Invalidate all cache for a user"""
-        pattern = f"{CacheManager.PREFIX_RECOMMENDATIONS}:{user_id}:*"
-        return clear_pattern(pattern)
+        """Invalidate all cache for a user (bumps the user's generation)"""
+        return bump_generations([f"{CacheManager.PREFIX_USER}:{user_id}"])
     
     @staticmethod
     def invalidate_product_cache(product_id: int):
-        """Invalidate all cache for a product"""
-        patterns = [
-            f"{CacheManager.PREFIX_PRODUCT}:{product_id}",
-            f"{CacheManager.PREFIX_SIMILARITY}:{product_id}"
-        ]
-        count = 0
-        for pattern in patterns:
-            count += clear_pattern(pattern)
-        return count
+        """Invalidate all cache for a product (bumps the product's generation)"""
+        return CacheManager.invalidate_products_cache([product_id])
+    
+    @staticmethod
+    def invalidate_products_cache(product_ids: List[int]):
+        """Invalidate all cache for several products in one round trip"""
+        return bump_generations([f"{CacheManager.PREFIX_PRODUCT}:{product_id}" for product_id in product_ids])
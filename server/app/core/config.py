@@ -26,6 +26,13 @@ class Settings(BaseSettings):
     
     # Database
     DATABASE_URL: str = os.getenv("DATABASE_URL", "sqlite:///./sql_app.db")
+    DATABASE_READ_REPLICA_URL: str = os.getenv("DATABASE_READ_REPLICA_URL", "")  # Empty string = reads use the primary
+    DB_POOL_SIZE: int = 5                     # Connections kept open per engine (per worker process)
+    DB_MAX_OVERFLOW: int = 10                 # Extra connections opened under load (-1 = unlimited)
+    DB_POOL_TIMEOUT: int = 30                 # Seconds a checkout waits for a free connection
+    DB_POOL_RECYCLE: int = 1800               # Reconnect connections older than this (-1 = never)
+    DB_POOL_PRE_PING: bool = True             # Test connections on checkout (drops ones the server closed)
+    ASYNC_ROUTES_ENABLED: bool = True  # Serve /api/async/* (AsyncSession + redis.asyncio)
     
     # Redis Cache
     REDIS_URL: str = os.getenv("REDIS_URL", "")  # Empty string = caching disabled
@@ -38,13 +45,76 @@ class Settings(BaseSettings):
     # ML Settings
     MODEL_REBUILD_INTERVAL_HOURS: int = 24
     MIN_INTERACTIONS_FOR_COLLECTIVE: int = 10
+    
+    # Collaborative Filtering (implicit-feedback ALS)
+    CF_FACTORS: int = 20
+    CF_REGULARIZATION: float = 0.1
+    CF_ALPHA: float = 40.0  # Confidence = 1 + alpha * interaction value
+    CF_ITERATIONS: int = 15
+    CF_CG_STEPS: int = 3  # Conjugate gradient steps per ALS half-iteration
+    CF_NUM_THREADS: int = 0  # 0 = one per CPU core
     SIMILARITY_TOP_K: int = 50  # Number of similar items to precompute
+    NEIGHBOR_BLOCK_SIZE: int = 1024  # Rows per block when building the neighbor table
+    ENCODER_MODEL_NAME: str = "all-MiniLM-L6-v2"
+    MODEL_STORE_DIR: str = os.getenv("MODEL_STORE_DIR", "./model_store")
+    EMBEDDING_STORE_COMPACT_RATIO: float = 0.3  # Compact once this fraction of cached vectors is stale
+    ARTIFACT_SAVE_ON_TRAIN: bool = True
+    ARTIFACT_LOAD_ON_STARTUP: bool = True
+    ARTIFACT_KEEP_VERSIONS: int = 3
+    ARTIFACT_POLL_SECONDS: int = 60  # Reload when another worker publishes a newer artifact (0 = off)
+    
+    # Background Training (runs in a separate worker process)
+    TRAINING_SCHEDULE_ENABLED: bool = os.getenv("TRAINING_SCHEDULE_ENABLED", "false").lower() == "true"  # enable in one process only
+    TRAINING_ON_STARTUP: bool = True  # Train in the background when no artifact exists yet
+    TRAINING_JOB_HISTORY: int = 20  # Job status records kept on disk
+    TRAINING_LOAD_CHUNK_SIZE: int = 50000  # Rows fetched per chunk when streaming training data
     
+    # Offline Materialization (top-N lists computed after training, re-ranked online)
+    MATERIALIZE_ON_TRAIN: bool = True
+    MATERIALIZE_BACKEND: str = os.getenv("MATERIALIZE_BACKEND", "file")  # file (in the artifact) | redis
+    MATERIALIZE_TOP_N: int = 50  # Candidates stored per user / product
+    MATERIALIZE_PRODUCTS: bool = True  # Also materialize similar-item lists for every product
+    MATERIALIZE_REDIS_TTL: int = 259200  # Hashes of superseded artifacts expire after 3 days
+
+    # Vector Index (content similarity search)
+    VECTOR_INDEX_TYPE: str = os.getenv("VECTOR_INDEX_TYPE", "auto")  # auto | flat | ivf | hnsw
+    VECTOR_INDEX_FLAT_MAX_ITEMS: int = 20000  # "auto" switches to HNSW above this
+    VECTOR_INDEX_IVF_NPROBE: int = 16
+    VECTOR_INDEX_HNSW_M: int = 32
+    VECTOR_INDEX_HNSW_EF_SEARCH: int = 128
+
     # Recommendation Weights (Hybrid Algorithm)
     CONTENT_WEIGHT: float = 0.35
     COLLABORATIVE_WEIGHT: float = 0.40
     POPULARITY_WEIGHT: float = 0.15
     DIVERSITY_WEIGHT: float = 0.10
+    MMR_CANDIDATE_POOL: int = 0  # Diversify only the top-M candidates by relevance (0 = all)
+    RECOMMEND_IN_STOCK_ONLY: bool = True  # Default stock filter when a request does not set one
+    RECOMMENDATION_BATCH_SIZE: int = 64  # Requests scored per block (block = size x catalog floats)
+    RECOMMENDATION_BATCH_MAX_REQUESTS: int = 10000  # Cap on requests per batch call
+    SCORING_WORKERS: int = 4  # Threads scoring recommendations for the async routes
+    SCORING_MAX_PENDING: int = 64  # Queued + running scoring jobs before async routes answer 503
+    
+    # Interaction ingestion (write-behind queue, bulk inserts from one background thread)
+    INTERACTION_QUEUE_ENABLED: bool = True  # False = every interaction is committed in its request
+    INTERACTION_FLUSH_EVENTS: int = 500  # Rows per bulk insert; a full batch is flushed at once
+    INTERACTION_FLUSH_INTERVAL_MS: int = 200  # Longest an event waits in the queue before a flush
+    INTERACTION_QUEUE_MAX_EVENTS: int = 10000  # Buffered events before producers are refused
+    INTERACTION_QUEUE_BLOCK_MS: int = 50  # How long a sync route waits for room when the queue is full
+    INTERACTION_BATCH_MAX_EVENTS: int = 500  # Cap on events per POST /api/interactions/batch
+    
+    # Popularity (in-memory, exponentially decayed interaction counts)
+    POPULARITY_DECAY_DAYS: float = 30.0  # Weight of an interaction falls by 1/e over this many days
+    POPULARITY_WINDOW_DAYS: int = 90  # History read when rebuilding from the database
+    POPULARITY_RESYNC_SECONDS: int = 600  # Rebuild from the DB to pick up other workers' writes (0 = off)
+    COUNTER_MAX_PRODUCT_ID: int = 1_000_000  # Largest id the in-memory counters grow to (8 bytes per id)
+    
+    # Trending (in-memory ring buffer of interaction counts)
+    TRENDING_WINDOW_DAYS: int = 7  # Velocity compares the last window with the one before it
+    TRENDING_BUCKET_HOURS: int = 24  # Ring buffer resolution; must divide the window
+    TRENDING_TOP_K: int = 100  # Precomputed trending products per category
+    TRENDING_REFRESH_SECONDS: int = 30  # Max age of the precomputed rankings
+    TRENDING_RESYNC_SECONDS: int = 600  # Rebuild from the DB to pick up other workers' writes (0 = off)
     
     # Cold Start Settings
     COLD_START_MIN_INTERACTIONS: int = 3
@@ -56,7 +126,25 @@ class Settings(BaseSettings):
     CACHE_TTL_TRENDING: int = 900             # 15 minutes
     CACHE_TTL_PRODUCT: int = 3600             # 1 hour
     CACHE_TTL_SIMILARITY: int = 86400         # 24 hours
-    
+
+    # Cache stampede protection
+    CACHE_STALE_GRACE_SECONDS: int = 60       # Serve expired values this long while one refresh runs
+    CACHE_LOCK_SECONDS: int = 30              # Recompute lock TTL (bounds a crashed holder)
+    CACHE_LOCK_WAIT_SECONDS: float = 5.0      # Other workers wait this long for the holder's result
+    CACHE_REFRESH_WORKERS: int = 2            # Threads running background refreshes
+
+    # In-process L1 cache in front of Redis (one per worker)
+    L1_CACHE_ENABLED: bool = True
+    L1_CACHE_MAX_ENTRIES: int = 10000
+    L1_CACHE_MAX_BYTES: int = 32 * 1024 * 1024  # Encoded (JSON) size of the values
+    L1_CACHE_TTL_SECONDS: int = 30            # Bounds staleness after another worker overwrites a key
+    CACHE_INVALIDATION_CHANNEL: str = "cache:invalidate"  # Pub/sub channel for deletes
+    CACHE_PIPELINE_CHUNK_SIZE: int = 1000     # Commands per pipeline round trip in bulk reads/writes
+    CACHE_CODEC: str = "msgpack"              # General values: msgpack | json (numeric arrays are always packed)
+    CACHE_COMPRESS_MIN_BYTES: int = 1024      # zlib-compress encoded values at least this large (0 = off)
+    CACHE_COMPRESS_LEVEL: int = 1
+    CACHE_GENERATION_TTL: int = 604800        # Namespace generation counters; must outlive the cached keys
+
     # Pagination
     DEFAULT_PAGE_SIZE: int = 20
     MAX_PAGE_SIZE: int = 100
@@ -1,20 +1,142 @@
-import os
-from sqlalchemy import create_engine
+"""
+Database engines, sessions and connection pool metrics.
+
+Writes go to the primary (DATABASE_URL). With DATABASE_READ_REPLICA_URL
+set, read-only paths (catalog reads, recommendation hydration, popularity /
+trending aggregations, training loads) use a second engine on the replica;
+without it the read engine is the primary engine. Replicas lag, so code that
+reads what it just wrote stays on the primary.
+
+Pool size, overflow, timeout, recycle and pre-ping come from Settings and
+apply to every engine. Each pool records how long checkouts waited and how
+close it came to running out of connections (pool_stats, in /metrics).
+"""
+import logging
+import threading
+import time
+from typing import Any, Dict, Optional
+from sqlalchemy import create_engine, exc
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+def _normalize_url(url: str) -> str:
+    # PostgreSQL fix for SQLAlchemy if using 'postgres://' instead of 'postgresql://'
+    if url.startswith("postgres://"):
+        return url.replace("postgres://", "postgresql://", 1)
+    return url
+
+# From Settings (environment variables), like the pool options below
+DATABASE_URL = _normalize_url(settings.DATABASE_URL)
+DATABASE_READ_REPLICA_URL = _normalize_url(settings.DATABASE_READ_REPLICA_URL)
+
+
+class PoolMetrics:
+    """Checkout wait times and peak usage of one connection pool"""
+
+    SLOW_CHECKOUT_MS = 1.0
+
+    def __init__(self, name: str, capacity: Optional[int]):
+        """
+        Args:
+            name: Engine name in pool_stats
+            capacity: pool_size + max_overflow (None when overflow is unlimited)
+        """
+        self.name = name
+        self.capacity = capacity
+        self.checkouts = 0
+        self.waited = 0  # checkouts that took at least SLOW_CHECKOUT_MS
+        self.timeouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.peak_in_use = 0
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float, in_use: int, timed_out: bool = False):
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+                self.total_wait += seconds
+                if seconds * 1000 >= self.SLOW_CHECKOUT_MS:
+                    self.waited += 1
+            self.max_wait = max(self.max_wait, seconds)
+            self.peak_in_use = max(self.peak_in_use, in_use)
+
+    def stats(self, pool) -> Dict[str, Any]:
+        capacity = self.capacity
+        in_use = pool.checkedout()
+        with self._lock:
+            return {
+                'capacity': capacity,
+                'in_use': in_use,
+                'idle': pool.checkedin(),
+                'saturation': round(in_use / capacity, 4) if capacity else None,
+                'peak_saturation': round(self.peak_in_use / capacity, 4) if capacity else None,
+                'checkouts': self.checkouts,
+                'slow_checkouts': self.waited,
+                'timeouts': self.timeouts,
+                'avg_wait_ms': round(self.total_wait / self.checkouts * 1000, 3) if self.checkouts else 0.0,
+                'max_wait_ms': round(self.max_wait * 1000, 3),
+            }
+
+
+_pool_metrics: Dict[str, PoolMetrics] = {}
+_pools: Dict[str, Any] = {}
+
+
+def _timed_pool_class(base, metrics: PoolMetrics):
+    """Subclass of a queue pool that times every checkout (kept across engine.dispose())"""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            entry = base._do_get(self)
+        except exc.TimeoutError:
+            metrics.record(time.perf_counter() - start, self.checkedout(), timed_out=True)
+            raise
+        metrics.record(time.perf_counter() - start, self.checkedout())
+        return entry
+
+    return type(f"Timed{base.__name__}", (base,), {'_do_get': _do_get})
+
 
-# Use environment variables for production readiness
-DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./sql_app.db")
+def _pool_args(url: str, name: str, base=QueuePool) -> Dict[str, Any]:
+    """Pool settings for create_engine / create_async_engine"""
+    if url.startswith("sqlite") and (":memory:" in url or url.rstrip("/").endswith(":")):
+        # In-memory SQLite keeps one connection per thread / process; nothing to size
+        return {}
+    capacity = settings.DB_POOL_SIZE + settings.DB_MAX_OVERFLOW if settings.DB_MAX_OVERFLOW >= 0 else None
+    metrics = _pool_metrics[name] = PoolMetrics(name, capacity)
+    return {
+        'poolclass': _timed_pool_class(base, metrics),
+        'pool_size': settings.DB_POOL_SIZE,
+        'max_overflow': settings.DB_MAX_OVERFLOW,
+        'pool_timeout': settings.DB_POOL_TIMEOUT,
+        'pool_recycle': settings.DB_POOL_RECYCLE,
+        'pool_pre_ping': settings.DB_POOL_PRE_PING,
+    }
 
-# PostgreSQL fix for SQLAlchemy if using 'postgres://' instead of 'postgresql://'
-if DATABASE_URL.startswith("postgres://"):
-    DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql://", 1)
 
-connect_args = {"check_same_thread": False} if "sqlite" in DATABASE_URL else {}
+def _create_engine(url: str, name: str):
+    args = {"check_same_thread": False} if "sqlite" in url else {}
+    db_engine = create_engine(url, connect_args=args, **_pool_args(url, name))
+    _pools[name] = db_engine
+    return db_engine
 
-engine = create_engine(DATABASE_URL, connect_args=connect_args)
+
+engine = _create_engine(DATABASE_URL, "primary")
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Read-only paths; the primary itself when no replica is configured
+read_engine = _create_engine(DATABASE_READ_REPLICA_URL, "replica") if DATABASE_READ_REPLICA_URL else engine
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+
 Base = declarative_base()
 
 def get_db():
@@ -23,3 +145,63 @@ def get_db():
         yield db
     finally:
         db.close()
+
+def get_read_db():
+    """Session on the read replica (or the primary) for routes that never write"""
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def async_database_url(url: str) -> str:
+    """Same database through an asyncio driver (aiosqlite / asyncpg)"""
+    scheme, sep, rest = url.partition("://")
+    if "+" in scheme:
+        scheme = scheme.split("+", 1)[0]
+    driver = {"sqlite": "sqlite+aiosqlite", "postgresql": "postgresql+asyncpg"}.get(scheme)
+    if driver is None:
+        raise ValueError(f"No asyncio driver configured for {scheme!r} databases")
+    return f"{driver}{sep}{rest}"
+
+
+def _create_async_engine(url: str, name: str):
+    url = async_database_url(url)
+    db_engine = create_async_engine(url, **_pool_args(url, name, AsyncAdaptedQueuePool))
+    _pools[name] = db_engine.sync_engine
+    return db_engine
+
+
+# Async engine for the /api/async routes: requests wait on the database without
+# holding one of the threadpool workers the sync routes run on
+try:
+    from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+    async_engine = _create_async_engine(DATABASE_URL, "async_primary")
+    async_read_engine = (
+        _create_async_engine(DATABASE_READ_REPLICA_URL, "async_replica") if DATABASE_READ_REPLICA_URL else async_engine
+    )
+    AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+    AsyncReadSessionLocal = async_sessionmaker(
+        async_read_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+    )
+except (ImportError, ValueError) as e:  # pragma: no cover - aiosqlite / asyncpg are listed in requirements.txt
+    logger.warning(f"Async database engine unavailable: {e}")
+    async_engine = async_read_engine = None
+    AsyncSessionLocal = AsyncReadSessionLocal = None
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+async def get_async_read_db():
+    async with AsyncReadSessionLocal() as db:
+        yield db
+
+
+def pool_stats() -> Dict[str, Optional[Dict[str, Any]]]:
+    """Checkout wait and saturation of every engine's pool (None where nothing is pooled)"""
+    return {
+        name: _pool_metrics[name].stats(db_engine.pool) if name in _pool_metrics else None
+        for name, db_engine in _pools.items()
+    }
@@ -64,6 +64,16 @@ class RateLimitError(AppException):
         )
 
 
+class ServiceOverloadedError(AppException):
+    """Raised when a bounded worker pool or queue has no room for another job"""
+    def __init__(self, message: str = "Service overloaded, retry shortly", retry_after: int = 1):
+        super().__init__(
+            message,
+            status.HTTP_503_SERVICE_UNAVAILABLE,
+            {"retry_after": retry_after}
+        )
+
+
 async def app_exception_handler(request: Request, exc: AppException) -> JSONResponse:
     """Handle application-specific exceptions"""
     logger.error(
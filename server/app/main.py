@@ -3,7 +3,7 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.exceptions import RequestValidationError
 from fastapi.responses import JSONResponse
 from .core.config import settings
-from .core.database import engine, Base
+from .core.database import engine, Base, AsyncSessionLocal
 from sqlalchemy import text
 from .core.exceptions import (
     AppException,
@@ -18,7 +18,7 @@ from .core.middleware import (
     SecurityHeadersMiddleware
 )
 from .core.cache import init_redis
-from .routers import auth, products, recommendations
+from .routers import auth, products, interactions, recommendations, async_products, async_recommendations
 import logging
 from datetime import datetime
 from fastapi import HTTPException
@@ -81,8 +81,18 @@ app.add_middleware(
 # Include Routers
 app.include_router(auth.router, prefix="/api/auth", tags=["Authentication"])
 app.include_router(products.router, prefix="/api/products", tags=["Catalog"])
+app.include_router(interactions.router, prefix="/api/interactions", tags=["Interactions"])
 app.include_router(recommendations.router, prefix="/api/recommendations", tags=["ML Recommendations"])
 
+# Async stack (AsyncSession, redis.asyncio, bounded scoring pool) for the read-heavy routes
+if settings.ASYNC_ROUTES_ENABLED and AsyncSessionLocal is not None:
+    app.include_router(async_products.router, prefix="/api/async/products", tags=["Catalog (async)"])
+    app.include_router(
+        async_recommendations.router, prefix="/api/async/recommendations", tags=["ML Recommendations (async)"]
+    )
+elif settings.ASYNC_ROUTES_ENABLED:
+    logger.warning("Async routes disabled - no async database driver available")
+
 # Health Check Endpoints
 @app.get("/", tags=["System"])
 def root():
@@ -102,7 +112,7 @@ async def health_check():
     Health check endpoint for monitoring and load balancers.
     Returns detailed system health status.
     """
-    from .core.database import SessionLocal
+    from .core.database import SessionLocal, ReadSessionLocal, read_engine, engine
     from .core.cache import redis_client
     
     health_status = {
@@ -123,6 +133,17 @@ async def health_check():
         health_status["checks"]["database"] = f"unhealthy: {str(e)}"
         health_status["status"] = "degraded"
     
+    # Check Read Replica
+    if read_engine is not engine:
+        try:
+            db = ReadSessionLocal()
+            db.execute(text("SELECT 1"))
+            db.close()
+            health_status["checks"]["database_replica"] = "healthy"
+        except Exception as e:
+            health_status["checks"]["database_replica"] = f"unhealthy: {str(e)}"
+            health_status["status"] = "degraded"
+    
     # Check Redis Cache
     if redis_client:
         try:
@@ -136,8 +157,8 @@ async def health_check():
     
     # Check ML Engine
     try:
-        from .ml.engine import recommender
-        health_status["checks"]["ml_engine"] = "loaded" if recommender.is_trained else "not_trained"
+        from .ml.training import model_registry
+        health_status["checks"]["ml_engine"] = "loaded" if model_registry.current.is_trained else "not_trained"
     except Exception as e:
         health_status["checks"]["ml_engine"] = f"error: {str(e)}"
         health_status["status"] = "degraded"
@@ -151,8 +172,11 @@ async def metrics():
     Basic metrics endpoint for monitoring.
     In production, use Prometheus or similar.
     """
-    from .core.database import SessionLocal
+    from .core.database import SessionLocal, pool_stats
+    from .core.cache import cache_stats
     from .models import models
+    from .services.async_recommendation_service import scoring_pool
+    from .services.interaction_queue import interaction_queue
     
     db = SessionLocal()
     try:
@@ -162,7 +186,11 @@ async def metrics():
                 "users": db.query(models.User).count(),
                 "products": db.query(models.Product).count(),
                 "interactions": db.query(models.Interaction).count()
-            }
+            },
+            "cache": cache_stats(),
+            "database_pools": pool_stats(),
+            "scoring_pool": scoring_pool.stats(),
+            "interaction_queue": interaction_queue.stats()
         }
         return metrics_data
     finally:
@@ -178,6 +206,49 @@ async def startup_event():
     logger.info(f"Debug mode: {settings.DEBUG}")
     logger.info(f"Cache enabled: {settings.CACHE_ENABLED}")
     logger.info(f"Rate limiting: {settings.RATE_LIMIT_ENABLED}")
+    
+    from .services.recommendation_service import RecommendationService
+    from .ml.training import start_scheduler
+    from .core.cache import init_async_redis, start_invalidation_listener
+    
+    # Drop L1 cache entries that other workers delete
+    start_invalidation_listener()
+    
+    # The redis.asyncio pool is bound to the serving event loop, so it is created here
+    if settings.REDIS_URL and settings.ASYNC_ROUTES_ENABLED:
+        await init_async_redis(settings.REDIS_URL)
+    
+    # Load the newest trained model artifact (memory-mapped, shared across workers)
+    loaded = False
+    if settings.ARTIFACT_LOAD_ON_STARTUP:
+        try:
+            loaded = RecommendationService.load_latest_model()
+        except Exception as e:
+            logger.error(f"Failed to load model artifact: {e}", exc_info=True)
+    
+    # Popularity and trending are kept in memory and updated as interactions are written
+    from .core.database import ReadSessionLocal
+    db = ReadSessionLocal()
+    try:
+        RecommendationService.rebuild_interaction_counters(db)
+    except Exception as e:
+        logger.error(f"Failed to build interaction counters: {e}", exc_info=True)
+    finally:
+        db.close()
+    
+    # Interactions are buffered and bulk-inserted by a background thread
+    if settings.INTERACTION_QUEUE_ENABLED:
+        from .services.interaction_queue import interaction_queue
+        interaction_queue.start()
+    
+    # Train in the background worker; requests get fallback results until it finishes
+    if not loaded and settings.TRAINING_ON_STARTUP:
+        try:
+            RecommendationService.trigger_rebuild("startup")
+        except Exception as e:
+            logger.error(f"Failed to start startup training job: {e}", exc_info=True)
+    
+    start_scheduler()
 
 
 # Shutdown Event
@@ -185,8 +256,23 @@ async def startup_event():
 async def shutdown_event():
     """Cleanup on application shutdown"""
     logger.info("Shutting down application...")
+    # Write buffered interactions while the database is still available
+    from .services.interaction_queue import interaction_queue
+    interaction_queue.stop()
+    from .ml.training import shutdown_scheduler
+    shutdown_scheduler()
     # Close Redis connection if exists
-    from .core.cache import redis_client
+    from .core.cache import redis_client, stop_invalidation_listener, close_async_redis
+    stop_invalidation_listener()
     if redis_client:
         redis_client.close()
         logger.info("Redis connection closed")
+    await close_async_redis()
+    # Async stack: scoring threads and the async engine's connections
+    from .services.async_recommendation_service import scoring_pool
+    from .core.database import async_engine, async_read_engine
+    scoring_pool.shutdown()
+    if async_engine is not None:
+        await async_engine.dispose()
+    if async_read_engine is not None and async_read_engine is not async_engine:
+        await async_read_engine.dispose()
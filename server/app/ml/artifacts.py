@@ -0,0 +1,103 @@
+"""
+Versioned on-disk model artifacts.
+
+Layout under settings.MODEL_STORE_DIR:
+
+    artifacts/
+        LATEST                        name of the newest complete version
+        20261017T101500Z-2.0.0/
+            manifest.json             model_version, trained_at, id maps, ...
+            embeddings.npy            raw arrays, loaded memory-mapped
+            neighbors_*.npy
+            ...
+
+A version is written into a staging directory and renamed into place
+before LATEST is switched, so readers never see a partial artifact.
+"""
+import json
+import logging
+import os
+import shutil
+import uuid
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+from ..core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Bump when the artifact layout changes incompatibly
+FORMAT_VERSION = 1
+
+
+class ArtifactStore:
+    """Publishes and locates versioned model artifact directories"""
+
+    LATEST_FILE = "LATEST"
+    MANIFEST_FILE = "manifest.json"
+
+    def __init__(self, root: Optional[str] = None, keep_versions: Optional[int] = None):
+        self.root = root or os.path.join(settings.MODEL_STORE_DIR, "artifacts")
+        self.keep_versions = keep_versions or settings.ARTIFACT_KEEP_VERSIONS
+
+    def stage(self, model_version: str) -> Tuple[str, str]:
+        """
+        Create an empty staging directory for a new version.
+
+        Returns:
+            (staging_path, version_name)
+        """
+        version = f"{datetime.utcnow().strftime('%Y%m%dT%H%M%S%fZ')}-{model_version}"
+        staging = os.path.join(self.root, f".staging-{uuid.uuid4().hex}")
+        os.makedirs(staging)
+        return staging, version
+
+    def publish(self, staging: str, version: str, manifest: Dict) -> str:
+        """Write the manifest, move staging into place and point LATEST at it"""
+        manifest = {'format_version': FORMAT_VERSION, 'version': version, **manifest}
+        with open(os.path.join(staging, self.MANIFEST_FILE), "w") as f:
+            json.dump(manifest, f)
+
+        path = os.path.join(self.root, version)
+        os.replace(staging, path)
+
+        latest_tmp = os.path.join(self.root, f".{self.LATEST_FILE}.{uuid.uuid4().hex}")
+        with open(latest_tmp, "w") as f:
+            f.write(version)
+        os.replace(latest_tmp, os.path.join(self.root, self.LATEST_FILE))
+
+        self._prune(version)
+        logger.info(f"Published model artifact {version}")
+        return path
+
+    def discard(self, staging: str):
+        shutil.rmtree(staging, ignore_errors=True)
+
+    def latest(self) -> Optional[str]:
+        """Path of the newest published version, if any"""
+        try:
+            with open(os.path.join(self.root, self.LATEST_FILE)) as f:
+                version = f.read().strip()
+        except FileNotFoundError:
+            return None
+
+        path = os.path.join(self.root, version)
+        return path if os.path.isdir(path) else None
+
+    def read_manifest(self, path: str) -> Dict:
+        with open(os.path.join(path, self.MANIFEST_FILE)) as f:
+            manifest = json.load(f)
+        if manifest.get('format_version') != FORMAT_VERSION:
+            raise ValueError(f"Unsupported artifact format {manifest.get('format_version')} at {path}")
+        return manifest
+
+    def _prune(self, current: str):
+        """Remove all but the newest keep_versions versions (names sort by time)"""
+        versions = sorted(
+            name for name in os.listdir(self.root)
+            if not name.startswith(".") and os.path.isdir(os.path.join(self.root, name))
+        )
+        for name in versions[:-self.keep_versions]:
+            if name != current:
+                # Workers still mapping these files keep their pages until they reload
+                shutil.rmtree(os.path.join(self.root, name), ignore_errors=True)
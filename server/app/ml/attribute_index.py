@@ -0,0 +1,296 @@
+"""
+Attribute index for request-time product filtering.
+
+Filters are resolved to one boolean row mask before top-N selection
+instead of scanning product attributes per request:
+
+- category and brand: a precomputed boolean mask for each common value
+  (at least 1/DENSE_FRACTION of the rows) and a sorted row-ID set for each
+  rare one, which is smaller than a mask
+- price: rows sorted by price, so a narrow range is two binary searches
+  (wide ranges are compared against the dense price column)
+- stock: an in-stock mask
+
+Stock, price and category/brand changes are applied to the index in place,
+so a product that sells out stops being recommended without a retrain.
+"""
+import logging
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from ..core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Values covering at least 1/DENSE_FRACTION of the rows get a boolean mask
+# (one byte per row); rarer values keep an int32 row-ID set instead
+DENSE_FRACTION = 32
+
+_NO_ROWS = np.empty(0, dtype=np.int32)
+
+
+class ProductFilter:
+    """Attribute constraints applied to candidates before top-N selection"""
+
+    def __init__(
+        self,
+        category: Optional[str] = None,
+        brand: Optional[str] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        in_stock: Optional[bool] = None
+    ):
+        """
+        Args:
+            category: Only this category
+            brand: Only this brand
+            min_price: Lowest price, inclusive
+            max_price: Highest price, inclusive
+            in_stock: Only products with stock (None = RECOMMEND_IN_STOCK_ONLY)
+        """
+        self.category = category or None
+        self.brand = brand or None
+        self.min_price = min_price
+        self.max_price = max_price
+        self.in_stock = settings.RECOMMEND_IN_STOCK_ONLY if in_stock is None else in_stock
+
+    @property
+    def has_price_range(self) -> bool:
+        return self.min_price is not None or self.max_price is not None
+
+    def cache_context(self) -> str:
+        """Cache key segment: the category (or 'all') plus any other constraints"""
+        parts = [self.category or "all"]
+        if self.brand:
+            parts.append(f"brand={self.brand}")
+        if self.has_price_range:
+            parts.append(f"price={self.min_price if self.min_price is not None else ''}-"
+                         f"{self.max_price if self.max_price is not None else ''}")
+        if not self.in_stock:
+            parts.append("any_stock")
+        return "|".join(parts)
+
+
+class _ValueSets:
+    """Rows holding each value of one categorical column"""
+
+    def __init__(self, values: np.ndarray):
+        codes, uniques = pd.factorize(values)
+        self.codes = codes.astype(np.int32)
+        self.lookup: Dict[str, int] = {value: code for code, value in enumerate(uniques)}
+        self.masks: Dict[int, np.ndarray] = {}
+        self.rows: Dict[int, np.ndarray] = {}
+
+        n = len(self.codes)
+        order = np.argsort(self.codes, kind='stable').astype(np.int32)
+        bounds = np.searchsorted(self.codes[order], np.arange(len(uniques) + 1))
+        for code in range(len(uniques)):
+            rows = order[bounds[code]:bounds[code + 1]]
+            if len(rows) * DENSE_FRACTION >= n:
+                mask = np.zeros(n, dtype=bool)
+                mask[rows] = True
+                self.masks[code] = mask
+            else:
+                self.rows[code] = rows
+
+    def select(self, value: str) -> Tuple[Optional[np.ndarray], Optional[np.ndarray]]:
+        """(mask, None) for a common value, (None, sorted rows) for a rare or unknown one"""
+        code = self.lookup.get(value)
+        if code is None:
+            return None, _NO_ROWS
+        if code in self.masks:
+            return self.masks[code], None
+        return None, self.rows[code]
+
+    def matches(self, rows: np.ndarray, value: str) -> np.ndarray:
+        return self.codes[rows] == self.lookup.get(value, -2)
+
+    def append_row(self):
+        self.codes = np.append(self.codes, np.int32(-1))
+        for code, mask in self.masks.items():
+            self.masks[code] = np.append(mask, False)
+
+    def set(self, row: int, value: str):
+        """Move one row to value"""
+        old = int(self.codes[row])
+        new = self.lookup.setdefault(value, len(self.lookup))
+        if old == new:
+            return
+
+        if old in self.masks:
+            self.masks[old][row] = False
+        elif old >= 0:
+            rows = self.rows[old]
+            self.rows[old] = np.delete(rows, np.searchsorted(rows, row))
+
+        if new in self.masks:
+            self.masks[new][row] = True
+        else:
+            rows = self.rows.get(new, _NO_ROWS)
+            self.rows[new] = np.insert(rows, np.searchsorted(rows, row), row).astype(np.int32)
+        self.codes[row] = new
+
+
+class AttributeIndex:
+    """Category/brand row sets, price-sorted rows and an in-stock mask over product rows"""
+
+    def __init__(
+        self,
+        categories: np.ndarray,
+        brands: np.ndarray,
+        prices: np.ndarray,
+        stock: np.ndarray
+    ):
+        """
+        Args:
+            categories, brands: Per-row values (object arrays)
+            prices: Per-row prices
+            stock: Per-row stock counts
+        """
+        self.categories = _ValueSets(categories)
+        self.brands = _ValueSets(brands)
+        self.prices = np.asarray(prices, dtype=np.float64).copy()
+        self.price_order = np.argsort(self.prices, kind='stable').astype(np.int32)
+        self.sorted_prices = self.prices[self.price_order]
+        self.in_stock = np.asarray(stock) > 0
+
+    @classmethod
+    def build(cls, product_df: pd.DataFrame) -> "AttributeIndex":
+        """Index a product dataframe; missing columns count as "" / 0 / in stock"""
+        n = len(product_df)
+
+        def column(name, default):
+            if name in product_df:
+                return product_df[name].to_numpy()
+            return np.full(n, default, dtype=object if isinstance(default, str) else type(default))
+
+        return cls(
+            column('category', ""),
+            column('brand', ""),
+            pd.to_numeric(pd.Series(column('price', 0.0)), errors='coerce').fillna(0).to_numpy(),
+            pd.to_numeric(pd.Series(column('stock_count', 1)), errors='coerce').fillna(0).to_numpy()
+        )
+
+    def __len__(self) -> int:
+        return len(self.prices)
+
+    def _price_range(self, min_price: Optional[float], max_price: Optional[float]) -> Tuple[int, int]:
+        """Bounds into price_order of the rows priced within [min_price, max_price]"""
+        lo = 0 if min_price is None else int(np.searchsorted(self.sorted_prices, min_price, side='left'))
+        hi = len(self) if max_price is None else int(np.searchsorted(self.sorted_prices, max_price, side='right'))
+        return lo, max(lo, hi)
+
+    def mask(self, filters: Optional[ProductFilter]) -> Optional[np.ndarray]:
+        """
+        Boolean mask of the rows passing every constraint.
+
+        Masks are ANDed; rare values and narrow price ranges are intersected
+        as row sets first, so the cost follows the most selective constraint.
+
+        Returns:
+            Boolean array aligned to product rows, or None if nothing is filtered
+        """
+        if filters is None:
+            return None
+
+        masks: List[np.ndarray] = []
+        row_sets: List[np.ndarray] = []
+        if filters.in_stock:
+            masks.append(self.in_stock)
+        for value_sets, value in ((self.categories, filters.category), (self.brands, filters.brand)):
+            if value is not None:
+                mask, rows = value_sets.select(value)
+                if mask is not None:
+                    masks.append(mask)
+                else:
+                    row_sets.append(rows)
+        if filters.has_price_range:
+            lo, hi = self._price_range(filters.min_price, filters.max_price)
+            if (hi - lo) * DENSE_FRACTION < len(self):
+                row_sets.append(np.sort(self.price_order[lo:hi]))
+            else:
+                # Wide range: two comparisons beat scattering most of the rows
+                price_mask = np.ones(len(self), dtype=bool)
+                if filters.min_price is not None:
+                    price_mask &= self.prices >= filters.min_price
+                if filters.max_price is not None:
+                    price_mask &= self.prices <= filters.max_price
+                masks.append(price_mask)
+
+        if not masks and not row_sets:
+            return None
+
+        if not row_sets:
+            result = masks[0].copy()
+            for mask in masks[1:]:
+                result &= mask
+            return result
+
+        row_sets.sort(key=len)
+        rows = row_sets[0]
+        for other in row_sets[1:]:
+            rows = rows[np.isin(rows, other, assume_unique=True)]
+        for mask in masks:
+            rows = rows[mask[rows]]
+        result = np.zeros(len(self), dtype=bool)
+        result[rows] = True
+        return result
+
+    def matches(self, rows: np.ndarray, filters: Optional[ProductFilter]) -> np.ndarray:
+        """Which of a few candidate rows pass the filters (no full-catalog mask)"""
+        keep = np.ones(len(rows), dtype=bool)
+        if filters is None:
+            return keep
+        if filters.in_stock:
+            keep &= self.in_stock[rows]
+        if filters.category is not None:
+            keep &= self.categories.matches(rows, filters.category)
+        if filters.brand is not None:
+            keep &= self.brands.matches(rows, filters.brand)
+        if filters.min_price is not None:
+            keep &= self.prices[rows] >= filters.min_price
+        if filters.max_price is not None:
+            keep &= self.prices[rows] <= filters.max_price
+        return keep
+
+    def set_stock(self, row: int, stock_count: int):
+        self.in_stock[row] = (stock_count or 0) > 0
+
+    def set_price(self, row: int, price: float):
+        """Move one row to its new position in the price order"""
+        price = float(price or 0.0)
+        if row < len(self):
+            old = self.prices[row]
+            if old == price:
+                return
+            lo = int(np.searchsorted(self.sorted_prices, old, side='left'))
+            position = lo + int(np.flatnonzero(self.price_order[lo:] == row)[0])
+            self.price_order = np.delete(self.price_order, position)
+            self.sorted_prices = np.delete(self.sorted_prices, position)
+            self.prices[row] = price
+        else:
+            self.prices = np.append(self.prices, price)
+
+        position = int(np.searchsorted(self.sorted_prices, price, side='right'))
+        self.price_order = np.insert(self.price_order, position, row).astype(np.int32)
+        self.sorted_prices = np.insert(self.sorted_prices, position, price)
+
+    def set_row(
+        self,
+        row: int,
+        category: str,
+        brand: str,
+        price: float,
+        stock_count: int
+    ):
+        """Index an edited row, or append a new one when row == len(self)"""
+        if row == len(self):
+            self.categories.append_row()
+            self.brands.append_row()
+            self.in_stock = np.append(self.in_stock, False)
+        self.set_price(row, price)
+        self.categories.set(row, category or "")
+        self.brands.set(row, brand or "")
+        self.set_stock(row, stock_count)
@@ -0,0 +1,248 @@
+"""
+Persistent content-hash keyed embedding store.
+
+Each product text is keyed by a 16-byte BLAKE2b digest of the exact string
+fed to the encoder, so retraining only encodes new or edited products.
+Vectors live in an append-only raw float32 file that is memory-mapped for
+reads; keys live in a parallel append-only file of fixed-size digests.
+
+Compaction writes both files under a new generation number and switches to
+them by replacing the manifest, which names the current generation, in one
+rename; a crash leaves either the old pair or the new one in use, never a
+mix.
+
+The store assumes a single writer (the training process). Other processes
+open it read-only in effect: they pass persist=False, so vectors they
+encode stay in memory, and they never modify the files, not even to drop
+the half-written tail of an append in progress (only the writer repairs
+the files, before its next append). Their mapping may lag the writer's
+appends, but rows it holds are never rewritten in place, so it stays
+consistent with their key map.
+"""
+import hashlib
+import json
+import logging
+import os
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingStore:
+    """Append-only, memory-mapped cache of encoder outputs"""
+
+    VECTORS_FILE = "vectors.f32"
+    KEYS_FILE = "keys.bin"
+    MANIFEST_FILE = "manifest.json"
+    KEY_BYTES = 16
+
+    def __init__(self, directory: str, model_name: str):
+        self.directory = directory
+        self.model_name = model_name
+        self.dim: Optional[int] = None
+        self.generation = 0
+        self.last_stats = {'hits': 0, 'misses': 0}
+        self.last_keys: List[bytes] = []
+
+        self._rows: Dict[bytes, int] = {}
+        self._vectors: Optional[np.memmap] = None
+
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    @classmethod
+    def content_hash(cls, text: str) -> bytes:
+        """Digest of the exact text passed to the encoder"""
+        return hashlib.blake2b(text.encode("utf-8"), digest_size=cls.KEY_BYTES).digest()
+
+    def _path(self, filename: str) -> str:
+        return os.path.join(self.directory, filename)
+
+    def _data_path(self, filename: str, generation: Optional[int] = None) -> str:
+        """Path of VECTORS_FILE or KEYS_FILE in a generation (default: current)"""
+        generation = self.generation if generation is None else generation
+        if generation:
+            stem, ext = os.path.splitext(filename)
+            filename = f"{stem}.{generation}{ext}"
+        return self._path(filename)
+
+    def _load(self):
+        """Open an existing store, discarding it if it belongs to another encoder"""
+        manifest_path = self._path(self.MANIFEST_FILE)
+        if not os.path.exists(manifest_path):
+            self._reset()
+            return
+
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+
+        if manifest.get('model_name') != self.model_name:
+            logger.info(f"Embedding store built with {manifest.get('model_name')}, resetting")
+            self._reset()
+            return
+
+        self.dim = manifest.get('dim')
+        self.generation = manifest.get('generation', 0)
+        if not self.dim:
+            return
+
+        with open(self._data_path(self.KEYS_FILE), "rb") as f:
+            keys_raw = f.read()
+
+        # A crash between the two appends, or an append in progress in the
+        # writer, leaves the files out of step: use the rows both cover
+        n_keys = len(keys_raw) // self.KEY_BYTES
+        n_vectors = os.path.getsize(self._data_path(self.VECTORS_FILE)) // (4 * self.dim)
+        count = min(n_keys, n_vectors)
+
+        self._rows = {
+            keys_raw[i * self.KEY_BYTES:(i + 1) * self.KEY_BYTES]: i
+            for i in range(count)
+        }
+        self._map()
+        logger.info(f"Embedding store loaded: {count} cached vectors")
+
+    def _reset(self):
+        self.dim = None
+        self.generation = 0
+        self._rows = {}
+        self._vectors = None
+        for filename in (self.VECTORS_FILE, self.KEYS_FILE):
+            open(self._data_path(filename), "wb").close()
+        self._write_manifest()
+
+    def _repair(self):
+        """Drop rows past the consistent count before appending (writer only)"""
+        count = len(self._rows)
+        for filename, row_bytes in ((self.KEYS_FILE, self.KEY_BYTES), (self.VECTORS_FILE, 4 * self.dim)):
+            path = self._data_path(filename)
+            if os.path.getsize(path) != count * row_bytes:
+                logger.warning(f"Embedding store {filename} truncated to {count} consistent entries")
+                with open(path, "r+b") as f:
+                    f.truncate(count * row_bytes)
+
+    def _map(self):
+        count = len(self._rows)
+        self._vectors = (
+            np.memmap(self._data_path(self.VECTORS_FILE), dtype=np.float32, mode="r", shape=(count, self.dim))
+            if count else None
+        )
+
+    def _write_manifest(self):
+        tmp_path = self._path(self.MANIFEST_FILE + ".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump({
+                'model_name': self.model_name,
+                'dim': self.dim,
+                'generation': self.generation,
+                'count': len(self._rows),
+            }, f)
+        os.replace(tmp_path, self._path(self.MANIFEST_FILE))
+
+    def _append(self, keys: List[bytes], vectors: np.ndarray):
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        if self.dim is None:
+            self.dim = vectors.shape[1]
+        self._repair()
+
+        # Vectors first: an orphaned vector is dropped on load, an orphaned key is not recoverable
+        with open(self._data_path(self.VECTORS_FILE), "ab") as f:
+            vectors.tofile(f)
+        with open(self._data_path(self.KEYS_FILE), "ab") as f:
+            f.write(b"".join(keys))
+
+        start = len(self._rows)
+        for offset, key in enumerate(keys):
+            self._rows[key] = start + offset
+
+        self._write_manifest()
+        self._map()
+
+    def encode(self, texts: Sequence[str], encoder, batch_size: int = 32, persist: bool = True) -> np.ndarray:
+        """
+        Return embeddings for texts, encoding only those not already stored.
+
+        Args:
+            persist: Append newly encoded vectors to the store (writer only);
+                False returns them without touching the files
+
+        Hit/miss counts for the call are kept in `last_stats`.
+        """
+        keys = [self.content_hash(text) for text in texts]
+
+        # Deduplicate misses so identical texts are encoded once
+        missing: Dict[bytes, str] = {}
+        for key, text in zip(keys, texts):
+            if key not in self._rows and key not in missing:
+                missing[key] = text
+
+        misses = sum(1 for key in keys if key in missing)
+        unstored: Dict[bytes, np.ndarray] = {}
+        if missing:
+            vectors = encoder.encode(list(missing.values()), show_progress_bar=False, batch_size=batch_size)
+            if persist:
+                self._append(list(missing.keys()), np.asarray(vectors))
+            else:
+                unstored = dict(zip(missing.keys(), np.asarray(vectors, dtype=np.float32)))
+
+        self.last_keys = keys
+        self.last_stats = {'hits': len(keys) - misses, 'misses': misses}
+
+        if not keys:
+            return np.empty((0, self.dim or 0), dtype=np.float32)
+
+        if unstored:
+            return np.stack([unstored[key] if key in unstored else self._vectors[self._rows[key]] for key in keys])
+        rows = np.fromiter((self._rows[key] for key in keys), dtype=np.int64, count=len(keys))
+        return np.asarray(self._vectors[rows])
+
+    def stale_ratio(self, live_keys: Optional[Sequence[bytes]] = None) -> float:
+        """Fraction of stored vectors not referenced by live_keys (default: last encode)"""
+        if not self._rows:
+            return 0.0
+        live = set(self.last_keys if live_keys is None else live_keys)
+        return 1.0 - len(live & self._rows.keys()) / len(self._rows)
+
+    def compact(self, live_keys: Optional[Sequence[bytes]] = None) -> int:
+        """
+        Rewrite the store keeping only live_keys (default: last encode).
+
+        Returns:
+            Number of vectors removed
+        """
+        live = [key for key in dict.fromkeys(self.last_keys if live_keys is None else live_keys) if key in self._rows]
+        removed = len(self._rows) - len(live)
+        if removed == 0:
+            return 0
+
+        rows = np.fromiter((self._rows[key] for key in live), dtype=np.int64, count=len(live))
+        vectors = np.asarray(self._vectors[rows]) if len(rows) else np.empty((0, self.dim), dtype=np.float32)
+
+        # Write the next generation; the manifest switches to it in one rename
+        old_generation = self.generation
+        self.generation += 1
+        for filename, payload in ((self.VECTORS_FILE, vectors.tobytes()), (self.KEYS_FILE, b"".join(live))):
+            with open(self._data_path(filename), "wb") as f:
+                f.write(payload)
+                f.flush()
+                os.fsync(f.fileno())
+
+        self._rows = {key: i for i, key in enumerate(live)}
+        self._write_manifest()
+
+        # Release the old mapping before removing its file (required on Windows)
+        self._vectors = None
+        self._map()
+        for filename in (self.VECTORS_FILE, self.KEYS_FILE):
+            try:
+                os.remove(self._data_path(filename, old_generation))
+            except OSError as e:
+                logger.warning(f"Failed to remove old embedding store file: {e}")
+
+        logger.info(f"Embedding store compacted: removed {removed}, kept {len(live)}")
+        return removed
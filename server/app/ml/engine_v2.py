@@ -2,35 +2,88 @@
 Production-Grade Hybrid Recommendation Engine v2.0
 
 Features:
-- Content-Based Filtering (Transformer Embeddings + Cosine Similarity)
-- Collaborative Filtering (Matrix Factorization with ALS)
+- Content-Based Filtering (Transformer Embeddings + Vector Index Search)
+- Collaborative Filtering (Implicit-Feedback ALS on Sparse Matrices)
 - Popularity & Trending (Time-Decayed Scores)
 - Cold-Start Strategies (New Users/Products)
 - Re-ranking for Diversity (MMR Algorithm)
 - Caching & Performance Optimization
+- Versioned, Memory-Mapped Model Artifacts
+- Offline-Materialized Top-N Lists
 - Offline Evaluation Metrics
 """
 
 import pandas as pd
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
 from sentence_transformers import SentenceTransformer
 from sqlalchemy.orm import Session
-from sqlalchemy import func, and_
-from datetime import datetime, timedelta
+from datetime import datetime
 import logging
-from typing import List, Dict, Tuple, Optional
-import pickle
+from typing import Callable, List, Dict, Tuple, Optional
 import os
+import threading
+import time
+from contextlib import contextmanager
 
 from ..models import models
 from ..core.config import settings
-from ..core.cache import CacheManager, get_cache, set_cache
+from ..core.cache import (
+    CacheManager, get_cache, get_cache_entry_async, get_or_compute, mget_cache_entries, mset_cache,
+    mset_cache_entries, single_flight
+)
+from ..core.database import ReadSessionLocal
 from ..core.exceptions import RecommendationError
+from .vector_index import VectorIndex, build_vector_index, normalize_embeddings
+from .neighbors import NeighborTable, build_neighbor_table, build_neighbor_table_from_index
+from .embedding_store import EmbeddingStore
+from .collaborative import ImplicitALS, build_interaction_matrix
+from .artifacts import ArtifactStore
+from .data_loader import load_interactions, load_products
+from .attribute_index import AttributeIndex, ProductFilter
+from .materialize import ANONYMOUS_USER, PRODUCTS, USERS, materialize, open_materialized
+from .popularity import popularity_tracker
+from .trending import trending_tracker
 
 logger = logging.getLogger(__name__)
 
 
+class _ReadWriteLock:
+    """Shared by scoring requests, exclusive for in-place model updates (a waiting writer goes first)"""
+    
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._readers = 0
+        self._writing = False
+        self._writers_waiting = 0
+    
+    @contextmanager
+    def read(self):
+        with self._cond:
+            self._cond.wait_for(lambda: not self._writing and not self._writers_waiting)
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if not self._readers:
+                    self._cond.notify_all()
+    
+    @contextmanager
+    def write(self):
+        with self._cond:
+            self._writers_waiting += 1
+            self._cond.wait_for(lambda: not self._writing and not self._readers)
+            self._writers_waiting -= 1
+            self._writing = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writing = False
+                self._cond.notify_all()
+
+
 class HybridRecommenderV2:
     """
     Advanced Hybrid Recommendation Engine
@@ -42,37 +95,81 @@ class HybridRecommenderV2:
     4. Diversity: MMR (Maximal Marginal Relevance) for result diversification
     """
     
-    def __init__(self):
+    def __init__(
+        self,
+        encoder: Optional[SentenceTransformer] = None,
+        embedding_store: Optional[EmbeddingStore] = None
+    ):
+        """
+        Args:
+            encoder: Share an already loaded encoder (e.g. with the live model)
+            embedding_store: Share an already opened embedding store
+        """
         # Initialize transformer model for content embeddings
-        logger.info("Loading Sentence Transformer model...")
-        self.encoder = SentenceTransformer('all-MiniLM-L6-v2')
+        if encoder is None:
+            logger.info("Loading Sentence Transformer model...")
+            encoder = SentenceTransformer(settings.ENCODER_MODEL_NAME)
+        self.encoder = encoder
+        
+        # Persistent embedding cache keyed by product text hash
+        self.embedding_store = embedding_store or EmbeddingStore(
+            os.path.join(settings.MODEL_STORE_DIR, "embeddings"),
+            settings.ENCODER_MODEL_NAME
+        )
+        
+        # Versioned trained-state snapshots shared by all workers on a host
+        self.artifact_store = ArtifactStore()
         
         # State variables
         self.product_df = None
+        self.product_id_to_idx = {}
+        self.product_ids = np.empty(0, dtype=np.int64)
+        self.attributes: Optional[AttributeIndex] = None  # category/brand/price/stock filters
         self.product_embeddings = None
-        self.content_sim_matrix = None
+        self.content_index = None
+        self.neighbor_table: Optional[NeighborTable] = None
         
-        # Collaborative filtering state
+        # Collaborative filtering state: (users + items) x k floats, no dense predictions
         self.user_factors = None
-        self.item_factors = None
+        self.item_factors = None  # aligned to product rows; zeros for items without interactions
         self.user_map = {}
         self.item_map = {}
-        self.preds_df = None
         self.has_cf = False
         
+        # Top-N lists precomputed with the loaded artifact
+        self.materialized = None
+        # Namespace of this model's recommendation cache keys (the artifact version)
+        self.model_generation = "0"
+        self._materialized_stale = set()  # products whose similar-items lists changed since
+        
+        # Serializes incremental product updates
+        self._update_lock = threading.Lock()
+        # Scoring reads the arrays below under the shared side; updates swap rows in
+        # under the exclusive side, so no request sees them half-applied
+        self._state_lock = _ReadWriteLock()
+        
         # Metadata
         self.is_trained = False
         self.last_trained = None
         self.model_version = "2.0.0"
+        self.artifact_path: Optional[str] = None  # artifact this state was saved to / loaded from
         
-    def fit(self, db: Session, force_retrain: bool = False):
+    def fit(
+        self,
+        db: Session,
+        force_retrain: bool = False,
+        progress: Optional[Callable[[str], None]] = None
+    ):
         """
         Train the recommendation models.
         
         Args:
             db: Database session
             force_retrain: Force retraining even if recently trained
+            progress: Called with the name of each training stage as it starts
         """
+        report = progress or (lambda stage: None)
+        
         # Check if retraining is needed
         if self.is_trained and not force_retrain:
             if self.last_trained:
@@ -87,20 +184,25 @@ class HybridRecommenderV2:
         
         try:
             # Step 1: Load and prepare data
+            report("loading_data")
             self._load_data(db)
             
             # Step 2: Train content-based model
+            report("content")
             self._train_content_based()
             
             # Step 3: Train collaborative filtering
+            report("collaborative")
             self._train_collaborative_filtering(db)
             
-            # Step 4: Precompute similarity matrices
+            # Step 4: Precompute top-K similar items
+            report("similarities")
             self._precompute_similarities()
             
-            # Mark as trained
+            # Mark as trained (a fresh cache namespace until an artifact version replaces it)
             self.is_trained = True
             self.last_trained = datetime.now()
+            self.model_generation = self.last_trained.strftime("%Y%m%dT%H%M%S%f")
             
             logger.info("=" * 60)
             logger.info(f"Training Complete! Model Version: {self.model_version}")
@@ -111,17 +213,186 @@ class HybridRecommenderV2:
         except Exception as e:
             logger.error(f"Training failed: {str(e)}", exc_info=True)
             raise RecommendationError(f"Model training failed: {str(e)}")
+        
+        if settings.ARTIFACT_SAVE_ON_TRAIN:
+            try:
+                report("saving")
+                self.save_artifact(db, progress=report)
+            except Exception as e:
+                logger.error(f"Saving model artifact failed: {e}", exc_info=True)
+    
+    # Product columns persisted in artifacts
+    ARTIFACT_NUMERIC_COLUMNS = {'price': np.float64, 'rating': np.float32, 'stock_count': np.int32}
+    ARTIFACT_STRING_COLUMNS = ('category', 'brand')
+    
+    def save_artifact(
+        self,
+        db: Optional[Session] = None,
+        progress: Optional[Callable[[str], None]] = None
+    ) -> str:
+        """
+        Persist the trained state as a new artifact version.
+        
+        Arrays are written as raw .npy files next to a small JSON manifest.
+        With a database session (and MATERIALIZE_ON_TRAIN), the per-user and
+        per-product top-N lists are materialized for the new version too.
+        
+        Returns:
+            Path of the published version
+        """
+        if not self.is_trained:
+            raise RecommendationError("Cannot save an untrained model")
+        
+        staging, version = self.artifact_store.stage(self.model_version)
+        try:
+            self.content_index.save(staging)
+            self.neighbor_table.save(staging)
+            np.save(os.path.join(staging, "product_ids.npy"), self.product_ids)
+            
+            for column, dtype in self.ARTIFACT_NUMERIC_COLUMNS.items():
+                values = pd.to_numeric(self.product_df[column], errors='coerce').fillna(0)
+                np.save(os.path.join(staging, f"product_{column}.npy"), values.to_numpy(dtype=dtype))
+            
+            vocabularies = {}
+            for column in self.ARTIFACT_STRING_COLUMNS:
+                codes, uniques = pd.factorize(self.product_df[column])
+                np.save(os.path.join(staging, f"product_{column}_codes.npy"), codes.astype(np.int32))
+                vocabularies[column] = uniques.tolist()
+            
+            if self.has_cf:
+                np.save(os.path.join(staging, "user_factors.npy"), self.user_factors)
+                np.save(os.path.join(staging, "item_factors.npy"), self.item_factors)
+                np.save(
+                    os.path.join(staging, "user_ids.npy"),
+                    np.fromiter(self.user_map, dtype=np.int64, count=len(self.user_map))
+                )
+            
+            materialized = None
+            if db is not None and settings.MATERIALIZE_ON_TRAIN:
+                if progress:
+                    progress("materializing")
+                try:
+                    materialized = materialize(self, db, staging, version)
+                except Exception as e:
+                    logger.error(f"Materializing top-N lists failed: {e}", exc_info=True)
+            
+            manifest = {
+                'model_version': self.model_version,
+                'trained_at': self.last_trained.isoformat(),
+                'encoder': settings.ENCODER_MODEL_NAME,
+                'index_kind': self.content_index.kind,
+                'n_products': int(len(self.product_ids)),
+                'has_cf': self.has_cf,
+                'id_maps': {
+                    'products': "product_ids.npy",
+                    'users': "user_ids.npy" if self.has_cf else None,
+                    'cf_items': sorted(int(pid) for pid in self.item_map),
+                },
+                'vocabularies': vocabularies,
+                'materialized': materialized,
+            }
+        except Exception:
+            self.artifact_store.discard(staging)
+            raise
+        
+        self.artifact_path = self.artifact_store.publish(staging, version, manifest)
+        self.model_generation = version
+        return self.artifact_path
+    
+    def load_artifact(self, path: Optional[str] = None) -> bool:
+        """
+        Load trained state from an artifact (default: newest published).
+        
+        Arrays are memory-mapped read-only, so every worker process on the
+        host shares one physical copy of the pages.
+        
+        Returns:
+            True if an artifact was loaded
+        """
+        start = time.perf_counter()
+        path = path or self.artifact_store.latest()
+        if not path:
+            logger.info("No model artifact found")
+            return False
+        
+        manifest = self.artifact_store.read_manifest(path)
+        
+        def load(name: str) -> np.ndarray:
+            return np.load(os.path.join(path, name), mmap_mode='r')
+        
+        product_ids = load("product_ids.npy")
+        product_df = pd.DataFrame({'id': product_ids})
+        for column in self.ARTIFACT_NUMERIC_COLUMNS:
+            product_df[column] = load(f"product_{column}.npy")
+        for column in self.ARTIFACT_STRING_COLUMNS:
+            vocabulary = np.asarray(manifest['vocabularies'][column], dtype=object)
+            product_df[column] = vocabulary[load(f"product_{column}_codes.npy")]
+        for column in ('name', 'description', 'tags'):
+            product_df[column] = ""
+        
+        content_index = VectorIndex.load(path, manifest['index_kind'])
+        neighbor_table = NeighborTable.load(path, mmap_mode='r')
+        
+        if manifest['has_cf']:
+            user_factors = load("user_factors.npy")
+            item_factors = load("item_factors.npy")
+            user_map = {int(uid): i for i, uid in enumerate(load("user_ids.npy"))}
+            product_id_to_idx = {int(pid): i for i, pid in enumerate(product_ids)}
+            item_map = {pid: product_id_to_idx[pid] for pid in manifest['id_maps']['cf_items']}
+        else:
+            user_factors = item_factors = None
+            user_map, item_map = {}, {}
+        
+        # Publish the loaded state
+        self.product_df = product_df
+        self.product_id_to_idx = {int(pid): i for i, pid in enumerate(product_ids)}
+        self._refresh_product_arrays()
+        self.content_index = content_index
+        self.product_embeddings = content_index.vectors
+        self.neighbor_table = neighbor_table
+        self.user_factors, self.item_factors = user_factors, item_factors
+        self.user_map, self.item_map = user_map, item_map
+        self.has_cf = manifest['has_cf']
+        self.model_version = manifest['model_version']
+        self.last_trained = datetime.fromisoformat(manifest['trained_at'])
+        self.is_trained = True
+        self.artifact_path = path
+        self.materialized = open_materialized(path, manifest['version'], manifest.get('materialized'))
+        self._materialized_stale = set()
+        self.model_generation = manifest['version']
+        
+        logger.info(
+            f"Loaded model artifact {manifest['version']} "
+            f"({manifest['n_products']} products) in {(time.perf_counter() - start) * 1000:.0f}ms"
+        )
+        return True
     
     def _load_data(self, db: Session):
         """Load products and prepare dataframe"""
         logger.info("Loading product data...")
         
-        products = db.query(models.Product).all()
+        # Only the needed columns, streamed into column arrays (no ORM objects)
+        product_df = load_products(db)
         
-        if not products:
+        if product_df.empty:
             raise RecommendationError("No products found in database")
         
-        self.product_df = pd.DataFrame([{
+        self.product_df = product_df
+        
+        self.product_id_to_idx = {pid: i for i, pid in enumerate(self.product_df['id'])}
+        self._refresh_product_arrays()
+        
+        logger.info(f"Loaded {len(self.product_df)} products")
+    
+    def _refresh_product_arrays(self):
+        """Rebuild the dense per-row arrays and attribute index used by request-time scoring"""
+        self.product_ids = self.product_df['id'].to_numpy(dtype=np.int64)
+        self.attributes = AttributeIndex.build(self.product_df)
+    
+    @staticmethod
+    def _product_record(p: models.Product) -> Dict:
+        """Product columns used by the engine"""
+        return {
             'id': p.id,
             'name': p.name,
             'description': p.description or "",
@@ -131,99 +402,84 @@ class HybridRecommenderV2:
             'price': p.price,
             'rating': p.rating or 0.0,
             'stock_count': p.stock_count
-        } for p in products])
-        
-        logger.info(f"Loaded {len(self.product_df)} products")
+        }
+    
+    @staticmethod
+    def _content_text(product_df: pd.DataFrame) -> pd.Series:
+        """Rich text representation fed to the encoder"""
+        return (
+            product_df['name'] + " " +
+            product_df['description'] + " " +
+            product_df['category'] + " " +
+            product_df['brand'] + " " +
+            product_df['tags']
+        )
     
     def _train_content_based(self):
         """Train content-based filtering using transformer embeddings"""
         logger.info("Training content-based model...")
         
         # Create rich text representation
-        content_text = (
-            self.product_df['name'] + " " +
-            self.product_df['description'] + " " +
-            self.product_df['category'] + " " +
-            self.product_df['brand'] + " " +
-            self.product_df['tags']
-        )
+        content_text = self._content_text(self.product_df)
         
-        # Generate embeddings
+        # Generate embeddings, re-encoding only new or edited products
+        # (normalized so inner product == cosine similarity)
         logger.info("Generating product embeddings...")
-        self.product_embeddings = self.encoder.encode(
+        self.product_embeddings = normalize_embeddings(self.embedding_store.encode(
             content_text.tolist(),
-            show_progress_bar=False,
+            self.encoder,
             batch_size=32
-        )
+        ))
+        
+        stats = self.embedding_store.last_stats
+        logger.info(f"Embedding cache: {stats['hits']} hits, {stats['misses']} misses (encoded)")
         
-        # Compute similarity matrix
-        logger.info("Computing content similarity matrix...")
-        self.content_sim_matrix = cosine_similarity(self.product_embeddings)
+        if self.embedding_store.stale_ratio() > settings.EMBEDDING_STORE_COMPACT_RATIO:
+            self.embedding_store.compact()
         
-        logger.info(f"Content model trained: {self.content_sim_matrix.shape}")
+        # Build similarity index (never materializes the N x N matrix)
+        logger.info("Building content vector index...")
+        self.content_index = build_vector_index(self.product_embeddings)
+        
+        logger.info(f"Content model trained: {self.product_embeddings.shape}")
     
     def _train_collaborative_filtering(self, db: Session):
-        """Train collaborative filtering using matrix factorization"""
+        """Train collaborative filtering using implicit-feedback ALS on a sparse matrix"""
         logger.info("Training collaborative filtering...")
         
-        # Load interactions
-        interactions = db.query(models.Interaction).all()
+        # Load interactions as COO arrays, streamed in chunks
+        user_ids, item_ids, values = load_interactions(db)
         
-        if len(interactions) < settings.MIN_INTERACTIONS_FOR_COLLECTIVE:
+        if len(values) < settings.MIN_INTERACTIONS_FOR_COLLECTIVE:
             logger.warning(
-                f"Insufficient interactions ({len(interactions)} < {settings.MIN_INTERACTIONS_FOR_COLLECTIVE}). "
+                f"Insufficient interactions ({len(values)} < {settings.MIN_INTERACTIONS_FOR_COLLECTIVE}). "
                 "Collaborative filtering disabled."
             )
             self.has_cf = False
             return
         
-        # Create interaction dataframe
-        inter_df = pd.DataFrame([{
-            'user_id': i.user_id,
-            'item_id': i.product_id,
-            'rating': i.value
-        } for i in interactions])
-        
-        # Pivot to user-item matrix
+        # Sparse user x item matrix (repeated interactions are summed)
         try:
-            matrix_df = inter_df.pivot_table(
-                index='user_id',
-                columns='item_id',
-                values='rating',
-                aggfunc='sum'  # Sum multiple interactions
-            ).fillna(0)
-            
-            self.user_map = {uid: i for i, uid in enumerate(matrix_df.index)}
-            self.item_map = {iid: i for i, iid in enumerate(matrix_df.columns)}
+            user_items, self.user_map, item_map = build_interaction_matrix(user_ids, item_ids, values)
+            del user_ids, item_ids, values
             
-            # Perform SVD
-            R = matrix_df.values
-            user_ratings_mean = np.mean(R, axis=1)
-            R_demeaned = R - user_ratings_mean.reshape(-1, 1)
+            # Confidence-weighted ALS: output is only the two factor matrices
+            als = ImplicitALS().fit(user_items)
+            self.user_factors = als.user_factors
             
-            from scipy.sparse.linalg import svds
-            k = min(20, R_demeaned.shape[0] - 1, R_demeaned.shape[1] - 1)
+            # Re-order item factors to product rows so scoring needs no id lookups
+            cf_rows = np.array([self.product_id_to_idx.get(iid, -1) for iid in item_map], dtype=np.int64)
+            known = cf_rows >= 0
+            self.item_factors = np.zeros((len(self.product_ids), als.factors), dtype=np.float32)
+            self.item_factors[cf_rows[known]] = als.item_factors[known]
+            self.item_map = {iid: self.product_id_to_idx[iid] for iid in item_map if iid in self.product_id_to_idx}
             
-            if k > 0:
-                U, sigma, Vt = svds(R_demeaned, k=k)
-                sigma = np.diag(sigma)
-                
-                # Reconstruct predictions
-                all_user_predicted_ratings = (
-                    np.dot(np.dot(U, sigma), Vt) + user_ratings_mean.reshape(-1, 1)
-                )
-                
-                self.preds_df = pd.DataFrame(
-                    all_user_predicted_ratings,
-                    columns=matrix_df.columns,
-                    index=matrix_df.index
-                )
-                
-                self.has_cf = True
-                logger.info(f"CF model trained: {k} latent factors, {len(self.user_map)} users")
-            else:
-                self.has_cf = False
-                logger.warning("Insufficient data for SVD")
+            self.has_cf = True
+            logger.info(
+                f"CF model trained: {als.factors} latent factors, {len(self.user_map)} users, "
+                f"{len(self.item_map)} items, {user_items.nnz} nonzeros, "
+                f"{(self.user_factors.nbytes + self.item_factors.nbytes) / 1024 / 1024:.1f} MB of factors"
+            )
                 
         except Exception as e:
             logger.error(f"CF training failed: {e}")
@@ -233,24 +489,137 @@ class HybridRecommenderV2:
         """Precompute and cache top-K similar items for each product"""
         logger.info("Precomputing top-K similarities...")
         
-        for idx, product_id in enumerate(self.product_df['id']):
-            # Get top-K similar products
-            sim_scores = self.content_sim_matrix[idx]
-            top_indices = np.argsort(sim_scores)[::-1][1:settings.SIMILARITY_TOP_K + 1]
+        # Exact blockwise top-K for flat indexes, index queries for ANN indexes
+        if self.content_index.kind == "flat":
+            self.neighbor_table = build_neighbor_table(self.product_embeddings)
+        else:
+            self.neighbor_table = build_neighbor_table_from_index(
+                self.content_index, self.product_embeddings
+            )
+        
+        logger.info(
+            f"Neighbor table built: {self.neighbor_table.indices.size} entries, "
+            f"{self.neighbor_table.nbytes / 1024 / 1024:.1f} MB"
+        )
+        
+        # Cache (neighbor ids, scores) array pairs one pipelined chunk at a time
+        chunk_size = settings.CACHE_PIPELINE_CHUNK_SIZE
+        product_ids = self.product_ids.tolist()
+        for start in range(0, len(product_ids), chunk_size):
+            stop = min(start + chunk_size, len(product_ids))
+            generations = CacheManager.get_product_generations(product_ids[start:stop])
+            similar_lists = {}
+            for idx, generation in zip(range(start, stop), generations):
+                neighbor_rows, neighbor_scores = self.neighbor_table.neighbors(idx)
+                similar_lists[CacheManager.get_similarity_key(product_ids[idx], generation)] = (
+                    self.product_ids[neighbor_rows], neighbor_scores
+                )
+            mset_cache(similar_lists, ttl=CacheManager.TTL_DAY, chunk_size=chunk_size)
+        
+        logger.info(f"Precomputed similarities for {len(self.product_df)} products")
+    
+    def upsert_product(self, product: models.Product):
+        """
+        Add a new or edited product to the trained model without a full retrain.
+        
+        Encodes the single product, then applies it to the vector index,
+        neighbor table and id maps while scoring waits (lists that held an
+        edited product are searched again), and invalidates only the cache
+        entries whose neighbor lists changed.
+        """
+        if not self.is_trained:
+            return
+        
+        try:
+            with self._update_lock:
+                self._upsert_product(product)
+        except Exception as e:
+            logger.error(f"Incremental update failed for product {product.id}: {e}", exc_info=True)
+    
+    def update_product_attributes(self, product: models.Product):
+        """
+        Apply a price or stock change of a known product in place.
+        
+        Only the attribute index and dataframe row change (no re-encoding),
+        so a product that sells out is filtered from the next request.
+        """
+        if not self.is_trained:
+            return
+        
+        with self._update_lock, self._state_lock.write():
+            row = self.product_id_to_idx.get(product.id)
+            if row is None:
+                return
+            self.attributes.set_price(row, product.price)
+            self.attributes.set_stock(row, product.stock_count)
+            self.product_df.loc[row, ['price', 'stock_count']] = [product.price or 0.0, product.stock_count or 0]
+    
+    def _upsert_product(self, product: models.Product):
+        start = time.perf_counter()
+        top_k = settings.SIMILARITY_TOP_K
+        
+        # Encoding is the slow part and touches no scoring state: done before readers wait.
+        # The training process owns the embedding store's files, so nothing is appended here.
+        record = self._product_record(product)
+        record_df = pd.DataFrame([record])
+        vector = normalize_embeddings(
+            self.embedding_store.encode(self._content_text(record_df).tolist(), self.encoder, persist=False)
+        )
+        
+        with self._state_lock.write():
+            # Step 1: Place the vector in the index and the product row in every row-aligned array
+            row = self.product_id_to_idx.get(product.id)
+            is_new = row is None
+            if is_new:
+                row = int(self.content_index.add(vector)[0])
+                referencing = np.empty(0, dtype=np.int64)
+                self.product_df = pd.concat([self.product_df, record_df], ignore_index=True)
+            else:
+                referencing = self.neighbor_table.rows_referencing(row)
+                self.content_index.update(row, vector)
+                self.product_df.loc[row, list(record)] = list(record.values())
+            self.product_embeddings = self.content_index.vectors
+            if is_new and self.has_cf:
+                # No interactions yet: zero CF factors until the next retrain
+                self.item_factors = np.vstack([self.item_factors, np.zeros((1, self.item_factors.shape[1]), dtype=np.float32)])
+            self.attributes.set_row(row, record['category'], record['brand'], record['price'], record['stock_count'])
+            if is_new:
+                self.product_ids = np.append(self.product_ids, np.int64(product.id))
+            # Last: _still_match reads the id map without the lock
+            self.product_id_to_idx[product.id] = row
             
-            similar_products = [
-                {
-                    'product_id': int(self.product_df.iloc[i]['id']),
-                    'score': float(sim_scores[i])
-                }
-                for i in top_indices
-            ]
+            # Step 2: The product's own top-K neighbors
+            sim_scores, top_indices = self.content_index.search(vector, top_k + 1)
+            keep = (top_indices[0] >= 0) & (top_indices[0] != row)
+            neighbor_rows = top_indices[0][keep][:top_k]
+            self.neighbor_table.set_row(row, neighbor_rows, sim_scores[0][keep][:top_k])
             
-            # Cache the results
-            cache_key = CacheManager.get_similarity_key(product_id)
-            set_cache(cache_key, similar_products, ttl=CacheManager.TTL_DAY)
+            # Step 3: Lists that held the old version are searched again (it may no longer
+            # belong in them); the new neighbors are offered the product
+            changed = []
+            if len(referencing):
+                ref_scores, ref_indices = self.content_index.search(self.product_embeddings[referencing], top_k + 1)
+                for ref_row, row_scores, row_indices in zip(referencing.tolist(), ref_scores, ref_indices):
+                    keep = (row_indices >= 0) & (row_indices != ref_row)
+                    self.neighbor_table.set_row(ref_row, row_indices[keep][:top_k], row_scores[keep][:top_k])
+                changed = referencing.tolist()
+            offered = np.setdiff1d(neighbor_rows, referencing)
+            if len(offered):
+                offered_scores = self.content_index.pairwise(offered, [row])[:, 0]
+                changed += self.neighbor_table.offer(row, offered, offered_scores)
+            changed_ids = self.product_ids[changed].tolist() if len(changed) else []
         
-        logger.info(f"Precomputed similarities for {len(self.product_df)} products")
+        # Step 4: Invalidate only the affected cache entries (similar-items lists are
+        # keyed by the seed's generation) and materialized lists
+        CacheManager.invalidate_products_cache([product.id] + changed_ids)
+        self._materialized_stale.add(product.id)
+        self._materialized_stale.update(changed_ids)
+        
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        logger.info(
+            f"{'Added' if is_new else 'Updated'} product {product.id} in {elapsed_ms:.1f}ms "
+            f"({len(changed)} neighbor lists updated)"
+        )
     
     def get_recommendations(
         self,
@@ -259,7 +628,9 @@ class HybridRecommenderV2:
         product_id: Optional[int] = None,
         category: Optional[str] = None,
         top_n: int = 10,
-        diversity_factor: float = 0.3
+        diversity_factor: float = 0.3,
+        candidate_pool: Optional[int] = None,
+        filters: Optional[ProductFilter] = None
     ) -> List[int]:
         """
         Get hybrid recommendations.
@@ -268,62 +639,398 @@ class HybridRecommenderV2:
             db: Database session
             user_id: User ID for personalization
             product_id: Product ID for similar items
-            category: Filter by category
+            category: Filter by category (ignored when filters is given)
             top_n: Number of recommendations
             diversity_factor: 0-1, higher = more diverse
+            candidate_pool: Diversify only the top-M candidates (None = setting)
+            filters: Combined category / brand / price / stock constraints
         
         Returns:
             List of recommended product IDs
         """
-        # Ensure model is trained
+        filters = filters or ProductFilter(category=category)
+        
+        # Training runs in the background worker; serve popular items until a model is published
         if not self.is_trained:
-            self.fit(db)
-            if not self.is_trained:
-                return self._get_fallback_recommendations(db, category, top_n)
+            return self._get_fallback_recommendations(db, filters, top_n)
         
-        # Check cache first
-        cache_key = CacheManager.get_recommendations_key(
-            user_id or 0,
-            f"{product_id or 0}_{category or 'all'}_{top_n}"
-        )
-        cached_recs = get_cache(cache_key)
-        if cached_recs:
-            logger.debug(f"Cache hit for recommendations: {cache_key}")
-            return cached_recs
+        # Precomputed candidates only need filtering and re-ranking
+        with self._state_lock.read():
+            materialized = self._get_materialized_recommendations(user_id, product_id, filters, top_n, diversity_factor)
+        if materialized is not None:
+            return materialized
         
-        try:
-            # Get candidate scores
-            scores = self._compute_hybrid_scores(db, user_id, product_id, category)
-            
-            # Apply diversity re-ranking if requested
-            if diversity_factor > 0:
-                recommendations = self._diversify_results(scores, top_n, diversity_factor)
-            else:
+        cache_key = self._recommendations_cache_key(user_id, product_id, filters, top_n)
+        
+        def compute(session: Session) -> List[int]:
+            with self._state_lock.read():
+                # Get candidate scores
+                scores = self._compute_hybrid_scores(session, user_id, product_id, filters)
+                
+                # Apply diversity re-ranking if requested
+                if diversity_factor > 0:
+                    return self._diversify_results(scores, top_n, diversity_factor, candidate_pool)
                 # Simple top-N
-                sorted_scores = sorted(scores.items(), key=lambda x: x[1], reverse=True)
-                recommendations = [pid for pid, _ in sorted_scores[:top_n]]
-            
-            # Cache results
-            set_cache(cache_key, recommendations, ttl=CacheManager.TTL_RECOMMENDATIONS)
-            
-            return recommendations
+                return self.product_ids[self._top_n_rows(scores, top_n)].tolist()
+        
+        def refresh() -> List[int]:
+            # Background refreshes outlive the request's session
+            session = ReadSessionLocal()
+            try:
+                return compute(session)
+            finally:
+                session.close()
+        
+        try:
+            # Concurrent misses compute once; an expired list is served while one refresh runs.
+            # Lists holding products that no longer pass (e.g. sold out) count as misses.
+            return get_or_compute(
+                cache_key,
+                lambda: compute(db),
+                ttl=CacheManager.TTL_RECOMMENDATIONS,
+                refresh=refresh,
+                validate=lambda recs: bool(recs) and self._still_match(recs, filters)
+            )
             
         except Exception as e:
             logger.error(f"Recommendation generation failed: {e}", exc_info=True)
-            return self._get_fallback_recommendations(db, category, top_n)
+            return self._get_fallback_recommendations(db, filters, top_n)
     
-    def _compute_hybrid_scores(
+    def _recommendations_cache_key(
+        self,
+        user_id: Optional[int],
+        product_id: Optional[int],
+        filters: ProductFilter,
+        top_n: int,
+        user_generation: Optional[int] = None,
+        product_generation: Optional[int] = None
+    ) -> str:
+        # The seed's generation is bumped when it (or its neighbor list) is edited
+        if product_id and product_generation is None:
+            product_generation = CacheManager.get_product_generations([product_id])[0]
+        seed = f"{product_id}.{product_generation}" if product_id else "0"
+        return CacheManager.get_recommendations_key(
+            user_id or 0,
+            f"{seed}_{filters.cache_context()}_{top_n}",
+            self.model_generation,
+            user_generation
+        )
+    
+    async def get_cached_recommendations_async(
+        self,
+        user_id: Optional[int] = None,
+        product_id: Optional[int] = None,
+        top_n: int = 10,
+        filters: Optional[ProductFilter] = None
+    ) -> Optional[List[int]]:
+        """
+        The fresh cached list get_recommendations would return, read with redis.asyncio.
+        
+        Lets async callers answer cache hits on the event loop and send only
+        misses, stale entries and materialized lookups to a scoring thread.
+        
+        Returns:
+            Recommended product IDs, or None if get_recommendations has to run
+        """
+        if not self.is_trained:
+            return None
+        filters = filters or ProductFilter()
+        
+        user_generation = (await CacheManager.get_user_generations_async([user_id or 0]))[0]
+        product_generation = (await CacheManager.get_product_generations_async([product_id]))[0] if product_id else None
+        cache_key = self._recommendations_cache_key(
+            user_id, product_id, filters, top_n, user_generation, product_generation
+        )
+        recs, fresh = await get_cache_entry_async(cache_key)
+        if recs and fresh and self._still_match(recs, filters):
+            return recs
+        return None
+    
+    def get_recommendations_batch(
         self,
         db: Session,
+        user_ids: Optional[List[Optional[int]]] = None,
+        product_ids: Optional[List[Optional[int]]] = None,
+        category: Optional[str] = None,
+        top_n: int = 10,
+        diversity_factor: float = 0.3,
+        batch_size: Optional[int] = None,
+        filters: Optional[ProductFilter] = None
+    ) -> List[List[int]]:
+        """
+        Hybrid recommendations for many requests in one call.
+        
+        Request i is (user_ids[i], product_ids[i]); either list may be
+        omitted. Cache misses are scored batch_size requests at a time as
+        matrix operations: one GEMM of the block's user factors against the
+        item factors, one scatter of the seeds' neighbor lists, and a
+        thresholded top-N selection per row.
+        
+        Args:
+            db: Database session
+            user_ids: User IDs for personalization
+            product_ids: Seed product IDs for similar items
+            category: Filter by category (ignored when filters is given)
+            top_n: Number of recommendations per request
+            diversity_factor: 0-1, higher = more diverse
+            batch_size: Requests scored per block (None = setting); each
+                block holds batch_size x n_products floats
+            filters: Combined constraints, applied to every request
+        
+        Returns:
+            One list of recommended product IDs per request, in request order
+        """
+        n_requests = max(len(user_ids or []), len(product_ids or []))
+        user_ids = list(user_ids) if user_ids else [None] * n_requests
+        product_ids = list(product_ids) if product_ids else [None] * n_requests
+        if len(user_ids) != len(product_ids):
+            raise ValueError("user_ids and product_ids must have the same length when both are given")
+        filters = filters or ProductFilter(category=category)
+        
+        if not self.is_trained:
+            fallback = self._get_fallback_recommendations(db, filters, top_n)
+            return [list(fallback) for _ in range(n_requests)]
+        
+        # Step 1: Serve materialized and cached results
+        results: List[Optional[List[int]]] = [None] * n_requests
+        user_generations = CacheManager.get_user_generations([uid or 0 for uid in user_ids])
+        product_generations = CacheManager.get_product_generations([pid or 0 for pid in product_ids])
+        cache_keys = [
+            self._recommendations_cache_key(uid, pid, filters, top_n, user_generation, product_generation)
+            for uid, pid, user_generation, product_generation in zip(
+                user_ids, product_ids, user_generations, product_generations
+            )
+        ]
+        unserved = []
+        with self._state_lock.read():
+            for i in range(n_requests):
+                results[i] = self._get_materialized_recommendations(
+                    user_ids[i], product_ids[i], filters, top_n, diversity_factor
+                )
+                if results[i] is None:
+                    unserved.append(i)
+        
+        # One pipelined read for the rest; stale entries are rescored here
+        # rather than refreshed in the background
+        misses = []
+        cached = mget_cache_entries([cache_keys[i] for i in unserved])
+        for i, (cached_recs, fresh) in zip(unserved, cached):
+            if cached_recs and fresh and self._still_match(cached_recs, filters):
+                results[i] = cached_recs
+            else:
+                misses.append(i)
+        
+        # Step 2: Score the misses block by block
+        batch_size = batch_size or settings.RECOMMENDATION_BATCH_SIZE
+        for start in range(0, len(misses), batch_size):
+            block = misses[start:start + batch_size]
+            try:
+                with self._state_lock.read():
+                    scores = self._compute_hybrid_scores_batch(
+                        db, [user_ids[i] for i in block], [product_ids[i] for i in block], filters
+                    )
+                    if diversity_factor > 0:
+                        block_recs = [
+                            self._diversify_results(row_scores, top_n, diversity_factor)
+                            for row_scores in scores
+                        ]
+                    else:
+                        block_recs = self._top_n_ids_batch(scores, top_n)
+            except Exception as e:
+                logger.error(f"Batch recommendation generation failed: {e}", exc_info=True)
+                fallback = self._get_fallback_recommendations(db, filters, top_n)
+                block_recs = [list(fallback) for _ in block]
+            
+            # Step 3: Place results and cache the block in one pipelined write
+            for i, recs in zip(block, block_recs):
+                results[i] = recs
+            mset_cache_entries(
+                {cache_keys[i]: recs for i, recs in zip(block, block_recs)},
+                ttl=CacheManager.TTL_RECOMMENDATIONS
+            )
+        
+        return results
+    
+    def _still_match(self, product_ids: List[int], filters: ProductFilter) -> bool:
+        """Whether every product of a stored list still exists and passes the filters"""
+        rows = np.fromiter(
+            (self.product_id_to_idx.get(pid, -1) for pid in product_ids), dtype=np.int64, count=len(product_ids)
+        )
+        return bool((rows >= 0).all() and self.attributes.matches(rows, filters).all())
+    
+    def _get_materialized_recommendations(
+        self,
         user_id: Optional[int],
         product_id: Optional[int],
-        category: Optional[str]
-    ) -> Dict[int, float]:
-        """Compute hybrid scores combining all signals"""
+        filters: Optional[ProductFilter],
+        top_n: int,
+        diversity_factor: float
+    ) -> Optional[List[int]]:
+        """
+        Recommendations from the materialized top-N lists.
+        
+        The stored candidates are filtered by attributes and re-ranked (MMR)
+        for diversity. Requests combining a user and a seed, edited seeds,
+        and requests the stored candidates cannot fill are scored live.
+        
+        Returns:
+            Recommended product IDs, or None to fall through to live scoring
+        """
+        store = self.materialized
+        if store is None or (user_id is not None and product_id is not None):
+            return None
+        
+        if product_id is not None:
+            if product_id in self._materialized_stale:
+                return None
+            entry = store.get(PRODUCTS, product_id)
+        else:
+            entry = store.get(USERS, user_id if user_id in self.user_map else ANONYMOUS_USER)
+        if entry is None:
+            return None
+        
+        ids, scores = entry
+        rows = np.fromiter((self.product_id_to_idx.get(pid, -1) for pid in ids.tolist()), dtype=np.int64, count=len(ids))
+        keep = (rows >= 0) & self.attributes.matches(rows, filters)
+        rows, scores = rows[keep], scores[keep]
+        if len(rows) < top_n:
+            return None
+        
+        if diversity_factor > 0:
+            order = np.argsort(rows)  # same candidate order as _diversify_results
+            rows, scores = rows[order], scores[order]
+            return self.product_ids[rows[self._mmr_select(rows, scores, top_n, diversity_factor)]].tolist()
+        return self.product_ids[rows[:top_n]].tolist()
+    
+    def _compute_hybrid_scores_batch(
+        self,
+        db: Session,
+        user_ids: List[Optional[int]],
+        product_ids: List[Optional[int]],
+        filters: Optional[ProductFilter]
+    ) -> np.ndarray:
+        """
+        _compute_hybrid_scores for a block of requests.
+        
+        The block is built in place in one preallocated array (CF GEMM,
+        popularity broadcast, sparse content scatter) so each step is a
+        single pass over batch x n_products floats.
+        
+        Returns:
+            (len(user_ids), n_products) float32 array; excluded entries are -inf
+        """
+        scores = np.empty((len(user_ids), len(self.product_ids)), dtype=np.float32)
+        
+        # 1. Collaborative filtering (written into scores)
+        self._get_cf_scores_batch(user_ids, out=scores, weight=settings.COLLABORATIVE_WEIGHT)
+        
+        # 2. Popularity
+        scores += np.float32(settings.POPULARITY_WEIGHT) * self._get_popularity_scores(db)
+        
+        # 3. Content-based: only the seeds' top-K neighbors are nonzero
+        owners, columns, values = self._get_content_entries_batch(product_ids)
+        scores[owners, columns] += np.float32(settings.CONTENT_WEIGHT) * values
+        
+        # One combined attribute mask for the whole block
+        mask = self.attributes.mask(filters)
+        if mask is not None:
+            np.copyto(scores, -np.inf, where=~mask)
+        
+        # Skip each request's seed product
+        seeds = [(i, self.product_id_to_idx[pid]) for i, pid in enumerate(product_ids) if pid in self.product_id_to_idx]
+        if seeds:
+            positions, seed_rows = zip(*seeds)
+            scores[list(positions), list(seed_rows)] = -np.inf
+        
+        return scores
+    
+    def _get_content_entries_batch(
+        self,
+        product_ids: List[Optional[int]]
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Content scores for many seeds as sparse entries of the neighbor table.
+        
+        Returns:
+            (request positions, product rows, similarity scores) of every
+            neighbor of every known seed
+        """
+        seeds = [(i, self.product_id_to_idx[pid]) for i, pid in enumerate(product_ids) if pid in self.product_id_to_idx]
+        if not seeds:
+            empty = np.empty(0, dtype=np.int64)
+            return empty, empty, np.empty(0, dtype=np.float32)
+        
+        positions, seed_rows = (np.asarray(column) for column in zip(*seeds))
+        table = self.neighbor_table
+        starts = table.indptr[seed_rows].astype(np.int64)
+        counts = table.indptr[seed_rows + 1] - starts
+        
+        # Flat offsets of each seed's neighbor entries: starts[s], starts[s] + 1, ...
+        offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts) + np.repeat(starts, counts)
+        return np.repeat(positions, counts), table.indices[offsets], table.scores[offsets]
+    
+    # Groups per row when bounding the top-N threshold in _top_n_ids_batch
+    TOP_N_GROUPS_PER_ITEM = 64
+    
+    def _top_n_ids_batch(self, scores: np.ndarray, top_n: int) -> List[List[int]]:
+        """Product IDs of each row's top_n finite scores, best first"""
+        return [self.product_ids[rows].tolist() for rows in self._top_n_rows_batch(scores, top_n)]
+    
+    def _top_n_rows_batch(self, scores: np.ndarray, top_n: int) -> List[np.ndarray]:
+        """
+        Product rows of each row's top_n finite scores, best first.
+        
+        Instead of an argpartition over every row, each row is split into
+        groups and the top_n-th largest group maximum is taken as a
+        threshold: at least top_n scores reach it, so the top_n are among
+        the (few) entries at or above it.
+        """
+        n = scores.shape[1]
+        k = min(top_n, n)
+        if k <= 0:
+            return [np.empty(0, dtype=np.int64) for _ in range(len(scores))]
         
-        all_product_ids = self.product_df['id'].tolist()
-        scores = {}
+        groups = min(n, self.TOP_N_GROUPS_PER_ITEM * k)
+        group_max = np.maximum.reduceat(scores, np.linspace(0, n, groups, endpoint=False, dtype=np.int64), axis=1)
+        threshold = np.partition(group_max, groups - k, axis=1)[:, groups - k]
+        
+        results = []
+        for row_scores, row_threshold in zip(scores, threshold):
+            candidates = np.flatnonzero(row_scores >= row_threshold)
+            candidates = candidates[np.isfinite(row_scores[candidates])]
+            results.append(self._top_n_rows_of(row_scores, candidates, k))
+        return results
+    
+    @staticmethod
+    def _top_n_rows_of(scores: np.ndarray, rows: np.ndarray, top_n: int) -> np.ndarray:
+        """
+        The top_n of the given rows (ascending) by score, best first.
+        
+        Ties go to the lower row, so the result does not depend on which
+        other candidate rows were passed in.
+        """
+        values = scores[rows]
+        if len(rows) > top_n:
+            kth = np.partition(values, len(values) - top_n)[len(values) - top_n]
+            above = np.flatnonzero(values > kth)
+            ties = np.flatnonzero(values == kth)[:top_n - len(above)]
+            selected = np.concatenate((above, ties))
+            rows, values = rows[selected], values[selected]
+        return rows[np.lexsort((rows, -values))]
+    
+    def _compute_hybrid_scores(
+        self,
+        db: Session,
+        user_id: Optional[int],
+        product_id: Optional[int],
+        filters: Optional[ProductFilter]
+    ) -> np.ndarray:
+        """
+        Compute hybrid scores combining all signals.
         
+        Returns:
+            float32 array aligned to product row order; excluded rows are -inf
+        """
         # 1. Content-Based Scores
         content_scores = self._get_content_scores(product_id)
         
@@ -331,36 +1038,36 @@ class HybridRecommenderV2:
         cf_scores = self._get_cf_scores(user_id)
         
         # 3. Popularity Scores
-        popularity_scores = self._get_popularity_scores(db, all_product_ids)
+        popularity_scores = self._get_popularity_scores(db)
         
-        # 4. Combine scores
-        for pid in all_product_ids:
-            # Skip the seed product
-            if product_id and pid == product_id:
-                continue
-            
-            # Filter by category if specified
-            if category:
-                product_cat = self.product_df[self.product_df['id'] == pid]['category'].values[0]
-                if product_cat != category:
-                    continue
-            
-            # Weighted combination
-            score = (
-                settings.CONTENT_WEIGHT * content_scores.get(pid, 0) +
-                settings.COLLABORATIVE_WEIGHT * cf_scores.get(pid, 0) +
-                settings.POPULARITY_WEIGHT * popularity_scores.get(pid, 0)
-            )
-            
-            scores[pid] = score
+        # 4. Weighted combination
+        scores = (
+            np.float32(settings.CONTENT_WEIGHT) * content_scores +
+            np.float32(settings.COLLABORATIVE_WEIGHT) * cf_scores +
+            np.float32(settings.POPULARITY_WEIGHT) * popularity_scores
+        )
+        
+        # Apply category / brand / price / stock filters as one mask
+        mask = self.attributes.mask(filters)
+        if mask is not None:
+            scores[~mask] = -np.inf
+        
+        # Skip the seed product
+        if product_id is not None and product_id in self.product_id_to_idx:
+            scores[self.product_id_to_idx[product_id]] = -np.inf
         
         return scores
     
-    def _get_content_scores(self, product_id: Optional[int]) -> Dict[int, float]:
-        """Get content-based similarity scores"""
-        scores = {}
+    @classmethod
+    def _top_n_rows(cls, scores: np.ndarray, top_n: int) -> np.ndarray:
+        """Rows of the top_n finite scores, best first (argpartition + small sort)"""
+        return cls._top_n_rows_of(scores, np.flatnonzero(np.isfinite(scores)), top_n)
+    
+    def _get_content_scores(self, product_id: Optional[int]) -> np.ndarray:
+        """Get content-based similarity scores aligned to product rows"""
+        scores = np.zeros(len(self.product_ids), dtype=np.float32)
         
-        if product_id is None:
+        if product_id is None or product_id not in self.product_id_to_idx:
             return scores
         
         try:
@@ -368,137 +1075,176 @@ class HybridRecommenderV2:
             cache_key = CacheManager.get_similarity_key(product_id)
             cached_similar = get_cache(cache_key)
             
-            if cached_similar:
-                return {item['product_id']: item['score'] for item in cached_similar}
-            
-            # Compute on-the-fly if not cached
-            idx = self.product_df[self.product_df['id'] == product_id].index[0]
-            sim_scores = self.content_sim_matrix[idx]
+            if cached_similar is not None:
+                if isinstance(cached_similar, tuple):
+                    neighbor_ids, neighbor_scores = cached_similar
+                else:
+                    # JSON list of {'product_id', 'score'} dicts cached before the packed codec
+                    neighbor_ids = [item['product_id'] for item in cached_similar]
+                    neighbor_scores = np.array([item['score'] for item in cached_similar], dtype=np.float32)
+                rows = np.fromiter(
+                    (self.product_id_to_idx.get(pid, -1) for pid in np.asarray(neighbor_ids).tolist()),
+                    dtype=np.int64, count=len(neighbor_ids)
+                )
+                keep = rows >= 0
+                scores[rows[keep]] = np.asarray(neighbor_scores)[keep]
+                return scores
             
-            for i, pid in enumerate(self.product_df['id']):
-                scores[pid] = float(sim_scores[i])
+            # Read the in-memory neighbor table if not cached
+            idx = self.product_id_to_idx[product_id]
+            neighbor_rows, neighbor_scores = self.neighbor_table.neighbors(idx)
+            scores[neighbor_rows] = neighbor_scores
             
         except Exception as e:
             logger.warning(f"Content scoring failed: {e}")
         
         return scores
     
-    def _get_cf_scores(self, user_id: Optional[int]) -> Dict[int, float]:
-        """Get collaborative filtering scores"""
-        scores = {}
+    def _get_cf_scores(self, user_id: Optional[int]) -> np.ndarray:
+        """Get collaborative filtering scores aligned to product rows"""
+        scores = np.zeros(len(self.product_ids), dtype=np.float32)
         
         if not self.has_cf or user_id is None:
             return scores
         
-        if user_id not in self.preds_df.index:
+        if user_id not in self.user_map:
             return scores
         
         try:
-            user_preds = self.preds_df.loc[user_id]
-            max_pred = user_preds.max() if user_preds.max() > 0 else 1.0
-            
-            for pid in user_preds.index:
-                # Normalize to 0-1
-                scores[pid] = float(max(0, user_preds[pid]) / max_pred)
+            # One dot product of the user's factors against every item's factors
+            user_preds = self.item_factors @ self.user_factors[self.user_map[user_id]]
+            scores = self._normalize_cf_scores(user_preds)
         
         except Exception as e:
             logger.warning(f"CF scoring failed: {e}")
         
         return scores
     
-    def _get_popularity_scores(self, db: Session, product_ids: List[int]) -> Dict[int, float]:
-        """Get time-decayed popularity scores"""
-        
-        # Get interactions from last 30 days
-        cutoff_date = datetime.now() - timedelta(days=30)
-        
-        interactions = db.query(
-            models.Interaction.product_id,
-            func.count(models.Interaction.id).label('count'),
-            func.max(models.Interaction.timestamp).label('latest')
-        ).filter(
-            models.Interaction.timestamp >= cutoff_date
-        ).group_by(
-            models.Interaction.product_id
-        ).all()
-        
-        # Calculate time-decayed scores
-        scores = {}
-        max_count = max([i.count for i in interactions]) if interactions else 1
-        
-        for interaction in interactions:
-            # Time decay: newer interactions weighted higher
-            days_ago = (datetime.now() - interaction.latest).days
-            time_weight = np.exp(-days_ago / 30)  # Exponential decay
-            
-            # Normalize count and apply time weight
-            score = (interaction.count / max_count) * time_weight
-            scores[interaction.product_id] = score
+    def _get_cf_scores_batch(
+        self,
+        user_ids: List[Optional[int]],
+        out: Optional[np.ndarray] = None,
+        weight: float = 1.0
+    ) -> np.ndarray:
+        """
+        Collaborative filtering scores for many users with one GEMM.
+        
+        Args:
+            user_ids: Users to score (unknown users get zero rows)
+            out: Optional (len(user_ids), n_products) float32 array to fill
+            weight: Scale applied to the normalized scores
         
-        # Fill missing products with 0
-        for pid in product_ids:
-            if pid not in scores:
-                scores[pid] = 0.0
+        Returns:
+            (len(user_ids), n_products) float32 array of weight * normalized scores
+        """
+        scores = out if out is not None else np.empty((len(user_ids), len(self.product_ids)), dtype=np.float32)
+        
+        if not self.has_cf:
+            scores.fill(0)
+            return scores
         
+        # Unknown users get zero factors, hence all-zero predictions
+        factors = np.zeros((len(user_ids), self.user_factors.shape[1]), dtype=np.float32)
+        positions = [i for i, uid in enumerate(user_ids) if uid in self.user_map]
+        if positions:
+            factors[positions] = self.user_factors[[self.user_map[user_ids[i]] for i in positions]]
+        np.matmul(factors, self.item_factors.T, out=scores)
+        
+        # _normalize_cf_scores, in place
+        max_pred = scores.max(axis=1, keepdims=True)
+        max_pred[max_pred <= 0] = 1.0
+        np.maximum(scores, 0, out=scores)
+        scores *= np.float32(weight) / max_pred
         return scores
     
+    @staticmethod
+    def _normalize_cf_scores(preds: np.ndarray) -> np.ndarray:
+        """Clip negatives and scale each row to 0-1 by its maximum"""
+        max_pred = preds.max(axis=-1, keepdims=True)
+        max_pred[max_pred <= 0] = 1.0
+        return (np.maximum(preds, 0) / max_pred).astype(np.float32, copy=False)
+    
+    def _get_popularity_scores(self, db: Session) -> np.ndarray:
+        """Get time-decayed popularity scores aligned to product rows"""
+        # Maintained in memory as interactions are written; built from the DB once,
+        # concurrent first requests sharing one rebuild
+        if not popularity_tracker.is_built:
+            single_flight.do("popularity:rebuild", lambda: popularity_tracker.rebuild(db))
+        return popularity_tracker.scores(self.product_ids)
+    
     def _diversify_results(
         self,
-        scores: Dict[int, float],
+        scores: np.ndarray,
         top_n: int,
-        diversity_factor: float
+        diversity_factor: float,
+        candidate_pool: Optional[int] = None
     ) -> List[int]:
         """
         Apply MMR (Maximal Marginal Relevance) for diversity.
         Balances relevance with diversity.
+        
+        Keeps a running "max similarity to the selected set" vector over the
+        candidate pool and updates it with one matrix-vector product per
+        selected item, so the cost is O(top_n * candidates * d).
+        
+        Args:
+            scores: Hybrid scores aligned to product rows (-inf = excluded)
+            top_n: Number of items to select
+            diversity_factor: MMR lambda, weight of relevance vs. similarity
+            candidate_pool: Only diversify the top-M candidates by relevance
+                (defaults to settings.MMR_CANDIDATE_POOL, 0 = all)
         """
-        if not scores:
+        candidate_pool = settings.MMR_CANDIDATE_POOL if candidate_pool is None else candidate_pool
+        
+        candidates = np.flatnonzero(np.isfinite(scores))
+        if candidate_pool and len(candidates) > candidate_pool:
+            candidates = np.sort(candidates[np.argpartition(-scores[candidates], candidate_pool - 1)[:candidate_pool]])
+        if not len(candidates):
             return []
         
-        selected = []
-        candidates = list(scores.keys())
+        selected = self._mmr_select(candidates, scores[candidates], top_n, diversity_factor)
+        return self.product_ids[candidates[selected]].tolist()
+    
+    def _mmr_select(
+        self,
+        candidates: np.ndarray,
+        relevance: np.ndarray,
+        top_n: int,
+        diversity_factor: float
+    ) -> List[int]:
+        """
+        Greedy MMR selection over candidate product rows.
+        
+        Returns:
+            Positions into candidates, in selection order
+        """
+        all_vectors = self.content_index.vectors
+        vectors = all_vectors if len(candidates) == len(all_vectors) else all_vectors[candidates]
+        available = np.ones(len(candidates), dtype=bool)
         
         # Start with highest scored item
-        best_candidate = max(candidates, key=lambda x: scores[x])
-        selected.append(best_candidate)
-        candidates.remove(best_candidate)
+        best = int(np.argmax(relevance))
+        selected = [best]
+        available[best] = False
+        max_sim = vectors @ vectors[best]
         
         # Iteratively select diverse items
-        while len(selected) < top_n and candidates:
-            mmr_scores = {}
-            
-            for candidate in candidates:
-                # Relevance score
-                relevance = scores[candidate]
-                
-                # Diversity score (minimum similarity to selected items)
-                try:
-                    cand_idx = self.product_df[self.product_df['id'] == candidate].index[0]
-                    max_sim = max([
-                        self.content_sim_matrix[
-                            cand_idx,
-                            self.product_df[self.product_df['id'] == sel].index[0]
-                        ]
-                        for sel in selected
-                    ])
-                except:
-                    max_sim = 0
-                
-                # MMR formula: λ * relevance - (1-λ) * max_similarity
-                mmr = diversity_factor * relevance - (1 - diversity_factor) * max_sim
-                mmr_scores[candidate] = mmr
+        while len(selected) < min(top_n, len(candidates)):
+            # MMR formula: λ * relevance - (1-λ) * max_similarity
+            mmr = diversity_factor * relevance - (1 - diversity_factor) * max_sim
+            mmr[~available] = -np.inf
             
-            # Select best MMR score
-            best_candidate = max(mmr_scores, key=lambda x: mmr_scores[x])
-            selected.append(best_candidate)
-            candidates.remove(best_candidate)
+            best = int(np.argmax(mmr))
+            selected.append(best)
+            available[best] = False
+            np.maximum(max_sim, vectors @ vectors[best], out=max_sim)
         
         return selected
     
     def _get_fallback_recommendations(
         self,
         db: Session,
-        category: Optional[str],
+        filters: Optional[ProductFilter],
         top_n: int
     ) -> List[int]:
         """Fallback to simple popularity-based recommendations"""
@@ -506,75 +1252,29 @@ class HybridRecommenderV2:
         
         query = db.query(models.Product.id).order_by(models.Product.rating.desc())
         
-        if category:
-            query = query.filter(models.Product.category == category)
+        if filters is not None:
+            if filters.category:
+                query = query.filter(models.Product.category == filters.category)
+            if filters.brand:
+                query = query.filter(models.Product.brand == filters.brand)
+            if filters.min_price is not None:
+                query = query.filter(models.Product.price >= filters.min_price)
+            if filters.max_price is not None:
+                query = query.filter(models.Product.price <= filters.max_price)
+            if filters.in_stock:
+                query = query.filter(models.Product.stock_count > 0)
         
         products = query.limit(top_n).all()
         return [p.id for p in products]
     
     def get_trending(self, db: Session, category: Optional[str] = None, top_n: int = 10) -> List[int]:
         """Get trending products (velocity-based)"""
-        
-        # Check cache
-        cache_key = CacheManager.get_trending_key(category or "all")
-        cached = get_cache(cache_key)
-        if cached:
-            return cached[:top_n]
-        
-        # Calculate trending (interactions in last 7 days vs previous 7 days)
-        now = datetime.now()
-        recent_cutoff = now - timedelta(days=7)
-        previous_cutoff = now - timedelta(days=14)
-        
-        # Recent interactions
-        recent_query = db.query(
-            models.Interaction.product_id,
-            func.count(models.Interaction.id).label('recent_count')
-        ).filter(
-            models.Interaction.timestamp >= recent_cutoff
-        ).group_by(models.Interaction.product_id)
-        
-        # Previous interactions
-        previous_query = db.query(
-            models.Interaction.product_id,
-            func.count(models.Interaction.id).label('previous_count')
-        ).filter(
-            and_(
-                models.Interaction.timestamp >= previous_cutoff,
-                models.Interaction.timestamp < recent_cutoff
-            )
-        ).group_by(models.Interaction.product_id)
-        
-        recent_df = pd.read_sql(recent_query.statement, db.bind)
-        previous_df = pd.read_sql(previous_query.statement, db.bind)
-        
-        # Merge and calculate velocity
-        trending_df = recent_df.merge(
-            previous_df,
-            on='product_id',
-            how='left'
-        ).fillna(0)
-        
-        trending_df['velocity'] = (
-            trending_df['recent_count'] - trending_df['previous_count']
-        ) / (trending_df['previous_count'] + 1)  # Avoid division by zero
-        
-        # Filter by category if needed
-        if category:
-            product_ids = db.query(models.Product.id).filter(
-                models.Product.category == category
-            ).all()
-            category_ids = [p.id for p in product_ids]
-            trending_df = trending_df[trending_df['product_id'].isin(category_ids)]
-        
-        # Sort by velocity
-        trending_df = trending_df.sort_values('velocity', ascending=False)
-        result = trending_df['product_id'].tolist()
-        
-        # Cache results
-        set_cache(cache_key, result, ttl=CacheManager.TTL_TRENDING)
-        
-        return result[:top_n]
+        # Interactions in the last 7 days vs the previous 7 days, kept in memory;
+        # concurrent first requests share one rebuild, and a due re-ranking runs
+        # in the background while the previous rankings are served
+        if not trending_tracker.is_built:
+            single_flight.do("trending:rebuild", lambda: trending_tracker.rebuild(db))
+        return trending_tracker.top(category, top_n)
 
 
 # Global instance
@@ -0,0 +1,240 @@
+"""
+Offline materialization of top-N recommendation lists.
+
+Right after training, the top MATERIALIZE_TOP_N candidates by hybrid score
+(no diversity, no category filter) are computed for every known user and
+every product seed with the batch scoring kernels, and written to a
+compact store keyed by user / product ID:
+
+- "file": a sorted key array plus (keys x top_n) id and score matrices,
+  saved inside the model artifact, memory-mapped and looked up by binary
+  search
+- "redis": one hash per list kind and artifact version, field = key,
+  value = packed (ids, scores) arrays
+
+Either way the lists belong to the artifact they were computed from, so a
+model swap never serves another model's lists. At request time the engine
+only filters the stored candidates by category and re-ranks them for
+diversity.
+
+User key 0 holds the list for anonymous users and users without CF
+factors (their scores have no personal component).
+"""
+import logging
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from ..core.cache import CacheManager, get_hash_field, set_hash
+from ..core import cache
+from ..core.config import settings
+from ..models import models
+
+logger = logging.getLogger(__name__)
+
+USERS = "users"
+PRODUCTS = "products"
+
+# User key of the non-personalized list
+ANONYMOUS_USER = 0
+
+
+class MaterializedLists:
+    """Sorted int64 keys with fixed-width (product ids, scores) rows; short rows are padded with id -1"""
+
+    def __init__(self, keys: np.ndarray, ids: np.ndarray, scores: np.ndarray):
+        self.keys = keys
+        self.ids = ids
+        self.scores = scores
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    @property
+    def nbytes(self) -> int:
+        return self.keys.nbytes + self.ids.nbytes + self.scores.nbytes
+
+    def get(self, key: int) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """(product ids, scores) stored for key, best first"""
+        position = int(np.searchsorted(self.keys, key))
+        if position == len(self.keys) or self.keys[position] != key:
+            return None
+        ids = self.ids[position]
+        valid = ids >= 0
+        return ids[valid], self.scores[position][valid]
+
+    def save(self, directory: str, kind: str):
+        for name in ('keys', 'ids', 'scores'):
+            np.save(os.path.join(directory, f"materialized_{kind}_{name}.npy"), getattr(self, name))
+
+    @classmethod
+    def load(cls, directory: str, kind: str, mmap_mode: Optional[str] = None) -> "MaterializedLists":
+        return cls(*(
+            np.load(os.path.join(directory, f"materialized_{kind}_{name}.npy"), mmap_mode=mmap_mode)
+            for name in ('keys', 'ids', 'scores')
+        ))
+
+
+class FileMaterializedStore:
+    """Lists memory-mapped from the artifact directory"""
+
+    def __init__(self, lists: Dict[str, MaterializedLists]):
+        self.lists = lists
+
+    def get(self, kind: str, key: int) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        lists = self.lists.get(kind)
+        return lists.get(key) if lists is not None else None
+
+    @classmethod
+    def load(cls, directory: str, kinds: List[str]) -> "FileMaterializedStore":
+        return cls({kind: MaterializedLists.load(directory, kind, mmap_mode='r') for kind in kinds})
+
+
+class RedisMaterializedStore:
+    """Lists kept in Redis hashes, one per kind and artifact version"""
+
+    def __init__(self, version: str):
+        self.version = version
+
+    def get(self, kind: str, key: int) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        entry = get_hash_field(CacheManager.get_materialized_key(self.version, kind), str(key))
+        if entry is None:
+            return None
+        if isinstance(entry, dict):
+            # JSON written before the packed codec
+            return np.asarray(entry['ids'], dtype=np.int64), np.asarray(entry['scores'], dtype=np.float32)
+        ids, scores = entry
+        return ids.astype(np.int64), scores
+
+    @staticmethod
+    def write(version: str, kind: str, lists: MaterializedLists) -> bool:
+        mapping = {}
+        for key, ids, scores in zip(lists.keys.tolist(), lists.ids, lists.scores):
+            valid = ids >= 0
+            mapping[str(key)] = (ids[valid], scores[valid])
+        return set_hash(
+            CacheManager.get_materialized_key(version, kind), mapping, ttl=settings.MATERIALIZE_REDIS_TTL
+        )
+
+
+def open_materialized(directory: str, version: str, report: Optional[Dict]):
+    """
+    Open the materialized store described by an artifact manifest's report.
+
+    Returns:
+        A store with get(kind, key), or None if the artifact has no lists
+    """
+    if not report:
+        return None
+    kinds = [kind for kind in (USERS, PRODUCTS) if kind in report]
+    try:
+        if report['backend'] == "redis":
+            return RedisMaterializedStore(version) if cache.redis_client else None
+        return FileMaterializedStore.load(directory, kinds)
+    except Exception as e:
+        logger.warning(f"Failed to open materialized lists: {e}")
+        return None
+
+
+def _compute_lists(
+    model,
+    db: Session,
+    keys: np.ndarray,
+    user_ids: List[Optional[int]],
+    product_ids: List[Optional[int]],
+    top_n: int
+) -> MaterializedLists:
+    """Top-n candidates of each (user, seed) request, scored block by block"""
+    ids = np.full((len(keys), top_n), -1, dtype=np.int64)
+    scores = np.full((len(keys), top_n), -np.inf, dtype=np.float32)
+    batch_size = settings.RECOMMENDATION_BATCH_SIZE
+
+    for start in range(0, len(keys), batch_size):
+        stop = min(start + batch_size, len(keys))
+        block_scores = model._compute_hybrid_scores_batch(
+            db, user_ids[start:stop], product_ids[start:stop], None
+        )
+        for offset, rows in enumerate(model._top_n_rows_batch(block_scores, top_n)):
+            ids[start + offset, :len(rows)] = model.product_ids[rows]
+            scores[start + offset, :len(rows)] = block_scores[offset, rows]
+
+    return MaterializedLists(keys, ids, scores)
+
+
+def materialize(model, db: Session, directory: str, version: str) -> Dict:
+    """
+    Compute and store the top-N lists of a freshly trained model.
+
+    Args:
+        model: Trained HybridRecommenderV2
+        db: Database session (popularity, user counts)
+        directory: Artifact staging directory (file backend)
+        version: Artifact version the lists belong to (redis backend)
+
+    Returns:
+        Report with the backend, coverage and timings, stored in the
+        artifact manifest
+    """
+    start = time.perf_counter()
+    top_n = settings.MATERIALIZE_TOP_N
+    backend = settings.MATERIALIZE_BACKEND
+    if backend == "redis" and not cache.redis_client:
+        logger.warning("Redis unavailable, writing materialized lists to the artifact")
+        backend = "file"
+
+    computed = {}
+    report = {'backend': backend, 'top_n': top_n}
+
+    # Step 1: Every user with CF factors, plus the anonymous list
+    step = time.perf_counter()
+    user_keys = np.array([ANONYMOUS_USER] + sorted(model.user_map), dtype=np.int64)
+    computed[USERS] = _compute_lists(
+        model, db, user_keys, [None] + user_keys[1:].tolist(), [None] * len(user_keys), top_n
+    )
+    total_users = db.query(func.count(models.User.id)).scalar() or 0
+    report[USERS] = {
+        'materialized': len(user_keys) - 1,
+        'total': total_users,
+        'coverage': round(min(1.0, (len(user_keys) - 1) / total_users), 4) if total_users else 0.0,
+        'seconds': round(time.perf_counter() - step, 3),
+    }
+
+    # Step 2: Every product as a similar-items seed
+    if settings.MATERIALIZE_PRODUCTS:
+        step = time.perf_counter()
+        product_keys = np.sort(model.product_ids)
+        computed[PRODUCTS] = _compute_lists(
+            model, db, product_keys, [None] * len(product_keys), product_keys.tolist(), top_n
+        )
+        report[PRODUCTS] = {
+            'materialized': len(product_keys),
+            'total': len(model.product_ids),
+            'coverage': 1.0 if len(product_keys) else 0.0,
+            'seconds': round(time.perf_counter() - step, 3),
+        }
+
+    # Step 3: Write
+    step = time.perf_counter()
+    for kind, lists in computed.items():
+        report[kind]['short_lists'] = int((lists.ids[:, -1] < 0).sum())
+        if backend == "redis":
+            if not RedisMaterializedStore.write(version, kind, lists):
+                raise RuntimeError(f"Failed to write materialized {kind} lists to Redis")
+        else:
+            lists.save(directory, kind)
+    report['bytes'] = sum(lists.nbytes for lists in computed.values())
+    report['write_seconds'] = round(time.perf_counter() - step, 3)
+    report['elapsed_seconds'] = round(time.perf_counter() - start, 3)
+
+    logger.info(
+        f"Materialized top-{top_n} lists ({backend}): "
+        f"{report[USERS]['materialized']}/{total_users} users "
+        f"({report[USERS]['coverage']:.1%} coverage)"
+        + (f", {report[PRODUCTS]['materialized']} products" if PRODUCTS in report else "")
+        + f" in {report['elapsed_seconds']:.1f}s"
+    )
+    return report
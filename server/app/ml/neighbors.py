@@ -0,0 +1,216 @@
+"""
+Top-K item neighbor tables.
+
+Neighbors are stored CSR-style: row i's neighbors live in
+`indices[indptr[i]:indptr[i + 1]]` with matching `scores`, as int32 row
+positions and float32 cosine similarities. Rows are sorted by descending
+score and never include the item itself.
+"""
+import logging
+import os
+from typing import Optional, Tuple
+
+import numpy as np
+
+from ..core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class NeighborTable:
+    """Compact item -> top-K neighbors table"""
+
+    FILES = {
+        'indptr': 'neighbors_indptr.npy',
+        'indices': 'neighbors_indices.npy',
+        'scores': 'neighbors_scores.npy',
+    }
+
+    def __init__(self, indptr: np.ndarray, indices: np.ndarray, scores: np.ndarray):
+        self.indptr = indptr
+        self.indices = indices
+        self.scores = scores
+
+    def __len__(self) -> int:
+        return len(self.indptr) - 1
+
+    @property
+    def nbytes(self) -> int:
+        return self.indptr.nbytes + self.indices.nbytes + self.scores.nbytes
+
+    def neighbors(self, row: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Return (neighbor rows, scores) for one item row"""
+        start, stop = self.indptr[row], self.indptr[row + 1]
+        return self.indices[start:stop], self.scores[start:stop]
+
+    def rows_referencing(self, item_row: int) -> np.ndarray:
+        """Rows whose neighbor list contains item_row"""
+        positions = np.flatnonzero(self.indices == item_row)
+        return np.unique(np.searchsorted(self.indptr, positions, side='right') - 1)
+
+    def _ensure_writeable(self):
+        # Memory-mapped tables are read-only; copy on first write
+        for name in self.FILES:
+            array = getattr(self, name)
+            if not array.flags.writeable:
+                setattr(self, name, np.array(array))
+
+    def set_row(self, row: int, indices: np.ndarray, scores: np.ndarray):
+        """Replace one row's neighbors, or append a row when row == len(self)"""
+        self._ensure_writeable()
+        indices = np.asarray(indices, dtype=np.int32)
+        scores = np.asarray(scores, dtype=np.float32)
+
+        if row == len(self):
+            self.indptr = np.append(self.indptr, self.indptr[-1] + len(indices)).astype(np.int32)
+            self.indices = np.concatenate([self.indices, indices])
+            self.scores = np.concatenate([self.scores, scores])
+            return
+
+        start, stop = self.indptr[row], self.indptr[row + 1]
+        if stop - start == len(indices):
+            self.indices[start:stop] = indices
+            self.scores[start:stop] = scores
+        else:
+            self.indices = np.concatenate([self.indices[:start], indices, self.indices[stop:]])
+            self.scores = np.concatenate([self.scores[:start], scores, self.scores[stop:]])
+            self.indptr[row + 1:] += len(indices) - (stop - start)
+
+    def offer(self, item_row: int, rows: np.ndarray, scores: np.ndarray) -> list:
+        """
+        Offer item_row as a neighbor of each of rows.
+
+        Refreshes its score where it is already listed, otherwise displaces
+        the row's weakest neighbor if it scores higher.
+
+        Returns:
+            Rows whose neighbor lists changed
+        """
+        self._ensure_writeable()
+        changed = []
+
+        for row, score in zip(np.asarray(rows).tolist(), np.asarray(scores).tolist()):
+            start, stop = self.indptr[row], self.indptr[row + 1]
+            if row == item_row or stop == start:
+                continue
+
+            row_indices = self.indices[start:stop]
+            row_scores = self.scores[start:stop]
+            existing = np.flatnonzero(row_indices == item_row)
+
+            if existing.size:
+                row_scores[existing[0]] = score
+            elif score > row_scores[-1]:
+                row_indices[-1] = item_row
+                row_scores[-1] = score
+            else:
+                continue
+
+            order = np.argsort(-row_scores, kind='stable')
+            row_indices[:] = row_indices[order]
+            row_scores[:] = row_scores[order]
+            changed.append(row)
+
+        return changed
+
+    def save(self, directory: str):
+        """Write the table as raw .npy arrays into directory"""
+        os.makedirs(directory, exist_ok=True)
+        for name, filename in self.FILES.items():
+            np.save(os.path.join(directory, filename), getattr(self, name))
+
+    @classmethod
+    def load(cls, directory: str, mmap_mode: Optional[str] = None) -> "NeighborTable":
+        """Load a table written by save(), optionally memory-mapped"""
+        arrays = {
+            name: np.load(os.path.join(directory, filename), mmap_mode=mmap_mode)
+            for name, filename in cls.FILES.items()
+        }
+        return cls(**arrays)
+
+    @classmethod
+    def from_blocks(cls, row_indices: list, row_scores: list, counts: list) -> "NeighborTable":
+        """Assemble a table from per-block flattened neighbors and row counts"""
+        counts = np.concatenate(counts) if counts else np.empty(0, dtype=np.int64)
+        indptr = np.zeros(len(counts) + 1, dtype=np.int32)
+        np.cumsum(counts, out=indptr[1:])
+
+        def _concat(parts, dtype):
+            return np.concatenate(parts).astype(dtype, copy=False) if parts else np.empty(0, dtype=dtype)
+
+        return cls(indptr, _concat(row_indices, np.int32), _concat(row_scores, np.float32))
+
+
+def build_neighbor_table(
+    embeddings: np.ndarray,
+    k: Optional[int] = None,
+    block_size: Optional[int] = None
+) -> NeighborTable:
+    """
+    Exact top-K neighbors from normalized embeddings.
+
+    Similarities are computed one block of rows at a time (block_size x N
+    floats in memory) and argpartition keeps only the K best per row, so
+    cost is O(N^2 d) flops with O(N K) output and no full sort.
+    """
+    k = k or settings.SIMILARITY_TOP_K
+    block_size = block_size or settings.NEIGHBOR_BLOCK_SIZE
+    embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+    n = len(embeddings)
+    k = min(k, n - 1)
+
+    if k <= 0:
+        return NeighborTable.from_blocks([], [], [np.zeros(n, dtype=np.int64)])
+
+    indices = np.empty((n, k), dtype=np.int32)
+    scores = np.empty((n, k), dtype=np.float32)
+
+    for start in range(0, n, block_size):
+        stop = min(start + block_size, n)
+        sims = embeddings[start:stop] @ embeddings.T
+
+        # Exclude each item from its own neighbor list
+        local_rows = np.arange(stop - start)
+        sims[local_rows, local_rows + start] = -np.inf
+
+        top = np.argpartition(sims, -k, axis=1)[:, -k:]
+        top_scores = np.take_along_axis(sims, top, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+
+        indices[start:stop] = np.take_along_axis(top, order, axis=1)
+        scores[start:stop] = np.take_along_axis(top_scores, order, axis=1)
+
+    indptr = np.arange(0, n * k + 1, k, dtype=np.int32)
+    return NeighborTable(indptr, indices.ravel(), scores.ravel())
+
+
+def build_neighbor_table_from_index(
+    index,
+    embeddings: np.ndarray,
+    k: Optional[int] = None,
+    block_size: Optional[int] = None
+) -> NeighborTable:
+    """
+    Top-K neighbors by querying a VectorIndex one block at a time.
+
+    Used for approximate indexes, which may return fewer than K valid
+    neighbors for some rows; those rows are simply shorter.
+    """
+    k = k or settings.SIMILARITY_TOP_K
+    block_size = block_size or settings.NEIGHBOR_BLOCK_SIZE
+    row_indices, row_scores, counts = [], [], []
+
+    for start in range(0, len(embeddings), block_size):
+        block = embeddings[start:start + block_size]
+        block_scores, block_indices = index.search(block, k + 1)
+
+        # Drop missing results and self-matches, then keep the first K
+        self_rows = np.arange(start, start + len(block))[:, None]
+        keep = (block_indices >= 0) & (block_indices != self_rows)
+        keep &= np.cumsum(keep, axis=1) <= k
+
+        row_indices.append(block_indices[keep])
+        row_scores.append(block_scores[keep])
+        counts.append(keep.sum(axis=1))
+
+    return NeighborTable.from_blocks(row_indices, row_scores, counts)
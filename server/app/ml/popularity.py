@@ -0,0 +1,172 @@
+"""
+In-memory, time-decayed product popularity.
+
+Each product's score is a sum over its interactions of
+exp(-(now - t_i) / tau). Scores are stored relative to a reference time
+(`epoch`): an interaction at time t adds exp((t - epoch) / tau). The common
+factor exp(-(now - epoch) / tau) is only applied on read, so recording an
+interaction is one array add. Reads return scores normalized by the
+maximum, where that factor cancels, so a request-time read is a cached
+array gather with no database query.
+
+Scores live in a dense float64 array indexed by product id, which grows up
+to COUNTER_MAX_PRODUCT_ID; interactions with ids outside [0, that] are
+ignored rather than wrapping around or growing the array. The tracker is
+rebuilt from the database on startup. It is updated by every interaction
+this process writes and periodically resynced to include other workers'
+writes.
+"""
+import logging
+import threading
+import time
+from datetime import date, datetime, timedelta
+from typing import Optional
+
+import numpy as np
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from ..core.config import settings
+from ..core.database import ReadSessionLocal
+from ..models import models
+
+logger = logging.getLogger(__name__)
+
+SECONDS_PER_DAY = 86400
+_UNIX_EPOCH = datetime(1970, 1, 1)
+
+
+def _to_seconds(timestamp: datetime) -> float:
+    """Naive UTC datetime (as stored on interactions) to Unix seconds"""
+    return (timestamp - _UNIX_EPOCH).total_seconds()
+
+
+class PopularityTracker:
+    """Exponentially decayed interaction counts per product"""
+
+    # Move the reference time forward before exp() grows past this exponent
+    REBASE_EXPONENT = 50.0
+
+    def __init__(self, decay_days: Optional[float] = None, max_product_id: Optional[int] = None):
+        self.tau = (decay_days or settings.POPULARITY_DECAY_DAYS) * SECONDS_PER_DAY
+        self.max_product_id = max_product_id or settings.COUNTER_MAX_PRODUCT_ID
+        self._epoch = time.time()
+        self._scores = np.zeros(0, dtype=np.float64)
+        self._max = 0.0
+        self._normalized: Optional[np.ndarray] = None  # cached scores / max, float32
+        self._lock = threading.Lock()
+        self.is_built = False
+        self.last_built: Optional[datetime] = None
+
+    def record(self, product_id: int, timestamp: Optional[datetime] = None, weight: float = 1.0):
+        """Add one interaction (timestamp in naive UTC, default now)"""
+        if not 0 <= product_id <= self.max_product_id:
+            logger.warning(f"Ignoring interaction with out-of-range product id {product_id}")
+            return
+        t = _to_seconds(timestamp) if timestamp else time.time()
+
+        with self._lock:
+            if (t - self._epoch) / self.tau > self.REBASE_EXPONENT:
+                self._rebase(t)
+            if product_id >= len(self._scores):
+                capacity = min(max(product_id + 1, int(len(self._scores) * 1.5) + 16), self.max_product_id + 1)
+                grown = np.zeros(capacity, dtype=np.float64)
+                grown[:len(self._scores)] = self._scores
+                self._scores = grown
+
+            self._scores[product_id] += weight * np.exp((t - self._epoch) / self.tau)
+            self._max = max(self._max, self._scores[product_id])
+            self._normalized = None
+
+    def _rebase(self, epoch: float):
+        """Re-express stored scores relative to a later reference time"""
+        factor = np.exp(-(epoch - self._epoch) / self.tau)
+        self._scores *= factor
+        self._max *= factor
+        self._epoch = epoch
+
+    def scores(self, product_ids: np.ndarray) -> np.ndarray:
+        """
+        Normalized popularity (max = 1) for each of product_ids.
+
+        Returns:
+            float32 array aligned to product_ids; unknown products score 0
+        """
+        normalized = self._normalized
+        if normalized is None:
+            with self._lock:
+                if self._normalized is None:
+                    max_score = self._max if self._max > 0 else 1.0
+                    self._normalized = (self._scores / max_score).astype(np.float32)
+                normalized = self._normalized
+
+        product_ids = np.asarray(product_ids)
+        result = np.zeros(len(product_ids), dtype=np.float32)
+        known = (product_ids >= 0) & (product_ids < len(normalized))
+        result[known] = normalized[product_ids[known]]
+        return result
+
+    def rebuild(self, db: Session):
+        """
+        Recompute all scores from the last POPULARITY_WINDOW_DAYS of interactions.
+
+        Interactions are aggregated per product and day in the database and
+        weighted at each day's midpoint (within 2% of per-event weights for
+        a 30-day decay).
+        """
+        start = time.perf_counter()
+        now = datetime.utcnow()
+        cutoff = now - timedelta(days=settings.POPULARITY_WINDOW_DAYS)
+        day = func.date(models.Interaction.timestamp)
+
+        rows = db.query(
+            models.Interaction.product_id,
+            day.label('day'),
+            func.count(models.Interaction.id).label('count')
+        ).filter(
+            models.Interaction.timestamp >= cutoff,
+            models.Interaction.product_id.between(0, self.max_product_id)
+        ).group_by(
+            models.Interaction.product_id, day
+        ).all()
+
+        epoch = _to_seconds(now)
+        scores = np.zeros(0, dtype=np.float64)
+        if rows:
+            product_ids = np.fromiter((r.product_id for r in rows), dtype=np.int64, count=len(rows))
+            # SQLite returns dates as ISO strings, PostgreSQL as date objects
+            days = [r.day if isinstance(r.day, date) else date.fromisoformat(r.day) for r in rows]
+            midpoints = np.fromiter(
+                (_to_seconds(datetime(d.year, d.month, d.day, 12)) for d in days),
+                dtype=np.float64, count=len(rows)
+            )
+            counts = np.fromiter((r.count for r in rows), dtype=np.float64, count=len(rows))
+            scores = np.bincount(product_ids, weights=counts * np.exp((midpoints - epoch) / self.tau))
+
+        with self._lock:
+            self._epoch = epoch
+            self._scores = scores
+            self._max = float(scores.max()) if len(scores) else 0.0
+            self._normalized = None
+            self.is_built = True
+            self.last_built = now
+
+        logger.info(
+            f"Popularity rebuilt from {len(rows)} product-day buckets "
+            f"in {(time.perf_counter() - start) * 1000:.0f}ms"
+        )
+
+
+def resync_popularity():
+    """Rebuild the global tracker from the database (scheduled job)"""
+    db = ReadSessionLocal()
+    try:
+        popularity_tracker.rebuild(db)
+    except Exception as e:
+        logger.error(f"Popularity resync failed: {e}", exc_info=True)
+    finally:
+        db.close()
+
+
+# Global instance, shared by every model the registry swaps in
+popularity_tracker = PopularityTracker()
@@ -0,0 +1,416 @@
+"""
+Background model training and atomic model swaps.
+
+Training runs in a separate worker process, so requests never wait for
+encoding or ALS and never share a GIL with the training loops. The worker
+publishes a versioned artifact; the web process then loads it into a fresh
+engine instance and replaces the live reference in a single assignment.
+A request therefore sees either the old model or the new one, never a
+partially trained engine.
+
+Job status is kept as small JSON files under MODEL_STORE_DIR/jobs, so the
+training worker can report progress and any web worker can answer status
+queries. A lock file in the same directory keeps web workers sharing the
+model store from training at the same time: the worker holding it trains
+and publishes, the others pick up its artifact by polling.
+"""
+import json
+import logging
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Dict, Optional
+
+from ..core.config import settings
+from ..core.database import ReadSessionLocal, SessionLocal
+from ..core.exceptions import ServiceOverloadedError
+from ..models import models
+from .engine_v2 import HybridRecommenderV2, recommender_v2
+from .popularity import resync_popularity
+from .trending import resync_trending
+
+logger = logging.getLogger(__name__)
+
+try:
+    from apscheduler.schedulers.background import BackgroundScheduler
+except ImportError:  # pragma: no cover - apscheduler is listed in requirements.txt
+    BackgroundScheduler = None
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows: the job lock only covers this process
+    fcntl = None
+
+
+class ModelRegistry:
+    """
+    Holds the live recommender.
+
+    Readers fetch `current` once per request and use that instance
+    throughout, so a swap never changes the model under a running request.
+    """
+
+    def __init__(self, model: HybridRecommenderV2):
+        self.current = model
+        self._lock = threading.Lock()
+        # Products edited while a retrain is in flight, replayed onto the new model
+        # (product id -> True if the edit needs re-encoding, False for price/stock only)
+        self._pending_products: Optional[Dict[int, bool]] = None
+
+    def track_product_updates(self):
+        with self._lock:
+            if self._pending_products is None:
+                self._pending_products = {}
+
+    def discard_product_updates(self):
+        """Stop tracking edits after a failed retrain (the live model already has them)"""
+        with self._lock:
+            self._pending_products = None
+
+    def upsert_product(self, product: models.Product):
+        """Apply an incremental product update to the live model"""
+        with self._lock:
+            if self._pending_products is not None:
+                self._pending_products[product.id] = True
+            model = self.current
+        model.upsert_product(product)
+
+    def update_product_attributes(self, product: models.Product):
+        """Apply a price or stock change to the live model"""
+        with self._lock:
+            if self._pending_products is not None:
+                self._pending_products.setdefault(product.id, False)
+            model = self.current
+        model.update_product_attributes(product)
+
+    def install(self, artifact_path: str) -> HybridRecommenderV2:
+        """
+        Load an artifact into a new engine and make it the live model.
+
+        The new engine shares the loaded encoder and embedding store with
+        the current one, so only the trained arrays are loaded.
+        """
+        model = HybridRecommenderV2(
+            encoder=self.current.encoder,
+            embedding_store=self.current.embedding_store
+        )
+        if not model.load_artifact(artifact_path):
+            raise FileNotFoundError(f"Model artifact not found: {artifact_path}")
+
+        with self._lock:
+            pending, self._pending_products = self._pending_products, None
+            if pending:
+                # The worker trained from an older snapshot of the catalog
+                db = SessionLocal()
+                try:
+                    for product in db.query(models.Product).filter(models.Product.id.in_(pending)):
+                        if pending[product.id]:
+                            model.upsert_product(product)
+                        else:
+                            model.update_product_attributes(product)
+                finally:
+                    db.close()
+            self.current = model
+
+        logger.info(f"Swapped in model artifact {os.path.basename(artifact_path)}")
+        return model
+
+    def refresh(self) -> bool:
+        """Swap in the newest published artifact if it differs from the live one"""
+        path = self.current.artifact_store.latest()
+        if not path or path == self.current.artifact_path:
+            return False
+        self.install(path)
+        return True
+
+
+class TrainingJobStore:
+    """Training job records as JSON files, one per job"""
+
+    def __init__(self, root: Optional[str] = None, keep_jobs: Optional[int] = None):
+        self.root = root or os.path.join(settings.MODEL_STORE_DIR, "jobs")
+        self.keep_jobs = keep_jobs or settings.TRAINING_JOB_HISTORY
+
+    def _path(self, job_id: str) -> Optional[str]:
+        try:
+            job_id = uuid.UUID(job_id).hex  # never build paths from arbitrary input
+        except (ValueError, TypeError):
+            return None
+        return os.path.join(self.root, f"{job_id}.json")
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        path = self._path(job_id)
+        if not path:
+            return None
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def write(self, job: Dict):
+        os.makedirs(self.root, exist_ok=True)
+        tmp = os.path.join(self.root, f".{job['id']}.{uuid.uuid4().hex}")
+        with open(tmp, "w") as f:
+            json.dump(job, f)
+        os.replace(tmp, self._path(job['id']))
+
+    def update(self, job_id: str, **fields) -> Dict:
+        job = {**(self.get(job_id) or {'id': job_id}), **fields}
+        self.write(job)
+        return job
+
+    def prune(self):
+        """Remove the oldest finished job records beyond keep_jobs"""
+        paths = [
+            os.path.join(self.root, name) for name in os.listdir(self.root)
+            if name.endswith(".json")
+        ]
+        paths.sort(key=os.path.getmtime)
+        for path in paths[:-self.keep_jobs]:
+            os.remove(path)
+
+
+def run_training_job(job_id: str) -> str:
+    """
+    Entry point of the training worker process.
+
+    Trains a fresh engine from the database, publishes it as an artifact
+    (with its materialized top-N lists) and returns the artifact path.
+    """
+    from ..core.cache import init_redis
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    if settings.REDIS_URL:
+        init_redis(settings.REDIS_URL)
+
+    jobs = TrainingJobStore()
+    jobs.update(job_id, stage="starting", pid=os.getpid())
+
+    # This process imported the engine module afresh, so recommender_v2 is untrained
+    model = recommender_v2
+    progress = lambda stage: jobs.update(job_id, stage=stage)
+    db = ReadSessionLocal()
+    try:
+        model.fit(db, force_retrain=True, progress=progress)
+        if not model.artifact_path:
+            progress("saving")
+            model.save_artifact(db, progress=progress)
+    finally:
+        db.close()
+
+    # Coverage and timings of the materialized top-N lists
+    manifest = model.artifact_store.read_manifest(model.artifact_path)
+    jobs.update(job_id, materialization=manifest.get('materialized'))
+    return model.artifact_path
+
+
+class TrainingJobManager:
+    """Runs one training job at a time in a worker process and installs the result"""
+
+    LOCK_FILE = "training.lock"
+
+    def __init__(self, registry: ModelRegistry, store: Optional[TrainingJobStore] = None):
+        self.registry = registry
+        self.store = store or TrainingJobStore()
+        self._active: Optional[str] = None
+        self._lock = threading.Lock()
+        self._lock_file = None
+
+    def _claim(self, job: Dict) -> Optional[Dict]:
+        """
+        Take the lock file shared by all processes using this job store.
+
+        The holder writes its job record, then the job id into the lock
+        file; the OS releases the lock if the holder dies.
+
+        Returns:
+            None once the lock is held (job is recorded), else the record
+            of the job another process is running
+
+        Raises:
+            ServiceOverloadedError: The holder has not recorded its job yet
+        """
+        if fcntl is None:
+            self.store.write(job)
+            return None
+
+        os.makedirs(self.store.root, exist_ok=True)
+        f = open(os.path.join(self.store.root, self.LOCK_FILE), "a+")
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            try:
+                # The holder may not have written its job id yet
+                for _ in range(20):
+                    f.seek(0)
+                    holder = self.store.get(f.read().strip())
+                    if holder:
+                        return holder
+                    time.sleep(0.05)
+            finally:
+                f.close()
+            raise ServiceOverloadedError("Another process is starting a training job, retry shortly")
+
+        self.store.write(job)
+        f.seek(0)
+        f.truncate()
+        f.write(job['id'])
+        f.flush()
+        self._lock_file = f
+        return None
+
+    def _release(self):
+        """Release the lock file (caller holds _lock)"""
+        if self._lock_file is not None:
+            fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+            self._lock_file.close()
+            self._lock_file = None
+
+    def submit(self, trigger: str = "manual") -> Dict:
+        """
+        Start a training job, or return the one already running (in this
+        or another process).
+
+        Args:
+            trigger: What started the job ("manual", "schedule", "startup")
+
+        Returns:
+            The job's status record
+        """
+        with self._lock:
+            if self._active:
+                active = self.store.get(self._active)
+                if active:
+                    return active
+
+            job = {
+                'id': uuid.uuid4().hex,
+                'trigger': trigger,
+                'status': "running",
+                'stage': "queued",
+                'created_at': datetime.utcnow().isoformat(),
+                'finished_at': None,
+                'artifact': None,
+                'materialization': None,
+                'error': None,
+            }
+            running = self._claim(job)
+            if running:
+                logger.info(f"Training job {running['id']} is running in another process")
+                return running
+            self._active = job['id']
+
+        self.registry.track_product_updates()
+
+        # A fresh process per job: no state leaks between runs and memory
+        # goes back to the OS when the job ends. Spawn avoids forking a
+        # process holding DB/Redis connections and encoder threads.
+        executor = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn"))
+        future = executor.submit(run_training_job, job['id'])
+        future.add_done_callback(lambda f: self._finish(job['id'], f, executor))
+
+        logger.info(f"Started training job {job['id']} ({trigger})")
+        return job
+
+    def _finish(self, job_id: str, future, executor: ProcessPoolExecutor):
+        """Runs in the parent process once the worker exits"""
+        executor.shutdown(wait=False)
+        try:
+            artifact_path = future.result()
+            self.store.update(job_id, stage="loading", artifact=os.path.basename(artifact_path))
+            self.registry.install(artifact_path)
+            self.store.update(job_id, status="succeeded", stage="done", finished_at=datetime.utcnow().isoformat())
+            logger.info(f"Training job {job_id} finished")
+        except Exception as e:
+            logger.error(f"Training job {job_id} failed: {e}", exc_info=True)
+            self.registry.discard_product_updates()
+            self.store.update(job_id, status="failed", error=str(e), finished_at=datetime.utcnow().isoformat())
+        finally:
+            with self._lock:
+                self._active = None
+                self._release()
+            try:
+                self.store.prune()
+            except OSError as e:
+                logger.warning(f"Failed to prune training job records: {e}")
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        return self.store.get(job_id)
+
+
+model_registry = ModelRegistry(recommender_v2)
+training_jobs = TrainingJobManager(model_registry)
+
+_scheduler = None
+
+
+def start_scheduler():
+    """
+    Schedule periodic retraining (when enabled), artifact polling and
+    popularity/trending resyncs.
+
+    Only one process should have TRAINING_SCHEDULE_ENABLED set; the others
+    pick up its artifacts through polling.
+    """
+    global _scheduler
+
+    if BackgroundScheduler is None:
+        logger.warning("apscheduler not installed, background training schedule disabled")
+        return None
+
+    _scheduler = BackgroundScheduler(daemon=True)
+    if settings.TRAINING_SCHEDULE_ENABLED:
+        _scheduler.add_job(
+            training_jobs.submit,
+            "interval",
+            hours=settings.MODEL_REBUILD_INTERVAL_HOURS,
+            kwargs={'trigger': "schedule"},
+            id="retrain",
+            coalesce=True,
+            max_instances=1
+        )
+    if settings.ARTIFACT_POLL_SECONDS > 0:
+        _scheduler.add_job(
+            model_registry.refresh,
+            "interval",
+            seconds=settings.ARTIFACT_POLL_SECONDS,
+            id="artifact_poll",
+            coalesce=True,
+            max_instances=1
+        )
+    if settings.POPULARITY_RESYNC_SECONDS > 0:
+        _scheduler.add_job(
+            resync_popularity,
+            "interval",
+            seconds=settings.POPULARITY_RESYNC_SECONDS,
+            id="popularity_resync",
+            coalesce=True,
+            max_instances=1
+        )
+    if settings.TRENDING_RESYNC_SECONDS > 0:
+        _scheduler.add_job(
+            resync_trending,
+            "interval",
+            seconds=settings.TRENDING_RESYNC_SECONDS,
+            id="trending_resync",
+            coalesce=True,
+            max_instances=1
+        )
+    _scheduler.start()
+    return _scheduler
+
+
+def shutdown_scheduler():
+    global _scheduler
+
+    if _scheduler is not None:
+        _scheduler.shutdown(wait=False)
+        _scheduler = None
@@ -0,0 +1,292 @@
+"""
+In-memory trending counters.
+
+Per-product interaction counts are kept in a ring buffer of time buckets
+covering two windows of TRENDING_WINDOW_DAYS each (14 daily buckets by
+default). Recording an interaction increments one cell. As time passes the
+head bucket moves forward and expired slots are zeroed. Velocity,
+(recent - previous) / (previous + 1), is computed for every product at
+once with array sums over the two halves of the ring. The top trending
+products, overall and per category, are precomputed and refreshed at most
+every TRENDING_REFRESH_SECONDS, so a trending request is a dict lookup.
+A due refresh runs once in the background while requests keep reading the
+previous rankings.
+
+Columns are indexed by product id up to COUNTER_MAX_PRODUCT_ID; ids outside
+[0, that] are ignored rather than wrapping around or growing the buffer.
+
+The buffer is rebuilt from the database on startup. It is updated by every
+interaction this process writes and periodically resynced to include
+other workers' writes. A rebuild replays the interactions recorded while
+its query ran, and keeps the newest bucket's in-memory count where that is
+higher, since it includes this process's interactions still buffered for
+writing.
+"""
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from ..core.cache import refresh_in_background, single_flight
+from ..core.config import settings
+from ..core.database import ReadSessionLocal
+from ..models import models
+
+logger = logging.getLogger(__name__)
+
+_UNIX_EPOCH = datetime(1970, 1, 1)
+
+# Key of the all-categories ranking
+ALL_CATEGORIES = None
+
+
+class TrendingTracker:
+    """Ring buffer of per-product interaction counts with precomputed rankings"""
+
+    def __init__(
+        self,
+        window_days: Optional[int] = None,
+        bucket_hours: Optional[int] = None,
+        top_k: Optional[int] = None,
+        max_product_id: Optional[int] = None
+    ):
+        bucket_hours = bucket_hours or settings.TRENDING_BUCKET_HOURS
+        window_days = window_days or settings.TRENDING_WINDOW_DAYS
+        if (window_days * 24) % bucket_hours:
+            raise ValueError("TRENDING_BUCKET_HOURS must divide the trending window")
+
+        self.bucket_seconds = bucket_hours * 3600
+        self.half = window_days * 24 // bucket_hours  # buckets per window
+        self.n_buckets = 2 * self.half
+        self.top_k = top_k or settings.TRENDING_TOP_K
+        self.max_product_id = max_product_id or settings.COUNTER_MAX_PRODUCT_ID
+
+        # counts[slot, product_id]; bucket b lives in slot b % n_buckets
+        self._counts = np.zeros((self.n_buckets, 0), dtype=np.int32)
+        self._head = self._bucket(time.time())  # newest bucket index
+        self._category_codes = np.zeros(0, dtype=np.int32)  # by product id, -1 = unknown
+        self._categories: Dict[str, int] = {}
+
+        self._rankings: Dict[Optional[str], np.ndarray] = {}
+        self._dirty = True
+        self._ranked_at = 0.0
+        self._lock = threading.Lock()
+        # (bucket, product_id, count) recorded while each running rebuild queries
+        self._replays: List[List[Tuple[int, int, int]]] = []
+        self.is_built = False
+
+    def _bucket(self, seconds: float) -> int:
+        return int(seconds // self.bucket_seconds)
+
+    def _valid_id(self, product_id: int) -> bool:
+        if 0 <= product_id <= self.max_product_id:
+            return True
+        logger.warning(f"Ignoring out-of-range product id {product_id}")
+        return False
+
+    def _ensure_capacity(self, product_id: int):
+        if product_id < self._counts.shape[1]:
+            return
+        capacity = min(max(product_id + 1, int(self._counts.shape[1] * 1.5) + 16), self.max_product_id + 1)
+        counts = np.zeros((self.n_buckets, capacity), dtype=np.int32)
+        counts[:, :self._counts.shape[1]] = self._counts
+        self._counts = counts
+        codes = np.full(capacity, -1, dtype=np.int32)
+        codes[:len(self._category_codes)] = self._category_codes
+        self._category_codes = codes
+
+    def _advance(self, bucket: int):
+        """Roll the head forward to bucket, zeroing the slots that expire"""
+        if bucket <= self._head:
+            return
+        expired = np.arange(self._head + 1, min(bucket, self._head + self.n_buckets) + 1) % self.n_buckets
+        self._counts[expired] = 0
+        self._head = bucket
+        self._dirty = True
+
+    def record(self, product_id: int, timestamp: Optional[datetime] = None, count: int = 1):
+        """Count an interaction (timestamp in naive UTC, default now)"""
+        if not self._valid_id(product_id):
+            return
+        seconds = (timestamp - _UNIX_EPOCH).total_seconds() if timestamp else time.time()
+        bucket = self._bucket(seconds)
+
+        with self._lock:
+            self._advance(bucket)
+            if bucket <= self._head - self.n_buckets:
+                return  # older than the window
+            self._ensure_capacity(product_id)
+            self._counts[bucket % self.n_buckets, product_id] += count
+            self._dirty = True
+            for replay in self._replays:
+                replay.append((bucket, product_id, count))
+
+    def set_category(self, product_id: int, category: Optional[str]):
+        """Record (or change) a product's category for per-category rankings"""
+        if not self._valid_id(product_id):
+            return
+        with self._lock:
+            self._ensure_capacity(product_id)
+            code = self._categories.setdefault(category or "", len(self._categories))
+            if self._category_codes[product_id] != code:
+                self._category_codes[product_id] = code
+                self._dirty = True
+
+    def velocity(self) -> np.ndarray:
+        """(recent - previous) / (previous + 1) for every product id"""
+        with self._lock:
+            self._advance(self._bucket(time.time()))
+            # Slots of the newest `half` buckets, then of the older half
+            buckets = np.arange(self._head - self.n_buckets + 1, self._head + 1) % self.n_buckets
+            previous = self._counts[buckets[:self.half]].sum(axis=0, dtype=np.float32)
+            recent = self._counts[buckets[self.half:]].sum(axis=0, dtype=np.float32)
+        velocity = (recent - previous) / (previous + 1)
+        velocity[recent == 0] = -np.inf  # only products with recent activity trend
+        return velocity
+
+    def _rank(self):
+        """Recompute the overall and per-category top-K rankings"""
+        velocity = self.velocity()
+        with self._lock:
+            codes = self._category_codes[:len(velocity)].copy()
+            categories = dict(self._categories)
+            self._dirty = False
+            self._ranked_at = time.monotonic()
+
+        candidates = np.flatnonzero(velocity > -np.inf)
+        # Highest velocity first, ties by product id
+        candidates = candidates[np.lexsort((candidates, -velocity[candidates]))]
+
+        rankings = {ALL_CATEGORIES: candidates[:self.top_k]}
+        candidate_codes = codes[candidates]
+        for category, code in categories.items():
+            rankings[category] = candidates[candidate_codes == code][:self.top_k]
+        self._rankings = rankings
+
+    def top(self, category: Optional[str] = None, top_n: int = 10) -> List[int]:
+        """Trending product ids, overall or within a category"""
+        stale = time.monotonic() - self._ranked_at > settings.TRENDING_REFRESH_SECONDS
+        if stale and (self._dirty or self._head != self._bucket(time.time())):
+            key = f"trending:rank:{id(self)}"
+            if self._rankings:
+                # Serve the previous rankings while one background refresh runs
+                refresh_in_background(key, self._rank)
+            else:
+                # Nothing to serve yet: concurrent callers wait for one ranking
+                single_flight.do(key, self._rank)
+        ranking = self._rankings.get(category or ALL_CATEGORIES)
+        if ranking is None:
+            return []
+        return ranking[:top_n].tolist()
+
+    def rebuild(self, db: Session):
+        """Recompute the ring buffer and category codes from the database"""
+        replay: List[Tuple[int, int, int]] = []
+        with self._lock:
+            self._replays.append(replay)
+        try:
+            self._rebuild(db, replay)
+        finally:
+            with self._lock:
+                self._replays.remove(replay)
+
+    def _rebuild(self, db: Session, replay: List[Tuple[int, int, int]]):
+        start = time.perf_counter()
+        now = datetime.utcnow()
+        head = self._bucket((now - _UNIX_EPOCH).total_seconds())
+        oldest = datetime.utcfromtimestamp((head - self.n_buckets + 1) * self.bucket_seconds)
+
+        # Aggregate per product and day (or hour) in the database
+        if self.bucket_seconds % 86400 == 0:
+            period = func.date(models.Interaction.timestamp)
+        elif db.bind.dialect.name == "sqlite":
+            period = func.strftime('%Y-%m-%d %H:00:00', models.Interaction.timestamp)
+        else:
+            period = func.date_trunc('hour', models.Interaction.timestamp)
+
+        rows = db.query(
+            models.Interaction.product_id,
+            period.label('period'),
+            func.count(models.Interaction.id).label('count')
+        ).filter(
+            models.Interaction.timestamp >= oldest,
+            models.Interaction.product_id.between(0, self.max_product_id)
+        ).group_by(
+            models.Interaction.product_id, period
+        ).all()
+
+        products = db.query(models.Product.id, models.Product.category).filter(
+            models.Product.id.between(0, self.max_product_id)
+        ).all()
+
+        max_id = max([r.product_id for r in rows] + [p.id for p in products] + [0])
+        counts = np.zeros((self.n_buckets, max_id + 1), dtype=np.int32)
+        if rows:
+            product_ids = np.fromiter((r.product_id for r in rows), dtype=np.int64, count=len(rows))
+            # SQLite returns strings, PostgreSQL dates/timestamps
+            periods = pd.to_datetime(pd.Series([r.period for r in rows]).astype(str))
+            seconds = (periods - pd.Timestamp(_UNIX_EPOCH)).dt.total_seconds().to_numpy()
+            buckets = (seconds // self.bucket_seconds).astype(np.int64)
+            keep = (buckets > head - self.n_buckets) & (buckets <= head)
+            np.add.at(
+                counts,
+                (buckets[keep] % self.n_buckets, product_ids[keep]),
+                np.fromiter((r.count for r in rows), dtype=np.int32, count=len(rows))[keep]
+            )
+
+        category_codes = np.full(max_id + 1, -1, dtype=np.int32)
+        categories: Dict[str, int] = {}
+        for p in products:
+            category_codes[p.id] = categories.setdefault(p.category or "", len(categories))
+
+        with self._lock:
+            old_counts, old_head = self._counts, self._head
+            self._counts = counts
+            self._head = head
+            self._category_codes = category_codes
+            self._categories = categories
+
+            # Interactions recorded since the query ran are not in its results
+            for bucket, product_id, count in replay:
+                self._advance(bucket)
+                if bucket > self._head - self.n_buckets:
+                    self._ensure_capacity(product_id)
+                    self._counts[bucket % self.n_buckets, product_id] += count
+
+            # Nor are this process's newest interactions still waiting to be written
+            self._advance(old_head)
+            if old_head > self._head - self.n_buckets and old_counts.shape[1]:
+                self._ensure_capacity(old_counts.shape[1] - 1)
+                slot = old_head % self.n_buckets
+                width = old_counts.shape[1]
+                np.maximum(self._counts[slot, :width], old_counts[slot], out=self._counts[slot, :width])
+
+            self._dirty = True
+            self._ranked_at = 0.0
+            self.is_built = True
+
+        logger.info(
+            f"Trending counters rebuilt from {len(rows)} product buckets "
+            f"in {(time.perf_counter() - start) * 1000:.0f}ms"
+        )
+
+
+def resync_trending():
+    """Rebuild the global tracker from the database (scheduled job)"""
+    db = ReadSessionLocal()
+    try:
+        trending_tracker.rebuild(db)
+    except Exception as e:
+        logger.error(f"Trending resync failed: {e}", exc_info=True)
+    finally:
+        db.close()
+
+
+# Global instance, shared by every model the registry swaps in
+trending_tracker = TrendingTracker()
@@ -0,0 +1,297 @@
+"""
+Vector indexes for content-based similarity search.
+
+Product embeddings are L2-normalized, so inner product equals cosine
+similarity. Small catalogs use an exact flat index; large catalogs use an
+approximate IVF or HNSW index backed by FAISS. The dense N x N similarity
+matrix is never materialized.
+
+Rows are addressed by their position in the product dataframe. FAISS
+labels are mapped back to rows, so a product's vector can be replaced by
+adding it under a new label and retiring the old one (HNSW cannot delete).
+"""
+import logging
+import os
+from typing import Optional, Sequence, Tuple
+
+import numpy as np
+
+from ..core.config import settings
+
+logger = logging.getLogger(__name__)
+
+try:
+    import faiss
+except ImportError:  # pragma: no cover - faiss-cpu is listed in requirements.txt
+    faiss = None
+
+
+def normalize_embeddings(embeddings: np.ndarray) -> np.ndarray:
+    """Return a C-contiguous float32 copy of embeddings with unit-length rows"""
+    vectors = np.ascontiguousarray(embeddings, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class VectorIndex:
+    """
+    Base class for inner-product indexes over normalized embeddings.
+
+    `vectors` always holds the current vector for every row; subclasses
+    provide the FAISS index used to search them.
+    """
+
+    kind = "base"
+
+    # Rebuild the FAISS index once this fraction of its labels is retired
+    REBUILD_STALE_RATIO = 0.2
+
+    def __init__(self, dim: int):
+        self.dim = dim
+        self._buffer = np.empty((0, dim), dtype=np.float32)
+        self._size = 0
+        self._faiss_index = None
+        self._label_rows = np.empty(0, dtype=np.int64)
+        self._row_labels = np.empty(0, dtype=np.int64)
+        self._stale = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def vectors(self) -> np.ndarray:
+        return self._buffer[:self._size]
+
+    def _reserve(self, size: int):
+        """Grow the vector buffer geometrically so appends are amortized O(d)"""
+        if not self._buffer.flags.writeable:
+            # Memory-mapped vectors are read-only; copy on first write
+            self._buffer = np.array(self._buffer)
+        if size <= len(self._buffer):
+            return
+        capacity = max(size, int(len(self._buffer) * 1.5) + 16)
+        buffer = np.empty((capacity, self.dim), dtype=np.float32)
+        buffer[:self._size] = self.vectors
+        self._buffer = buffer
+
+    def build(self, vectors: np.ndarray):
+        """Index a full set of normalized vectors, replacing any existing ones"""
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        self._buffer = vectors
+        self._size = len(vectors)
+        self._rebuild()
+        return self
+
+    def _rebuild(self):
+        self._stale = 0
+        self._faiss_index = self._create_faiss_index(self.vectors)
+        rows = np.arange(self._size, dtype=np.int64)
+        self._label_rows = rows
+        self._row_labels = rows.copy()
+        if self._faiss_index is not None:
+            self._faiss_index.add(self.vectors)
+
+    def add(self, vectors: np.ndarray) -> np.ndarray:
+        """Append normalized vectors and return their row positions"""
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        start = self._size
+        self._reserve(start + len(vectors))
+        self._buffer[start:start + len(vectors)] = vectors
+        self._size += len(vectors)
+
+        rows = np.arange(start, start + len(vectors), dtype=np.int64)
+        self._row_labels = np.concatenate([self._row_labels, self._add_labels(vectors, rows)])
+        return rows
+
+    def update(self, row: int, vector: np.ndarray):
+        """Replace the vector stored for an existing row"""
+        vector = np.ascontiguousarray(vector, dtype=np.float32).reshape(1, self.dim)
+        self._reserve(self._size)
+        self._buffer[row] = vector[0]
+
+        if self._faiss_index is None:
+            return
+
+        self._label_rows[self._row_labels[row]] = -1
+        self._row_labels[row] = self._add_labels(vector, np.array([row]))[0]
+        self._stale += 1
+
+        if self._stale > self.REBUILD_STALE_RATIO * self._size:
+            self._rebuild()
+
+    def _add_labels(self, vectors: np.ndarray, rows: np.ndarray) -> np.ndarray:
+        """Add vectors to the FAISS index and return the labels assigned to rows"""
+        if self._faiss_index is None:
+            return rows
+        start = len(self._label_rows)
+        self._faiss_index.add(vectors)
+        self._label_rows = np.concatenate([self._label_rows, rows])
+        return np.arange(start, start + len(rows), dtype=np.int64)
+
+    def search(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Find the k most similar indexed rows for each query vector.
+
+        Returns:
+            (scores, indices) arrays of shape (n_queries, k). Missing
+            neighbors are reported with index -1 and score -inf.
+        """
+        queries = np.ascontiguousarray(queries, dtype=np.float32).reshape(-1, self.dim)
+        k = min(k, self._size)
+        if k <= 0:
+            empty = np.empty((len(queries), 0))
+            return empty.astype(np.float32), empty.astype(np.int64)
+
+        if self._faiss_index is None:
+            return self._exact_search(queries, k)
+
+        # Over-fetch to make up for retired labels, then map labels to rows
+        fetch = min(k + self._stale, len(self._label_rows))
+        scores, labels = self._faiss_index.search(queries, fetch)
+        rows = np.where(labels >= 0, self._label_rows[labels], -1)
+        scores[rows < 0] = -np.inf
+
+        if self._stale:
+            order = np.argsort(rows < 0, axis=1, kind="stable")
+            rows = np.take_along_axis(rows, order, axis=1)
+            scores = np.take_along_axis(scores, order, axis=1)
+
+        return scores[:, :k], rows[:, :k]
+
+    def _exact_search(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        scores = queries @ self.vectors.T
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        return (
+            np.take_along_axis(top_scores, order, axis=1),
+            np.take_along_axis(top, order, axis=1)
+        )
+
+    def pairwise(self, rows_a: Sequence[int], rows_b: Sequence[int]) -> np.ndarray:
+        """Cosine similarity between two sets of indexed rows"""
+        return self.vectors[np.asarray(rows_a)] @ self.vectors[np.asarray(rows_b)].T
+
+    def _create_faiss_index(self, vectors: np.ndarray):
+        """Return an empty (trained) FAISS index, or None for NumPy search"""
+        raise NotImplementedError
+
+    def save(self, directory: str):
+        """Write vectors (and any FAISS index with its label map) into directory"""
+        np.save(os.path.join(directory, "embeddings.npy"), self.vectors)
+        if self._faiss_index is not None and self.kind != FlatIndex.kind:
+            faiss.write_index(self._faiss_index, os.path.join(directory, "index.faiss"))
+            np.save(os.path.join(directory, "index_label_rows.npy"), self._label_rows)
+            np.save(os.path.join(directory, "index_row_labels.npy"), self._row_labels)
+
+    @classmethod
+    def load(cls, directory: str, kind: str, mmap_mode: Optional[str] = "r") -> "VectorIndex":
+        """
+        Load an index written by save().
+
+        Vectors are memory-mapped so processes loading the same directory
+        share one copy of the pages. Flat indexes search those pages with
+        NumPy instead of copying them into FAISS; ANN indexes are read into
+        process memory so they stay writable for incremental updates.
+        """
+        vectors = np.load(os.path.join(directory, "embeddings.npy"), mmap_mode=mmap_mode)
+        index = INDEX_TYPES[kind](vectors.shape[1]) if kind == FlatIndex.kind or faiss is not None \
+            else FlatIndex(vectors.shape[1])
+        index._buffer = vectors
+        index._size = len(vectors)
+        index._label_rows = np.arange(len(vectors), dtype=np.int64)
+        index._row_labels = index._label_rows.copy()
+
+        faiss_path = os.path.join(directory, "index.faiss")
+        if index.kind != FlatIndex.kind and os.path.exists(faiss_path):
+            index._faiss_index = faiss.read_index(faiss_path)
+            index._label_rows = np.load(os.path.join(directory, "index_label_rows.npy"))
+            index._row_labels = np.load(os.path.join(directory, "index_row_labels.npy"))
+            index._stale = int((index._label_rows < 0).sum())
+
+        return index
+
+
+class FlatIndex(VectorIndex):
+    """Exact brute-force inner product search (FAISS IndexFlatIP or NumPy)"""
+
+    kind = "flat"
+
+    def _create_faiss_index(self, vectors: np.ndarray):
+        return faiss.IndexFlatIP(self.dim) if faiss is not None else None
+
+
+class IVFIndex(VectorIndex):
+    """Inverted-file index: clusters vectors and probes the nearest lists"""
+
+    kind = "ivf"
+
+    def __init__(self, dim: int, nlist: Optional[int] = None, nprobe: Optional[int] = None):
+        if faiss is None:
+            raise ImportError("faiss-cpu is required for approximate vector indexes")
+        super().__init__(dim)
+        self.nlist = nlist
+        self.nprobe = nprobe or settings.VECTOR_INDEX_IVF_NPROBE
+
+    def _create_faiss_index(self, vectors: np.ndarray):
+        # Rule of thumb: ~sqrt(N) lists, with enough points per list to train
+        nlist = self.nlist or int(np.sqrt(len(vectors)))
+        nlist = max(1, min(nlist, len(vectors) // 39))
+        self._quantizer = faiss.IndexFlatIP(self.dim)  # must outlive the IVF index
+        index = faiss.IndexIVFFlat(self._quantizer, self.dim, nlist, faiss.METRIC_INNER_PRODUCT)
+        index.train(vectors)
+        index.nprobe = min(self.nprobe, nlist)
+        return index
+
+
+class HNSWIndex(VectorIndex):
+    """Hierarchical navigable small-world graph index"""
+
+    kind = "hnsw"
+
+    def __init__(self, dim: int, m: Optional[int] = None, ef_search: Optional[int] = None):
+        if faiss is None:
+            raise ImportError("faiss-cpu is required for approximate vector indexes")
+        super().__init__(dim)
+        self.m = m or settings.VECTOR_INDEX_HNSW_M
+        self.ef_search = ef_search or settings.VECTOR_INDEX_HNSW_EF_SEARCH
+
+    def _create_faiss_index(self, vectors: np.ndarray):
+        index = faiss.IndexHNSWFlat(self.dim, self.m, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = max(40, 2 * self.m)
+        index.hnsw.efSearch = self.ef_search
+        return index
+
+
+INDEX_TYPES = {
+    FlatIndex.kind: FlatIndex,
+    IVFIndex.kind: IVFIndex,
+    HNSWIndex.kind: HNSWIndex,
+}
+
+
+def build_vector_index(embeddings: np.ndarray, kind: Optional[str] = None) -> VectorIndex:
+    """
+    Build the configured vector index over normalized embeddings.
+
+    Args:
+        embeddings: (N, d) normalized embedding matrix
+        kind: "flat", "ivf", "hnsw" or "auto" (defaults to settings.VECTOR_INDEX_TYPE)
+    """
+    kind = (kind or settings.VECTOR_INDEX_TYPE).lower()
+
+    if kind == "auto":
+        kind = "flat" if len(embeddings) <= settings.VECTOR_INDEX_FLAT_MAX_ITEMS else "hnsw"
+
+    if kind not in INDEX_TYPES:
+        raise ValueError(f"Unknown vector index type: {kind}")
+
+    if kind != "flat" and faiss is None:
+        logger.warning(f"faiss not installed, falling back to exact flat index instead of {kind}")
+        kind = "flat"
+
+    index = INDEX_TYPES[kind](embeddings.shape[1])
+    index.build(embeddings)
+    logger.info(f"Built {kind} vector index over {len(index)} vectors (dim={index.dim})")
+    return index
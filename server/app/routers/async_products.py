@@ -0,0 +1,111 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+from ..core.database import get_async_db, get_async_read_db
+from ..models import models
+from ..schemas.schemas import ProductOut, ProductCreate, ProductUpdate, InteractionCreate
+from ..core.exceptions import ServiceOverloadedError
+from ..services.async_recommendation_service import AsyncRecommendationService
+from ..services.interaction_queue import interaction_queue
+from .auth import get_current_user_async, get_current_user_optional_async
+
+router = APIRouter()
+
+async def _get_product_or_404(db: AsyncSession, product_id: int) -> models.Product:
+    product = await db.get(models.Product, product_id)
+    if not product:
+        raise HTTPException(status_code=404, detail="Product not found")
+    return product
+
+async def _record_interaction(
+    db: AsyncSession, user_id: int, product_id: int, interaction_type: str, value: float
+) -> bool:
+    """Queue the interaction without waiting for room (or commit it here when the queue is off)"""
+    if interaction_queue.running:
+        if not interaction_queue.submit(user_id, product_id, interaction_type, value, block=False):
+            return False
+    else:
+        db.add(models.Interaction(
+            user_id=user_id,
+            product_id=product_id,
+            interaction_type=interaction_type,
+            value=value
+        ))
+        await db.commit()
+    AsyncRecommendationService.record_interaction(product_id)
+    return True
+
+@router.get("/", response_model=List[ProductOut])
+async def list_products(
+    category: Optional[str] = None,
+    search: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_read_db)
+):
+    query = select(models.Product)
+    if category:
+        query = query.where(models.Product.category == category)
+    if search:
+        query = query.where(models.Product.name.contains(search) | models.Product.description.contains(search))
+    result = await db.execute(query)
+    return result.scalars().all()
+
+@router.get("/{product_id}", response_model=ProductOut)
+async def get_product(
+    product_id: int,
+    db: AsyncSession = Depends(get_async_db),
+    read_db: AsyncSession = Depends(get_async_read_db),
+    user: Optional[models.User] = Depends(get_current_user_optional_async)
+):
+    product = await _get_product_or_404(read_db, product_id)
+
+    # Track interaction if user is logged in (a view is skipped when the queue is full)
+    if user:
+        await _record_interaction(db, user.id, product_id, "view", 1.0)
+
+    return product
+
+@router.post("/{product_id}/interact")
+async def interact_with_product(
+    product_id: int,
+    interaction_data: InteractionCreate,
+    db: AsyncSession = Depends(get_async_db),
+    user: models.User = Depends(get_current_user_optional_async)
+):
+    if not user:
+        return {"status": "ignored", "reason": "not_authenticated"}
+    await _get_product_or_404(db, product_id)
+
+    if not await _record_interaction(db, user.id, product_id, interaction_data.interaction_type, interaction_data.value):
+        raise ServiceOverloadedError("Interaction ingestion is at capacity, retry shortly")
+    return {"status": "success"}
+
+@router.post("/", response_model=ProductOut, status_code=status.HTTP_201_CREATED)
+async def create_product(product: ProductCreate, db: AsyncSession = Depends(get_async_db)):
+    db_product = models.Product(**product.model_dump())
+    db.add(db_product)
+    await db.commit()
+    await db.refresh(db_product)
+    await AsyncRecommendationService.index_product(db_product)
+    return db_product
+
+@router.patch("/{product_id}", response_model=ProductOut)
+async def update_product(
+    product_id: int,
+    product: ProductUpdate,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: models.User = Depends(get_current_user_async)
+):
+    db_product = await _get_product_or_404(db, product_id)
+
+    changes = product.model_dump(exclude_unset=True)
+    for field, value in changes.items():
+        setattr(db_product, field, value)
+    await db.commit()
+    await db.refresh(db_product)
+    if set(changes) <= {"price", "stock_count"}:
+        # Not part of the content embedding: update the filters in place
+        AsyncRecommendationService.update_product_attributes(db_product)
+    else:
+        await AsyncRecommendationService.index_product(db_product)
+    return db_product
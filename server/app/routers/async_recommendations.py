@@ -0,0 +1,61 @@
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+from ..core.database import get_async_read_db
+from ..services.async_recommendation_service import AsyncRecommendationService
+from ..schemas.schemas import ProductOut, BatchRecommendationRequest, BatchRecommendationOut
+from ..core.config import settings
+from ..ml.attribute_index import ProductFilter
+from .auth import get_current_user_async
+from .recommendations import recommendation_filters
+from ..models import models
+
+router = APIRouter()
+
+@router.get("/personalized", response_model=List[ProductOut])
+async def get_personalized_recommendations(
+    filters: ProductFilter = Depends(recommendation_filters),
+    db: AsyncSession = Depends(get_async_read_db),
+    current_user: models.User = Depends(get_current_user_async)
+):
+    return await AsyncRecommendationService.get_personalized_recommendations(
+        db, user_id=current_user.id, filters=filters
+    )
+
+@router.get("/similar/{product_id}", response_model=List[ProductOut])
+async def get_similar_products(
+    product_id: int,
+    filters: ProductFilter = Depends(recommendation_filters),
+    db: AsyncSession = Depends(get_async_read_db)
+):
+    return await AsyncRecommendationService.get_contextual_recommendations(db, product_id=product_id, filters=filters)
+
+@router.get("/trending", response_model=List[ProductOut])
+async def get_trending_products(category: Optional[str] = None, db: AsyncSession = Depends(get_async_read_db)):
+    return await AsyncRecommendationService.get_trending_recommendations(db, category=category)
+
+@router.post("/batch", response_model=BatchRecommendationOut)
+async def get_batch_recommendations(
+    request: BatchRecommendationRequest,
+    current_user: models.User = Depends(get_current_user_async)
+):
+    """Recommendations for many users and/or seed products (for email and push jobs)"""
+    n_requests = max(len(request.user_ids or []), len(request.product_ids or []))
+    if n_requests > settings.RECOMMENDATION_BATCH_MAX_REQUESTS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"At most {settings.RECOMMENDATION_BATCH_MAX_REQUESTS} requests per batch"
+        )
+    return await AsyncRecommendationService.get_batch_recommendations(
+        user_ids=request.user_ids,
+        product_ids=request.product_ids,
+        top_n=request.top_n,
+        diversity_factor=request.diversity_factor,
+        filters=ProductFilter(
+            category=request.category,
+            brand=request.brand,
+            min_price=request.min_price,
+            max_price=request.max_price,
+            in_stock=request.in_stock
+        )
+    )
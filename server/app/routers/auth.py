@@ -3,9 +3,11 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from jose import JWTError, jwt
 from passlib.context import CryptContext
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from typing import Optional
-from ..core.database import get_db
+from ..core.database import get_async_db, get_db
 from ..core.config import settings
 from ..models import models
 from ..schemas import schemas
@@ -28,7 +30,9 @@ def create_access_token(data: dict):
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
     return encoded_jwt
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+# Plain def (like the sync routes): FastAPI runs it in the threadpool, so the
+# sync query does not block the event loop
+def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
     if not token:
         raise HTTPException(status_code=401, detail="Not authenticated")
     credentials_exception = HTTPException(
@@ -48,7 +52,7 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
         raise credentials_exception
     return user
 
-async def get_current_user_optional(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+def get_current_user_optional(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
     if not token:
         return None
     try:
@@ -60,6 +64,43 @@ async def get_current_user_optional(token: str = Depends(oauth2_scheme), db: Ses
     except:
         return None
 
+def _token_email(token: Optional[str]) -> Optional[str]:
+    """Subject of a valid access token"""
+    if not token:
+        return None
+    try:
+        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+    except JWTError:
+        return None
+    return payload.get("sub")
+
+async def _get_user_by_email(db: AsyncSession, email: str) -> Optional[models.User]:
+    result = await db.execute(select(models.User).where(models.User.email == email))
+    return result.scalars().first()
+
+async def get_current_user_async(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)):
+    """get_current_user for the async routes (AsyncSession lookup)"""
+    if not token:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    credentials_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Could not validate credentials",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+    email = _token_email(token)
+    if email is None:
+        raise credentials_exception
+    user = await _get_user_by_email(db, email)
+    if user is None:
+        raise credentials_exception
+    return user
+
+async def get_current_user_optional_async(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)):
+    email = _token_email(token)
+    if email is None:
+        return None
+    return await _get_user_by_email(db, email)
+
 @router.post("/register", response_model=schemas.UserOut)
 def register(user_in: schemas.UserCreate, db: Session = Depends(get_db)):
     db_user = db.query(models.User).filter(models.User.email == user_in.email).first()
@@ -0,0 +1,60 @@
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+from datetime import datetime
+from typing import List
+from ..core.config import settings
+from ..core.database import get_db
+from ..models import models
+from ..schemas.schemas import InteractionCreate, InteractionBatchError, InteractionBatchOut
+from ..services.recommendation_service import RecommendationService
+from .auth import get_current_user
+
+router = APIRouter()
+
+@router.post("/batch", response_model=InteractionBatchOut)
+def record_interactions(
+    events: List[InteractionCreate],
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """
+    Store a client-side batch of interactions (clicks, cart adds, ...) in one bulk insert.
+
+    Events for products that do not exist are rejected individually and
+    listed in errors by their position; all other events are stored.
+    """
+    if len(events) > settings.INTERACTION_BATCH_MAX_EVENTS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"At most {settings.INTERACTION_BATCH_MAX_EVENTS} events per batch"
+        )
+
+    product_ids = {event.product_id for event in events}
+    known = {
+        product_id for (product_id,) in
+        db.query(models.Product.id).filter(models.Product.id.in_(product_ids))
+    } if product_ids else set()
+
+    rows = []
+    errors = []
+    timestamp = datetime.utcnow()
+    for index, event in enumerate(events):
+        if event.product_id not in known:
+            errors.append(InteractionBatchError(index=index, error="unknown_product"))
+            continue
+        rows.append({
+            'user_id': current_user.id,
+            'product_id': event.product_id,
+            'interaction_type': event.interaction_type,
+            'value': event.value,
+            'timestamp': timestamp,
+        })
+
+    if rows:
+        db.execute(insert(models.Interaction), rows)
+        db.commit()
+        for row in rows:
+            RecommendationService.record_interaction(row['product_id'])
+
+    return InteractionBatchOut(accepted=len(rows), rejected=len(errors), errors=errors)
@@ -1,18 +1,37 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 from typing import List, Optional
-from ..core.database import get_db
+from ..core.database import get_db, get_read_db
 from ..models import models
-from ..schemas.schemas import ProductOut, ProductCreate, InteractionCreate
-from .auth import get_current_user_optional
+from ..schemas.schemas import ProductOut, ProductCreate, ProductUpdate, InteractionCreate
+from ..core.exceptions import ServiceOverloadedError
+from ..services.interaction_queue import interaction_queue
+from ..services.recommendation_service import RecommendationService
+from .auth import get_current_user, get_current_user_optional
 
 router = APIRouter()
 
+def _record_interaction(db: Session, user_id: int, product_id: int, interaction_type: str, value: float) -> bool:
+    """Queue the interaction for the next bulk insert (or commit it here when the queue is off)"""
+    if interaction_queue.running:
+        if not interaction_queue.submit(user_id, product_id, interaction_type, value):
+            return False
+    else:
+        db.add(models.Interaction(
+            user_id=user_id,
+            product_id=product_id,
+            interaction_type=interaction_type,
+            value=value
+        ))
+        db.commit()
+    RecommendationService.record_interaction(product_id)
+    return True
+
 @router.get("/", response_model=List[ProductOut])
 def list_products(
     category: Optional[str] = None,
     search: Optional[str] = None,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     query = db.query(models.Product)
     if category:
@@ -25,22 +44,16 @@ def list_products(
 def get_product(
     product_id: int, 
     db: Session = Depends(get_db),
+    read_db: Session = Depends(get_read_db),
     user: Optional[models.User] = Depends(get_current_user_optional)
 ):
-    product = db.query(models.Product).filter(models.Product.id == product_id).first()
+    product = read_db.query(models.Product).filter(models.Product.id == product_id).first()
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
     
-    # Track interaction if user is logged in
+    # Track interaction if user is logged in (a view is skipped when the queue is full)
     if user:
-        interaction = models.Interaction(
-            user_id=user.id,
-            product_id=product_id,
-            interaction_type="view",
-            value=1.0
-        )
-        db.add(interaction)
-        db.commit()
+        _record_interaction(db, user.id, product_id, "view", 1.0)
         
     return product
 
@@ -53,15 +66,11 @@ def interact_with_product(
 ):
     if not user:
         return {"status": "ignored", "reason": "not_authenticated"}
+    if not db.query(models.Product.id).filter(models.Product.id == product_id).first():
+        raise HTTPException(status_code=404, detail="Product not found")
         
-    interaction = models.Interaction(
-        user_id=user.id,
-        product_id=product_id,
-        interaction_type=interaction_data.interaction_type,
-        value=interaction_data.value
-    )
-    db.add(interaction)
-    db.commit()
+    if not _record_interaction(db, user.id, product_id, interaction_data.interaction_type, interaction_data.value):
+        raise ServiceOverloadedError("Interaction ingestion is at capacity, retry shortly")
     return {"status": "success"}
 
 @router.post("/", response_model=ProductOut, status_code=status.HTTP_201_CREATED)
@@ -70,4 +79,28 @@ def create_product(product: ProductCreate, db: Session = Depends(get_db)):
     db.add(db_product)
     db.commit()
     db.refresh(db_product)
+    RecommendationService.index_product(db_product)
+    return db_product
+
+@router.patch("/{product_id}", response_model=ProductOut)
+def update_product(
+    product_id: int,
+    product: ProductUpdate,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    db_product = db.query(models.Product).filter(models.Product.id == product_id).first()
+    if not db_product:
+        raise HTTPException(status_code=404, detail="Product not found")
+    
+    changes = product.model_dump(exclude_unset=True)
+    for field, value in changes.items():
+        setattr(db_product, field, value)
+    db.commit()
+    db.refresh(db_product)
+    if set(changes) <= {"price", "stock_count"}:
+        # Not part of the content embedding: update the filters in place
+        RecommendationService.update_product_attributes(db_product)
+    else:
+        RecommendationService.index_product(db_product)
     return db_product
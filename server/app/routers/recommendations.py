@@ -1,36 +1,89 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlalchemy.orm import Session
-from typing import List
-from ..core.database import get_db
+from typing import List, Optional
+from ..core.database import get_read_db
 from ..services.recommendation_service import RecommendationService
-from ..schemas.schemas import ProductOut
+from ..schemas.schemas import ProductOut, TrainingJobOut, BatchRecommendationRequest, BatchRecommendationOut
+from ..core.config import settings
+from ..ml.attribute_index import ProductFilter
 from .auth import get_current_user
 from ..models import models
 
 router = APIRouter()
 
+def recommendation_filters(
+    category: Optional[str] = None,
+    brand: Optional[str] = None,
+    min_price: Optional[float] = Query(None, ge=0),
+    max_price: Optional[float] = Query(None, ge=0),
+    in_stock: Optional[bool] = Query(None, description="Only in-stock products (default: server setting)")
+) -> ProductFilter:
+    """Combined attribute filters, applied as one mask before top-N selection"""
+    if min_price is not None and max_price is not None and min_price > max_price:
+        raise HTTPException(status_code=422, detail="min_price must not exceed max_price")
+    return ProductFilter(category=category, brand=brand, min_price=min_price, max_price=max_price, in_stock=in_stock)
+
 @router.get("/personalized", response_model=List[ProductOut])
 def get_personalized_recommendations(
-    db: Session = Depends(get_db),
+    filters: ProductFilter = Depends(recommendation_filters),
+    db: Session = Depends(get_read_db),
     current_user: models.User = Depends(get_current_user)
 ):
-    return RecommendationService.get_personalized_recommendations(db, user_id=current_user.id)
+    return RecommendationService.get_personalized_recommendations(db, user_id=current_user.id, filters=filters)
 
 @router.get("/similar/{product_id}", response_model=List[ProductOut])
 def get_similar_products(
     product_id: int,
-    db: Session = Depends(get_db)
+    filters: ProductFilter = Depends(recommendation_filters),
+    db: Session = Depends(get_read_db)
 ):
-    return RecommendationService.get_contextual_recommendations(db, product_id=product_id)
+    return RecommendationService.get_contextual_recommendations(db, product_id=product_id, filters=filters)
 
 @router.get("/trending", response_model=List[ProductOut])
-def get_trending_products(db: Session = Depends(get_db)):
-    return RecommendationService.get_trending_recommendations(db)
+def get_trending_products(category: Optional[str] = None, db: Session = Depends(get_read_db)):
+    return RecommendationService.get_trending_recommendations(db, category=category)
+
+@router.post("/batch", response_model=BatchRecommendationOut)
+def get_batch_recommendations(
+    request: BatchRecommendationRequest,
+    db: Session = Depends(get_read_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """Recommendations for many users and/or seed products (for email and push jobs)"""
+    n_requests = max(len(request.user_ids or []), len(request.product_ids or []))
+    if n_requests > settings.RECOMMENDATION_BATCH_MAX_REQUESTS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"At most {settings.RECOMMENDATION_BATCH_MAX_REQUESTS} requests per batch"
+        )
+    return RecommendationService.get_batch_recommendations(
+        db,
+        user_ids=request.user_ids,
+        product_ids=request.product_ids,
+        top_n=request.top_n,
+        diversity_factor=request.diversity_factor,
+        filters=ProductFilter(
+            category=request.category,
+            brand=request.brand,
+            min_price=request.min_price,
+            max_price=request.max_price,
+            in_stock=request.in_stock
+        )
+    )
 
-@router.post("/rebuild", tags=["Admin"])
+@router.post("/rebuild", response_model=TrainingJobOut, status_code=status.HTTP_202_ACCEPTED, tags=["Admin"])
 def rebuild_model(
-    db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user)
 ):
     # Only admin should do this usually (simplified for demo)
-    return RecommendationService.trigger_rebuild(db)
+    return RecommendationService.trigger_rebuild()
+
+@router.get("/rebuild/{job_id}", response_model=TrainingJobOut, tags=["Admin"])
+def get_rebuild_status(
+    job_id: str,
+    current_user: models.User = Depends(get_current_user)
+):
+    job = RecommendationService.get_rebuild_status(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Training job not found")
+    return job
@@ -1,4 +1,4 @@
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, model_validator
 from typing import List, Optional, Any
 from datetime import datetime
 
@@ -35,6 +35,16 @@ class ProductBase(BaseModel):
 class ProductCreate(ProductBase):
     pass
 
+class ProductUpdate(BaseModel):
+    name: Optional[str] = None
+    description: Optional[str] = None
+    category: Optional[str] = None
+    price: Optional[float] = None
+    image_url: Optional[str] = None
+    tags: Optional[str] = None
+    brand: Optional[str] = None
+    stock_count: Optional[int] = None
+
 class ProductOut(ProductBase):
     id: int
     rating: float
@@ -58,6 +68,60 @@ class InteractionOut(InteractionCreate):
     class Config:
         from_attributes = True
 
+class InteractionBatchError(BaseModel):
+    index: int  # position of the event in the request
+    error: str  # 'unknown_product'
+
+class InteractionBatchOut(BaseModel):
+    accepted: int
+    rejected: int
+    errors: List[InteractionBatchError]  # rejected events only; every other event was stored
+
+# Batch Recommendation Schemas
+class BatchRecommendationRequest(BaseModel):
+    user_ids: Optional[List[int]] = None
+    product_ids: Optional[List[int]] = None  # seeds; paired with user_ids when both are given
+    category: Optional[str] = None
+    brand: Optional[str] = None
+    min_price: Optional[float] = None
+    max_price: Optional[float] = None
+    in_stock: Optional[bool] = None  # None = server default (in-stock only)
+    top_n: int = 10
+    diversity_factor: float = 0.3
+
+    @model_validator(mode="after")
+    def check_requests(self):
+        if not self.user_ids and not self.product_ids:
+            raise ValueError("Provide user_ids and/or product_ids")
+        if self.user_ids and self.product_ids and len(self.user_ids) != len(self.product_ids):
+            raise ValueError("user_ids and product_ids must have the same length when both are given")
+        if self.min_price is not None and self.max_price is not None and self.min_price > self.max_price:
+            raise ValueError("min_price must not exceed max_price")
+        return self
+
+class BatchRecommendationItem(BaseModel):
+    user_id: Optional[int] = None
+    product_id: Optional[int] = None
+    recommendations: List[int]
+
+class BatchRecommendationOut(BaseModel):
+    results: List[BatchRecommendationItem]
+    count: int
+    elapsed_ms: float
+    recommendations_per_second: float
+
+# Training Job Schemas
+class TrainingJobOut(BaseModel):
+    id: str
+    trigger: str
+    status: str  # 'running', 'succeeded', 'failed'
+    stage: str  # 'queued', 'loading_data', 'content', ..., 'loading', 'done'
+    created_at: datetime
+    finished_at: Optional[datetime] = None
+    artifact: Optional[str] = None
+    materialization: Optional[dict] = None  # coverage and timings of the materialized top-N lists
+    error: Optional[str] = None
+
 # Token Schemas
 class Token(BaseModel):
     access_token: str
@@ -0,0 +1,196 @@
+"""
+Async counterparts of RecommendationService for the /api/async routes.
+
+Database reads and writes go through an AsyncSession and cache hits through
+redis.asyncio, so a request waiting on I/O does not hold a thread. Scoring
+is CPU-bound and runs on a bounded pool of SCORING_WORKERS threads, each job
+with its own sync session for the few reads the engine makes (fallback
+lists, first popularity / trending build). At most SCORING_MAX_PENDING jobs
+are queued or running; beyond that requests get a 503 instead of piling up
+behind the pool.
+"""
+import asyncio
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from ..core.config import settings
+from ..core.database import ReadSessionLocal
+from ..core.exceptions import ServiceOverloadedError
+from ..ml.attribute_index import ProductFilter
+from ..ml.training import model_registry
+from ..models import models
+from .recommendation_service import RecommendationService
+
+logger = logging.getLogger(__name__)
+
+
+class ScoringPool:
+    """Thread pool for CPU-bound work with a cap on queued + running jobs"""
+
+    def __init__(self, workers: int, max_pending: int):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()  # pending is released from pool threads
+
+    async def run(self, func: Callable[..., Any], *args) -> Any:
+        """
+        Run func(*args) on a pool thread.
+
+        A job counts as pending until it finishes on its thread, even if
+        the awaiting request is cancelled first (a client disconnect does
+        not stop a job that has started).
+
+        Raises:
+            ServiceOverloadedError: SCORING_MAX_PENDING jobs are already in flight
+        """
+        with self._lock:
+            if self.pending >= self.max_pending:
+                self.rejected += 1
+                raise ServiceOverloadedError("Recommendation scoring is at capacity, retry shortly")
+            self.pending += 1
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="scoring")
+
+        try:
+            future = self._executor.submit(func, *args)
+        except BaseException:
+            self._done(None)
+            raise
+        future.add_done_callback(self._done)
+        return await asyncio.wrap_future(future)
+
+    def _done(self, future: Optional[Future]):
+        with self._lock:
+            self.pending -= 1
+            if future is not None and not future.cancelled() and future.exception() is None:
+                self.completed += 1
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'workers': self.workers,
+            'pending': self.pending,
+            'max_pending': self.max_pending,
+            'completed': self.completed,
+            'rejected': self.rejected,
+        }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+def _with_session(func: Callable[[Session], Any]) -> Any:
+    """Run func with a sync read session owned by the pool thread"""
+    session = ReadSessionLocal()
+    try:
+        return func(session)
+    finally:
+        session.close()
+
+
+class AsyncRecommendationService:
+    @staticmethod
+    async def _recommend(
+        user_id: Optional[int] = None,
+        product_id: Optional[int] = None,
+        top_n: int = 10,
+        filters: Optional[ProductFilter] = None
+    ) -> List[int]:
+        """Cached list from redis.asyncio, otherwise the engine on the scoring pool"""
+        model = model_registry.current
+        product_ids = await model.get_cached_recommendations_async(user_id, product_id, top_n, filters)
+        if product_ids is not None:
+            return product_ids
+        return await scoring_pool.run(
+            _with_session,
+            lambda db: model.get_recommendations(db, user_id=user_id, product_id=product_id, top_n=top_n, filters=filters)
+        )
+
+    @staticmethod
+    async def _load_products(db: AsyncSession, product_ids: List[int]) -> List[models.Product]:
+        result = await db.execute(select(models.Product).where(models.Product.id.in_(product_ids)))
+        return list(result.scalars().all())
+
+    @staticmethod
+    async def get_contextual_recommendations(
+        db: AsyncSession,
+        product_id: int,
+        top_n: int = 5,
+        filters: Optional[ProductFilter] = None
+    ) -> List[models.Product]:
+        """Recommendations based on a specific product (Similar items)"""
+        product_ids = await AsyncRecommendationService._recommend(product_id=product_id, top_n=top_n, filters=filters)
+        return await AsyncRecommendationService._load_products(db, product_ids)
+
+    @staticmethod
+    async def get_personalized_recommendations(
+        db: AsyncSession,
+        user_id: int,
+        top_n: int = 10,
+        filters: Optional[ProductFilter] = None
+    ) -> List[models.Product]:
+        """Recommendations based on user profile and history"""
+        product_ids = await AsyncRecommendationService._recommend(user_id=user_id, top_n=top_n, filters=filters)
+        return await AsyncRecommendationService._load_products(db, product_ids)
+
+    @staticmethod
+    async def get_trending_recommendations(
+        db: AsyncSession,
+        category: Optional[str] = None,
+        top_n: int = 5
+    ) -> List[models.Product]:
+        """Fastest-rising items, topped up with popular items when too few are trending"""
+        product_ids = await scoring_pool.run(
+            _with_session,
+            lambda session: RecommendationService.get_trending_product_ids(session, category=category, top_n=top_n)
+        )
+        return await AsyncRecommendationService._load_products(db, product_ids)
+
+    @staticmethod
+    async def get_batch_recommendations(
+        user_ids: Optional[List[int]] = None,
+        product_ids: Optional[List[int]] = None,
+        top_n: int = 10,
+        diversity_factor: float = 0.3,
+        filters: Optional[ProductFilter] = None
+    ) -> Dict:
+        """Recommendation ID lists for many users and/or seed products, scored on the pool"""
+        return await scoring_pool.run(
+            _with_session,
+            lambda session: RecommendationService.get_batch_recommendations(
+                session,
+                user_ids=user_ids,
+                product_ids=product_ids,
+                top_n=top_n,
+                diversity_factor=diversity_factor,
+                filters=filters
+            )
+        )
+
+    @staticmethod
+    async def index_product(product: models.Product):
+        """Make a new or edited product recommendable (encodes its text on the pool)"""
+        await scoring_pool.run(RecommendationService.index_product, product)
+
+    @staticmethod
+    def update_product_attributes(product: models.Product):
+        RecommendationService.update_product_attributes(product)
+
+    @staticmethod
+    def record_interaction(product_id: int):
+        RecommendationService.record_interaction(product_id)
+
+
+# Global instance
+scoring_pool = ScoringPool(settings.SCORING_WORKERS, settings.SCORING_MAX_PENDING)
@@ -0,0 +1,314 @@
+"""
+Write-behind ingestion of user interactions.
+
+Routes hand interactions to the queue instead of committing one transaction
+per event. A single flusher thread writes them to the primary in bulk
+inserts, once INTERACTION_FLUSH_EVENTS events are buffered or the oldest
+one has waited INTERACTION_FLUSH_INTERVAL_MS, whichever comes first.
+
+The buffer holds at most INTERACTION_QUEUE_MAX_EVENTS events. When it is
+full, sync producers (threadpool routes) wait up to
+INTERACTION_QUEUE_BLOCK_MS for the flusher to make room and async producers
+do not wait at all; either way a refused event is counted as dropped and
+the caller decides what to do with it (a product view is skipped, an
+explicit interaction is answered with 503).
+
+A failed insert puts its batch back at the head of the buffer and is
+retried after one flush interval. A batch that fails _SPLIT_AFTER_FAILURES
+times in a row is written in halves, recursively, so one bad row (say, a
+foreign key violation) cannot hold up the queue: rows that still fail on
+their own with a data error are logged and counted as dead-lettered, the
+rest are written. Connection-level errors never dead-letter anything; the
+rows wait in the buffer until the database is back. stop() flushes
+everything buffered, so a graceful shutdown loses nothing; a killed
+process loses at most the buffered events (up to one interval's worth at
+the normal rate).
+
+Buffered events are already counted in the in-memory popularity and
+trending trackers, but other workers and the recommender's training see
+them only once they are flushed.
+"""
+import logging
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from sqlalchemy import insert
+from sqlalchemy.exc import DataError, IntegrityError
+
+from ..core.config import settings
+from ..core.database import SessionLocal
+from ..models import models
+
+logger = logging.getLogger(__name__)
+
+# Failed attempts of a batch before it is written in halves to isolate bad rows
+_SPLIT_AFTER_FAILURES = 2
+# Attempts to write the remaining events on shutdown before they are given up
+_SHUTDOWN_ATTEMPTS = 3
+
+
+class InteractionQueue:
+    """Bounded buffer of interaction rows, written in bulk by one background thread"""
+
+    def __init__(
+        self,
+        flush_events: int,
+        flush_interval_ms: int,
+        max_events: int,
+        block_ms: int
+    ):
+        """
+        Args:
+            flush_events: Rows per bulk insert; a flush starts as soon as this many are buffered
+            flush_interval_ms: Longest a buffered row waits for a flush
+            max_events: Bound on buffered rows
+            block_ms: How long a blocking submit waits for room
+        """
+        self.flush_events = max(1, flush_events)
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_events = max_events
+        self.block = block_ms / 1000
+
+        self._events: Deque[Tuple[float, Dict[str, Any]]] = deque()
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+
+        # Metrics (guarded by _cond)
+        self.accepted = 0
+        self.dropped = 0
+        self.flushed = 0
+        self.flushes = 0
+        self.failed_flushes = 0
+        self.dead_lettered = 0
+        self.lost = 0
+        self.peak_depth = 0
+        self.last_batch_size = 0
+        self.max_batch_size = 0
+        self.flush_seconds = 0.0
+        self.max_flush_seconds = 0.0
+        self.max_event_wait = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def start(self):
+        """Start the flusher thread"""
+        with self._cond:
+            if self._thread is not None:
+                return
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name="interaction-flush", daemon=True)
+            self._thread.start()
+        logger.info(
+            f"Interaction queue started (flush every {self.flush_events} events or "
+            f"{self.flush_interval * 1000:.0f}ms, max {self.max_events} buffered)"
+        )
+
+    def stop(self, timeout: float = 30.0):
+        """Flush everything buffered and stop the flusher thread"""
+        with self._cond:
+            thread = self._thread
+            if thread is None:
+                return
+            self._stopping = True
+            self._cond.notify_all()
+        thread.join(timeout)
+        if thread.is_alive():
+            logger.error(f"Interaction queue did not drain within {timeout:.0f}s ({len(self._events)} events left)")
+        with self._cond:
+            self._thread = None
+        logger.info(f"Interaction queue stopped ({self.flushed} events flushed, {self.lost} lost)")
+
+    def submit(
+        self,
+        user_id: int,
+        product_id: int,
+        interaction_type: str,
+        value: float = 1.0,
+        block: bool = True
+    ) -> bool:
+        """
+        Buffer one interaction (timestamped now) for the next bulk insert.
+
+        Args:
+            block: Wait up to INTERACTION_QUEUE_BLOCK_MS for room when the
+                buffer is full (never pass True on the event loop)
+
+        Returns:
+            False if the buffer stayed full or the queue is stopping (the
+            event is dropped)
+
+        Raises:
+            ValueError: product_id is not a valid id (callers check that the
+                product exists before submitting)
+        """
+        if product_id is None or product_id < 1:
+            raise ValueError(f"Invalid product id {product_id!r}")
+        row = {
+            'user_id': user_id,
+            'product_id': product_id,
+            'interaction_type': interaction_type,
+            'value': value,
+            'timestamp': datetime.utcnow(),
+        }
+        with self._cond:
+            if len(self._events) >= self.max_events and block and self.block > 0:
+                self._cond.wait_for(lambda: len(self._events) < self.max_events or self._stopping, self.block)
+            if self._stopping or len(self._events) >= self.max_events:
+                self.dropped += 1
+                return False
+
+            self._events.append((time.monotonic(), row))
+            self.accepted += 1
+            depth = len(self._events)
+            self.peak_depth = max(self.peak_depth, depth)
+            # Wake the flusher to start the interval timer or to flush a full batch
+            if depth == 1 or depth == self.flush_events:
+                self._cond.notify_all()
+        return True
+
+    def _take(self) -> List[Tuple[float, Dict[str, Any]]]:
+        """Pop up to one batch (caller holds _cond)"""
+        n = min(len(self._events), self.flush_events)
+        batch = [self._events.popleft() for _ in range(n)]
+        if batch:
+            self._cond.notify_all()  # room for blocked producers
+        return batch
+
+    def _due_in(self) -> Optional[float]:
+        """Seconds until the next flush is due (0 = now, None = nothing buffered)"""
+        if not self._events:
+            return None
+        if len(self._events) >= self.flush_events or self._stopping:
+            return 0.0
+        return max(0.0, self._events[0][0] + self.flush_interval - time.monotonic())
+
+    def _run(self):
+        failures = 0
+        while True:
+            with self._cond:
+                due_in = self._due_in()
+                while due_in is None or due_in > 0:
+                    if due_in is None and self._stopping:
+                        return
+                    self._cond.wait(due_in)
+                    due_in = self._due_in()
+                batch = self._take()
+
+            if self._write(batch, split=failures >= _SPLIT_AFTER_FAILURES):
+                failures = 0
+                continue
+
+            failures += 1
+            if self._stopping and failures >= _SHUTDOWN_ATTEMPTS:
+                with self._cond:
+                    lost = len(self._events)
+                    self._events.clear()
+                    self.lost += lost
+                logger.error(f"Giving up on {lost} buffered interactions at shutdown")
+                return
+            time.sleep(self.flush_interval)
+
+    @staticmethod
+    def _insert(batch: List[Tuple[float, Dict[str, Any]]]):
+        with SessionLocal() as db, db.begin():
+            db.execute(insert(models.Interaction), [row for _, row in batch])
+
+    def _write(self, batch: List[Tuple[float, Dict[str, Any]]], split: bool = False) -> bool:
+        """
+        Bulk insert one batch; on failure its unwritten rows go back to the head of the buffer.
+
+        Args:
+            split: Write the batch in halves, recursively, after a data
+                error, and dead-letter rows that fail on their own
+        """
+        start = time.perf_counter()
+        pending = [batch]
+        written = 0
+        while pending:
+            part = pending.pop()
+            try:
+                self._insert(part)
+                written += len(part)
+            except (IntegrityError, DataError) as e:
+                if not split:
+                    pending.append(part)
+                    return self._failed(batch, pending, written, e)
+                if len(part) == 1:
+                    logger.error(f"Dead-lettered interaction {part[0][1]}: {e}")
+                    with self._cond:
+                        self.dead_lettered += 1
+                    continue
+                mid = len(part) // 2
+                pending += [part[mid:], part[:mid]]
+            except Exception as e:
+                pending.append(part)
+                return self._failed(batch, pending, written, e)
+
+        elapsed = time.perf_counter() - start
+        event_wait = time.monotonic() - batch[0][0]
+        with self._cond:
+            self.flushes += 1
+            self.flushed += written
+            self.last_batch_size = written
+            self.max_batch_size = max(self.max_batch_size, written)
+            self.flush_seconds += elapsed
+            self.max_flush_seconds = max(self.max_flush_seconds, elapsed)
+            self.max_event_wait = max(self.max_event_wait, event_wait)
+        logger.debug(f"Flushed {written} interactions in {elapsed * 1000:.1f}ms")
+        return True
+
+    def _failed(
+        self,
+        batch: List[Tuple[float, Dict[str, Any]]],
+        pending: List[List[Tuple[float, Dict[str, Any]]]],
+        written: int,
+        error: Exception
+    ) -> bool:
+        """Put the unwritten parts (pending is a stack: last = next) back at the head of the buffer"""
+        unwritten = [entry for part in reversed(pending) for entry in part]
+        logger.error(
+            f"Interaction flush failed, {len(unwritten)} of {len(batch)} events requeued: {error}",
+            exc_info=True
+        )
+        with self._cond:
+            self.failed_flushes += 1
+            self.flushed += written
+            self._events.extendleft(reversed(unwritten))
+        return False
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                'running': self.running,
+                'depth': len(self._events),
+                'max_depth': self.max_events,
+                'peak_depth': self.peak_depth,
+                'accepted': self.accepted,
+                'dropped': self.dropped,
+                'flushed': self.flushed,
+                'lost': self.lost,
+                'flushes': self.flushes,
+                'failed_flushes': self.failed_flushes,
+                'dead_lettered': self.dead_lettered,
+                'avg_batch_size': round(self.flushed / self.flushes, 1) if self.flushes else 0.0,
+                'last_batch_size': self.last_batch_size,
+                'max_batch_size': self.max_batch_size,
+                'avg_flush_ms': round(self.flush_seconds / self.flushes * 1000, 2) if self.flushes else 0.0,
+                'max_flush_ms': round(self.max_flush_seconds * 1000, 2),
+                'max_event_wait_ms': round(self.max_event_wait * 1000, 1),
+            }
+
+
+# Global instance, started and drained with the application
+interaction_queue = InteractionQueue(
+    settings.INTERACTION_FLUSH_EVENTS,
+    settings.INTERACTION_FLUSH_INTERVAL_MS,
+    settings.INTERACTION_QUEUE_MAX_EVENTS,
+    settings.INTERACTION_QUEUE_BLOCK_MS
+)
@@ -1,29 +1,130 @@
 from sqlalchemy.orm import Session
-from ..ml.engine import recommender
+from ..ml.training import model_registry, training_jobs
+from ..ml.popularity import popularity_tracker
+from ..ml.trending import trending_tracker
+from ..ml.attribute_index import ProductFilter
 from ..models import models
-from typing import List
+from typing import Dict, List, Optional
+import logging
+import time
+
+logger = logging.getLogger(__name__)
 
 class RecommendationService:
     @staticmethod
-    def get_contextual_recommendations(db: Session, product_id: int, top_n: int = 5) -> List[models.Product]:
+    def get_contextual_recommendations(
+        db: Session,
+        product_id: int,
+        top_n: int = 5,
+        filters: Optional[ProductFilter] = None
+    ) -> List[models.Product]:
         """Recommendations based on a specific product (Similar items)"""
-        product_ids = recommender.get_recommendations(db, product_id=product_id, top_n=top_n)
+        product_ids = model_registry.current.get_recommendations(
+            db, product_id=product_id, top_n=top_n, filters=filters
+        )
         return db.query(models.Product).filter(models.Product.id.in_(product_ids)).all()
 
     @staticmethod
-    def get_personalized_recommendations(db: Session, user_id: int, top_n: int = 10) -> List[models.Product]:
+    def get_personalized_recommendations(
+        db: Session,
+        user_id: int,
+        top_n: int = 10,
+        filters: Optional[ProductFilter] = None
+    ) -> List[models.Product]:
         """Recommendations based on user profile and history"""
-        product_ids = recommender.get_recommendations(db, user_id=user_id, top_n=top_n)
+        product_ids = model_registry.current.get_recommendations(
+            db, user_id=user_id, top_n=top_n, filters=filters
+        )
         return db.query(models.Product).filter(models.Product.id.in_(product_ids)).all()
 
     @staticmethod
-    def get_trending_recommendations(db: Session, top_n: int = 5) -> List[models.Product]:
-        """Popular items overall"""
-        product_ids = recommender.get_recommendations(db, top_n=top_n)
+    def get_trending_recommendations(db: Session, category: Optional[str] = None, top_n: int = 5) -> List[models.Product]:
+        """Fastest-rising items, topped up with popular items when too few are trending"""
+        product_ids = RecommendationService.get_trending_product_ids(db, category=category, top_n=top_n)
         return db.query(models.Product).filter(models.Product.id.in_(product_ids)).all()
 
     @staticmethod
-    def trigger_rebuild(db: Session):
-        """Manually trigger model retraining"""
-        recommender.fit(db)
-        return {"status": "success", "message": "Model retraining initiated"}
+    def get_trending_product_ids(db: Session, category: Optional[str] = None, top_n: int = 5) -> List[int]:
+        model = model_registry.current
+        product_ids = model.get_trending(db, category=category, top_n=top_n)
+        if len(product_ids) < top_n:
+            popular = model.get_recommendations(db, category=category, top_n=top_n)
+            product_ids += [pid for pid in popular if pid not in product_ids][:top_n - len(product_ids)]
+        return product_ids
+
+    @staticmethod
+    def get_batch_recommendations(
+        db: Session,
+        user_ids: Optional[List[int]] = None,
+        product_ids: Optional[List[int]] = None,
+        top_n: int = 10,
+        diversity_factor: float = 0.3,
+        filters: Optional[ProductFilter] = None
+    ) -> Dict:
+        """Recommendation ID lists for many users and/or seed products in one call"""
+        start = time.perf_counter()
+        recommendations = model_registry.current.get_recommendations_batch(
+            db,
+            user_ids=user_ids,
+            product_ids=product_ids,
+            top_n=top_n,
+            diversity_factor=diversity_factor,
+            filters=filters
+        )
+        elapsed = time.perf_counter() - start
+
+        count = len(recommendations)
+        throughput = count / elapsed if elapsed > 0 else 0.0
+        logger.info(f"Batch recommendations: {count} requests in {elapsed * 1000:.0f}ms ({throughput:.0f}/s)")
+
+        return {
+            "results": [
+                {
+                    "user_id": user_ids[i] if user_ids else None,
+                    "product_id": product_ids[i] if product_ids else None,
+                    "recommendations": recs
+                }
+                for i, recs in enumerate(recommendations)
+            ],
+            "count": count,
+            "elapsed_ms": elapsed * 1000,
+            "recommendations_per_second": throughput
+        }
+
+    @staticmethod
+    def load_latest_model() -> bool:
+        """Load the newest trained artifact instead of retraining in this process"""
+        return model_registry.refresh()
+
+    @staticmethod
+    def index_product(product: models.Product):
+        """Make a new or edited product recommendable without a full retrain"""
+        model_registry.upsert_product(product)
+        trending_tracker.set_category(product.id, product.category)
+
+    @staticmethod
+    def update_product_attributes(product: models.Product):
+        """Apply a price or stock change to the recommender's filters (no re-encoding)"""
+        model_registry.update_product_attributes(product)
+
+    @staticmethod
+    def record_interaction(product_id: int):
+        """Count a just-committed interaction in the live popularity and trending counters"""
+        popularity_tracker.record(product_id)
+        trending_tracker.record(product_id)
+
+    @staticmethod
+    def rebuild_interaction_counters(db: Session):
+        """Rebuild popularity and trending counters from recent interactions in the database"""
+        popularity_tracker.rebuild(db)
+        trending_tracker.rebuild(db)
+
+    @staticmethod
+    def trigger_rebuild(trigger: str = "manual") -> Dict:
+        """Start model retraining in the background worker"""
+        return training_jobs.submit(trigger)
+
+    @staticmethod
+    def get_rebuild_status(job_id: str) -> Optional[Dict]:
+        """Status and progress of a retraining job"""
+        return training_jobs.get(job_id)
@@ -0,0 +1,224 @@
+"""
+Load test: max sustainable requests/second of the sync routes (/api/...)
+vs. the async routes (/api/async/...).
+
+Run from the server directory (seed the database first):
+    python -m benchmarks.bench_async_load --rates 50 100 200 400 800 --duration 10
+
+Starts one uvicorn worker per stack (or targets --base-url), logs in as
+the seeded test user and offers an open-loop load at each rate: requests
+start on schedule whether or not earlier ones have finished, so a stack
+that falls behind shows up as growing latency rather than a slower client.
+A rate is sustainable when at least 99% of its requests succeed, the
+achieved rate is within 5% of the offered one and p99 latency stays under
+--p99-slo-ms. Each stack is ramped until the first rate that is not
+sustainable.
+
+Requests cycle through the recommendation and catalog reads (personalized,
+similar, trending, product detail, category listing); only personalized
+requests are authenticated, since a signed-in product view also writes an
+interaction. With --db-latency-ms
+each database query of the server also waits that long, like a round
+trip to a remote Postgres (blocking the thread on the sync engine, awaited
+on the async one); against a local SQLite file the query itself is nearly
+free and both stacks are CPU-bound.
+"""
+import argparse
+import asyncio
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional
+
+import httpx
+import numpy as np
+
+STACKS = {"sync": "/api", "async": "/api/async"}
+ROUTES = [
+    "/recommendations/personalized",
+    "/recommendations/similar/{product_id}",
+    "/recommendations/trending",
+    "/products/{product_id}",
+    "/products/?category={category}",
+]
+CATEGORIES = ["Electronics", "Fashion", "Home", "Sports", "Beauty"]
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(port: int, db_latency_ms: float) -> subprocess.Popen:
+    env = dict(
+        os.environ,
+        RATE_LIMIT_ENABLED="false",
+        DEBUG="false",
+        TRAINING_SCHEDULE_ENABLED="false",
+        BENCH_DB_LATENCY_MS=str(db_latency_ms),
+    )
+    # Adds the per-query latency before the app imports the engines: a blocking
+    # sleep on the sync engine's thread, an awaited one on the async engine
+    code = (
+        "import asyncio, os, time, uvicorn\n"
+        "from sqlalchemy import event\n"
+        "from sqlalchemy.util import await_only\n"
+        "from app.core import database\n"
+        "delay = float(os.environ['BENCH_DB_LATENCY_MS']) / 1000\n"
+        "if delay:\n"
+        "    event.listen(database.engine, 'before_cursor_execute', lambda *args: time.sleep(delay))\n"
+        "    event.listen(database.async_engine.sync_engine, 'before_cursor_execute',\n"
+        "                 lambda *args: await_only(asyncio.sleep(delay)))\n"
+        f"uvicorn.run('app.main:app', host='127.0.0.1', port={port}, log_level='warning')\n"
+    )
+    # Request logs would interleave with the results; use --base-url to watch a server's logs
+    return subprocess.Popen(
+        [sys.executable, "-c", code], env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+
+
+async def wait_until_ready(client: httpx.AsyncClient, timeout: float = 600.0):
+    """Wait for the server to answer and a trained model to be loaded"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            health = (await client.get("/health")).json()
+            if health["checks"].get("ml_engine") == "loaded":
+                return
+        except httpx.HTTPError:
+            pass
+        await asyncio.sleep(1.0)
+    raise SystemExit("Server did not become ready (is the database seeded?)")
+
+
+async def run_rate(
+    client: httpx.AsyncClient,
+    prefix: str,
+    rate: float,
+    duration: float,
+    product_ids: List[int],
+    headers: Dict[str, str],
+    timeout: float
+) -> Dict[str, float]:
+    """Offer rate requests/second for duration seconds; latency and error stats"""
+    rng = random.Random(42)
+    latencies: List[float] = []
+    errors: Dict[str, int] = {}
+
+    async def one(path: str):
+        start = time.perf_counter()
+        try:
+            response = await client.get(
+                prefix + path, headers=headers if "personalized" in path else None, timeout=timeout
+            )
+            if response.status_code != 200:
+                errors[str(response.status_code)] = errors.get(str(response.status_code), 0) + 1
+                return
+        except httpx.HTTPError as e:
+            errors[type(e).__name__] = errors.get(type(e).__name__, 0) + 1
+            return
+        latencies.append(time.perf_counter() - start)
+
+    n = int(rate * duration)
+    tasks = []
+    start = time.perf_counter()
+    for i in range(n):
+        delay = start + i / rate - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        path = ROUTES[i % len(ROUTES)].format(product_id=rng.choice(product_ids), category=rng.choice(CATEGORIES))
+        tasks.append(asyncio.ensure_future(one(path)))
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - start
+
+    lat = np.array(latencies) * 1000 if latencies else np.array([np.inf])
+    return {
+        'achieved': len(latencies) / elapsed,
+        'p50': float(np.percentile(lat, 50)),
+        'p99': float(np.percentile(lat, 99)),
+        'error_rate': sum(errors.values()) / n if n else 0.0,
+        'errors': errors,
+    }
+
+
+async def ramp(args, base_url: str, stack: str) -> Optional[float]:
+    """Offer each rate in turn; the highest sustainable one (None if the first is not)"""
+    limits = httpx.Limits(max_connections=args.max_connections, max_keepalive_connections=args.max_connections)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits) as client:
+        await wait_until_ready(client)
+        login = await client.post("/api/auth/login", data={"username": args.email, "password": args.password})
+        if login.status_code != 200:
+            raise SystemExit(f"Login failed ({login.status_code}); seed the database first")
+        headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+        product_ids = [p["id"] for p in (await client.get("/api/products/")).json()]
+
+        # Warm caches, connection pools and the scoring pool
+        await run_rate(client, STACKS[stack], 20, 2, product_ids, headers, args.timeout)
+
+        best = None
+        for rate in args.rates:
+            stats = await run_rate(client, STACKS[stack], rate, args.duration, product_ids, headers, args.timeout)
+            ok = (
+                stats['error_rate'] <= 0.01
+                and stats['achieved'] >= 0.95 * rate
+                and stats['p99'] <= args.p99_slo_ms
+            )
+            print(
+                f"{stack:>6} | {rate:8.0f} | {stats['achieved']:8.0f} | {stats['p50']:8.1f} | "
+                f"{stats['p99']:8.1f} | {stats['error_rate']:6.1%} | {'yes' if ok else 'no'}"
+                + (f"  {stats['errors']}" if stats['errors'] else "")
+            )
+            if not ok:
+                return best
+            best = rate
+            await asyncio.sleep(args.cooldown)
+        return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="", help="Test a running server instead of starting one per stack")
+    parser.add_argument("--stacks", nargs="+", choices=list(STACKS), default=list(STACKS))
+    parser.add_argument("--rates", type=float, nargs="+", default=[50, 100, 200, 400, 800, 1600])
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds per rate")
+    parser.add_argument("--cooldown", type=float, default=2.0, help="Pause between rates")
+    parser.add_argument("--p99-slo-ms", type=float, default=500.0)
+    parser.add_argument("--timeout", type=float, default=10.0, help="Per-request timeout (counted as an error)")
+    parser.add_argument("--max-connections", type=int, default=1000)
+    parser.add_argument("--db-latency-ms", type=float, default=0.0, help="Added to every query (started server only)")
+    parser.add_argument("--email", default="test@example.com")
+    parser.add_argument("--password", default="password123")
+    args = parser.parse_args()
+
+    print(f"{'stack':>6} | {'offered':>8} | {'achieved':>8} | {'p50 ms':>8} | {'p99 ms':>8} | {'errors':>7} | sustained")
+    print("-" * 72)
+    best: Dict[str, Optional[float]] = {}
+    for stack in args.stacks:
+        # A fresh server per stack: an overloaded run leaves a backlog behind
+        server = None
+        base_url = args.base_url
+        if not base_url:
+            port = free_port()
+            server = start_server(port, args.db_latency_ms)
+            base_url = f"http://127.0.0.1:{port}"
+        try:
+            best[stack] = asyncio.run(ramp(args, base_url, stack))
+        finally:
+            if server is not None:
+                server.terminate()
+                try:
+                    server.wait(timeout=30)
+                except subprocess.TimeoutExpired:
+                    server.kill()
+
+    print()
+    for stack, rate in best.items():
+        print(f"max sustainable {stack:>5}: {f'{rate:.0f} req/s' if rate else f'below {args.rates[0]:.0f} req/s'}")
+
+
+if __name__ == "__main__":
+    main()
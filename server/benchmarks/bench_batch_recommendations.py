@@ -0,0 +1,68 @@
+"""
+Benchmark: one get_recommendations call per user vs. get_recommendations_batch.
+
+Run from the server directory:
+    python -m benchmarks.bench_batch_recommendations --sizes 10000 100000 --requests 1000
+
+Uses the synthetic engine state from bench_hybrid_scoring (no cache, no
+database). Reports recommendations per second for personalized requests
+(users) and similar-item requests (seeds), without diversity re-ranking.
+"""
+import argparse
+import time
+
+import numpy as np
+
+from app.core.config import settings
+from benchmarks.bench_hybrid_scoring import build_engine
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--users", type=int, default=50000)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[16, 64, 256])
+    parser.add_argument("--top-n", type=int, default=10)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    print(f"{'N':>8} | {'kind':>6} | {'mode':>10} | {'recs/s':>10} | {'speedup':>8}")
+    print("-" * 54)
+
+    for n in args.sizes:
+        engine = build_engine(n, args.users, settings.SIMILARITY_TOP_K, settings.CF_FACTORS, rng)
+        engine.is_trained = True
+        popularity = rng.random(n).astype(np.float32)
+        engine._get_popularity_scores = lambda db: popularity
+
+        user_ids = rng.integers(1, args.users + 1, args.requests).tolist()
+        seed_ids = rng.integers(1, n + 1, args.requests).tolist()
+
+        for kind, kwargs in (("users", {'user_ids': user_ids}), ("seeds", {'product_ids': seed_ids})):
+            ids = kwargs.get('user_ids') or kwargs.get('product_ids')
+            key = 'user_id' if 'user_ids' in kwargs else 'product_id'
+
+            start = time.perf_counter()
+            single = [
+                engine.get_recommendations(None, top_n=args.top_n, diversity_factor=0, **{key: i})
+                for i in ids
+            ]
+            single_rate = len(ids) / (time.perf_counter() - start)
+            print(f"{n:>8} | {kind:>6} | {'single':>10} | {single_rate:10.0f} | {'':>8}")
+
+            for batch_size in args.batch_sizes:
+                start = time.perf_counter()
+                batch = engine.get_recommendations_batch(
+                    None, top_n=args.top_n, diversity_factor=0, batch_size=batch_size, **kwargs
+                )
+                batch_rate = len(ids) / (time.perf_counter() - start)
+                assert batch == single or kind == "users"
+                print(
+                    f"{n:>8} | {kind:>6} | {f'batch {batch_size}':>10} | {batch_rate:10.0f} | "
+                    f"{batch_rate / single_rate:7.1f}x"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Benchmark: bytes per cache entry and encode/decode time of the cache
+codecs against plain JSON (the format before the codec layer).
+
+Run from the server directory:
+    python -m benchmarks.bench_cache_codecs --top-k 50 --iterations 20000
+
+Payloads:
+- similarity: a product's top-K neighbors, as the JSON list of
+  {'product_id', 'score'} dicts previously cached, vs. the packed
+  (ids, scores) array pair cached now
+- recommendations: a stale-while-revalidate entry holding 10 product IDs
+- materialized: a MATERIALIZE_TOP_N (ids, scores) list
+
+"decode" includes turning the similarity payload into the score array
+_get_content_scores fills, since that is the work a read has to do.
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+
+from app.core import cache
+from app.core.config import settings
+
+
+def timed(func, iterations: int) -> float:
+    """Microseconds per call"""
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--top-k", type=int, default=settings.SIMILARITY_TOP_K)
+    parser.add_argument("--catalog", type=int, default=100000)
+    parser.add_argument("--iterations", type=int, default=20000)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    ids = np.sort(rng.choice(args.catalog, args.top_k, replace=False)).astype(np.int64) + 1
+    scores = np.sort(rng.random(args.top_k).astype(np.float32))[::-1].copy()
+    id_to_row = {pid: pid - 1 for pid in range(1, args.catalog + 1)}
+    row_scores = np.zeros(args.catalog, dtype=np.float32)
+
+    def fill_from_dicts(items):
+        for item in items:
+            row_scores[id_to_row[item['product_id']]] = item['score']
+
+    def fill_from_arrays(pair):
+        rows = np.fromiter((id_to_row[pid] for pid in pair[0].tolist()), dtype=np.int64, count=len(pair[0]))
+        row_scores[rows] = pair[1]
+
+    similarity_dicts = [{'product_id': pid, 'score': s} for pid, s in zip(ids.tolist(), scores.tolist())]
+    recommendations = {"value": rng.integers(1, args.catalog, 10).tolist(), "_fresh_until": time.time()}
+    top_n = settings.MATERIALIZE_TOP_N
+    materialized = (rng.integers(1, args.catalog, top_n), rng.random(top_n).astype(np.float32))
+
+    cases = [
+        ("similarity", "json", similarity_dicts, "json", fill_from_dicts),
+        ("similarity", "packed", (ids, scores), None, fill_from_arrays),
+        ("recs", "json", recommendations, "json", None),
+        ("recs", "msgpack", recommendations, "msgpack", None),
+        ("materialized", "json", {'ids': materialized[0].tolist(), 'scores': materialized[1].tolist()}, "json", None),
+        ("materialized", "packed", materialized, None, None),
+    ]
+
+    print(f"{'payload':>12} | {'codec':>8} | {'compress':>8} | {'bytes':>6} | {'encode us':>9} | {'decode us':>9}")
+    print("-" * 68)
+    for payload, label, value, codec, consume in cases:
+        for compress_min in (0, 1024):
+            if codec:
+                settings.CACHE_CODEC = codec
+            settings.CACHE_COMPRESS_MIN_BYTES = compress_min
+            if label == "json" and not compress_min:
+                # The format before the codec layer
+                encode = lambda: json.dumps(value)
+                decode_raw = json.loads
+            else:
+                encode = lambda: cache.encode_value(value)
+                decode_raw = cache.decode_value
+            raw = encode()
+            decode = (lambda: consume(decode_raw(raw))) if consume else (lambda: decode_raw(raw))
+
+            encode_us = timed(encode, args.iterations)
+            decode_us = timed(decode, args.iterations)
+            print(
+                f"{payload:>12} | {label:>8} | {'>=1KB' if compress_min else 'off':>8} | {len(raw):>6} | "
+                f"{encode_us:9.1f} | {decode_us:9.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Benchmark: one set_cache / get_cache round trip per key vs. pipelined
+mset_cache / mget_cache.
+
+Run from the server directory against a local Redis:
+    python -m benchmarks.bench_cache_pipeline --redis-url redis://localhost:6379/15 --keys 10000 100000
+
+Writes similarity-list-sized values (top-K neighbor dicts, as the
+similarity precompute does) and reads them back, with the L1 cache off so
+every read goes to Redis. The benchmark's keys are deleted afterwards.
+
+Without --redis-url, fakeredis's TCP server is started in-process if
+fakeredis is installed: the round trips are real loopback round trips,
+but command handling is far slower than in Redis.
+"""
+import argparse
+import threading
+import time
+
+from app.core import cache
+from app.core.config import settings
+
+KEY_PREFIX = "bench:pipeline"
+
+
+def connect(redis_url: str):
+    if redis_url:
+        return cache.init_redis(redis_url)
+
+    try:
+        from fakeredis import TcpFakeServer
+    except ImportError:
+        raise SystemExit("Pass --redis-url (fakeredis is not installed)")
+    server = TcpFakeServer(("127.0.0.1", 0), server_type="redis")
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address
+    print(f"Using fakeredis on {host}:{port}")
+    return cache.init_redis(f"redis://{host}:{port}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--redis-url", default="")
+    parser.add_argument("--keys", type=int, nargs="+", default=[10000])
+    parser.add_argument("--chunk-sizes", type=int, nargs="+", default=[100, 1000, 5000])
+    parser.add_argument("--top-k", type=int, default=settings.SIMILARITY_TOP_K)
+    args = parser.parse_args()
+
+    client = connect(args.redis_url)
+    if client is None:
+        raise SystemExit("Could not connect to Redis")
+    cache.local_cache = None  # measure Redis, not the in-process L1
+
+    value = [{'product_id': i, 'score': 0.5} for i in range(args.top_k)]
+    print(f"{'keys':>8} | {'op':>5} | {'mode':>12} | {'keys/s':>10} | {'speedup':>8}")
+    print("-" * 56)
+
+    for n in args.keys:
+        keys = [f"{KEY_PREFIX}:{i}" for i in range(n)]
+        try:
+            # Writes
+            start = time.perf_counter()
+            for key in keys:
+                cache.set_cache(key, value, ttl=300)
+            single_rate = n / (time.perf_counter() - start)
+            print(f"{n:>8} | {'set':>5} | {'per key':>12} | {single_rate:10.0f} | {'':>8}")
+
+            for chunk_size in args.chunk_sizes:
+                start = time.perf_counter()
+                assert cache.mset_cache({key: value for key in keys}, ttl=300, chunk_size=chunk_size)
+                rate = n / (time.perf_counter() - start)
+                print(
+                    f"{n:>8} | {'set':>5} | {f'pipeline {chunk_size}':>12} | {rate:10.0f} | "
+                    f"{rate / single_rate:7.1f}x"
+                )
+
+            # Reads
+            start = time.perf_counter()
+            for key in keys:
+                cache.get_cache(key)
+            single_rate = n / (time.perf_counter() - start)
+            print(f"{n:>8} | {'get':>5} | {'per key':>12} | {single_rate:10.0f} | {'':>8}")
+
+            for chunk_size in args.chunk_sizes:
+                start = time.perf_counter()
+                values = cache.mget_cache(keys, chunk_size=chunk_size)
+                rate = n / (time.perf_counter() - start)
+                assert all(v == value for v in values)
+                print(
+                    f"{n:>8} | {'get':>5} | {f'pipeline {chunk_size}':>12} | {rate:10.0f} | "
+                    f"{rate / single_rate:7.1f}x"
+                )
+        finally:
+            for start in range(0, n, 10000):
+                client.delete(*keys[start:start + 10000])
+
+
+if __name__ == "__main__":
+    main()
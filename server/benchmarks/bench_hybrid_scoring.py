@@ -0,0 +1,121 @@
+"""
+Benchmark: per-request hybrid scoring latency, dict/pandas loop vs. dense
+NumPy arrays with argpartition top-N.
+
+Run from the server directory:
+    python -m benchmarks.bench_hybrid_scoring --sizes 10000 100000
+
+Popularity is precomputed for both paths so only scoring and selection are
+timed. The legacy path with a category filter does one pandas scan per
+product (O(N^2)), so it is skipped above --legacy-category-max.
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from app.ml.attribute_index import ProductFilter
+from app.ml.engine_v2 import HybridRecommenderV2
+from app.ml.neighbors import NeighborTable
+from app.core.config import settings
+
+
+def legacy_scores(product_df, content_scores, cf_scores, popularity_scores, product_id, category):
+    """The pre-vectorization _compute_hybrid_scores loop and top-N sort"""
+    scores = {}
+    for pid in product_df['id'].tolist():
+        if product_id and pid == product_id:
+            continue
+        if category:
+            product_cat = product_df[product_df['id'] == pid]['category'].values[0]
+            if product_cat != category:
+                continue
+        scores[pid] = (
+            settings.CONTENT_WEIGHT * content_scores.get(pid, 0) +
+            settings.COLLABORATIVE_WEIGHT * cf_scores.get(pid, 0) +
+            settings.POPULARITY_WEIGHT * popularity_scores.get(pid, 0)
+        )
+    sorted_scores = sorted(scores.items(), key=lambda x: x[1], reverse=True)
+    return [pid for pid, _ in sorted_scores[:10]]
+
+
+def build_engine(n: int, n_users: int, k: int, factors: int, rng) -> HybridRecommenderV2:
+    """Engine with synthetic trained state, skipping encoder loading"""
+    engine = HybridRecommenderV2.__new__(HybridRecommenderV2)
+    engine.product_df = pd.DataFrame({
+        'id': np.arange(1, n + 1),
+        'category': rng.choice([f"cat{i}" for i in range(20)], n),
+    })
+    engine.product_id_to_idx = {pid: i for i, pid in enumerate(engine.product_df['id'])}
+    engine._refresh_product_arrays()
+
+    indices = rng.integers(0, n, size=n * k).astype(np.int32)
+    scores = np.sort(rng.random(n * k).astype(np.float32).reshape(n, k), axis=1)[:, ::-1].ravel()
+    engine.neighbor_table = NeighborTable(np.arange(0, n * k + 1, k, dtype=np.int32), indices, scores)
+
+    engine.has_cf = True
+    engine.user_map = {uid: i for i, uid in enumerate(range(1, n_users + 1))}
+    engine.item_map = {pid: i for i, pid in enumerate(engine.product_df['id'])}
+    engine.user_factors = rng.random((n_users, factors), dtype=np.float32)
+    engine.item_factors = rng.random((n, factors), dtype=np.float32)
+    return engine
+
+
+def timed(fn, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--legacy-category-max", type=int, default=20000)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    print(f"{'N':>8} | {'filter':>8} | {'legacy (ms)':>12} | {'vectorized (ms)':>15} | {'speedup':>8}")
+    print("-" * 64)
+
+    for n in args.sizes:
+        engine = build_engine(n, args.users, settings.SIMILARITY_TOP_K, settings.CF_FACTORS, rng)
+        # The legacy path read a dense users x items prediction DataFrame
+        preds_df = pd.DataFrame(
+            engine.user_factors @ engine.item_factors.T,
+            index=np.arange(1, args.users + 1),
+            columns=engine.product_df['id']
+        )
+        popularity = rng.random(n).astype(np.float32)
+        engine._get_popularity_scores = lambda db: popularity
+        product_id, user_id = 1, 1
+
+        for category in (None, "cat3"):
+            def vectorized():
+                scores = engine._compute_hybrid_scores(None, user_id, product_id, ProductFilter(category=category))
+                return engine.product_ids[engine._top_n_rows(scores, 10)].tolist()
+
+            def legacy():
+                rows, sims = engine.neighbor_table.neighbors(0)
+                content = dict(zip(engine.product_ids[rows].tolist(), sims.tolist()))
+                user_preds = preds_df.loc[user_id]
+                max_pred = user_preds.max()
+                cf = {pid: float(max(0, user_preds[pid]) / max_pred) for pid in user_preds.index}
+                pop = dict(zip(engine.product_ids.tolist(), popularity.tolist()))
+                return legacy_scores(engine.product_df, content, cf, pop, product_id, category)
+
+            new_ms = timed(vectorized, args.repeat)
+            if category and n > args.legacy_category_max:
+                legacy_col, speedup_col = f"{'skip':>12}", f"{'-':>8}"
+            else:
+                legacy_ms = timed(legacy, 1 if category else max(1, args.repeat // 10))
+                legacy_col, speedup_col = f"{legacy_ms:12.1f}", f"{legacy_ms / new_ms:7.0f}x"
+
+            print(f"{n:>8} | {category or 'none':>8} | {legacy_col} | {new_ms:15.2f} | {speedup_col}")
+
+
+if __name__ == "__main__":
+    main()
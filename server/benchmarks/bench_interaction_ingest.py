@@ -0,0 +1,111 @@
+"""
+Benchmark: one commit per interaction (the old request path) vs. the
+write-behind InteractionQueue.
+
+Run from the server directory (the database must exist; seed it first):
+    python -m benchmarks.bench_interaction_ingest --events 20000 --threads 8
+
+Each producer thread writes --events / --threads interactions, as
+threadpool routes would. "commit" opens a session, adds the row and
+commits per event; "queue" submits to an InteractionQueue and the run ends
+only when the last event is flushed, so both columns measure events made
+durable per second. Queue rows show the batch sizes and flush latency the
+flusher reported. The benchmark's rows are deleted afterwards.
+
+Set DATABASE_URL to benchmark another database; against SQLite every
+commit is an fsync'd transaction, against a remote Postgres a network
+round trip as well.
+"""
+import argparse
+import threading
+import time
+from typing import Callable
+
+from app.core.database import SessionLocal
+from app.models import models
+from app.services.interaction_queue import InteractionQueue
+
+INTERACTION_TYPE = "bench_ingest"
+
+
+def run_producers(threads: int, events: int, produce: Callable[[int], None]) -> float:
+    """Start threads that call produce(i) events // threads times each; seconds taken"""
+    per_thread = events // threads
+    workers = [
+        threading.Thread(target=lambda: [produce(i) for i in range(per_thread)])
+        for _ in range(threads)
+    ]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=20000)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--flush-events", type=int, nargs="+", default=[100, 500, 2000])
+    parser.add_argument("--flush-interval-ms", type=int, default=200)
+    parser.add_argument("--max-events", type=int, default=10000)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        user_id = db.query(models.User.id).first()
+        product_ids = [p.id for p in db.query(models.Product.id).limit(100)]
+    finally:
+        db.close()
+    if user_id is None or not product_ids:
+        raise SystemExit("No users or products; seed the database first")
+    user_id = user_id[0]
+    events = args.events - args.events % args.threads
+
+    def commit_one(i: int):
+        session = SessionLocal()
+        try:
+            session.add(models.Interaction(
+                user_id=user_id,
+                product_id=product_ids[i % len(product_ids)],
+                interaction_type=INTERACTION_TYPE,
+                value=1.0
+            ))
+            session.commit()
+        finally:
+            session.close()
+
+    print(f"{'mode':>12} | {'events/s':>10} | {'speedup':>8} | {'batch avg':>9} | {'flush avg ms':>12} | {'dropped':>7}")
+    print("-" * 74)
+    try:
+        baseline = events / run_producers(args.threads, events, commit_one)
+        print(f"{'commit':>12} | {baseline:10.0f} | {'':>8} | {'1':>9} | {'':>12} | {'':>7}")
+
+        for flush_events in args.flush_events:
+            queue = InteractionQueue(flush_events, args.flush_interval_ms, args.max_events, block_ms=1000)
+            queue.start()
+
+            def submit_one(i: int):
+                queue.submit(user_id, product_ids[i % len(product_ids)], INTERACTION_TYPE)
+
+            start = time.perf_counter()
+            run_producers(args.threads, events, submit_one)
+            queue.stop()
+            rate = events / (time.perf_counter() - start)
+            stats = queue.stats()
+            print(
+                f"{f'queue {flush_events}':>12} | {rate:10.0f} | {rate / baseline:7.1f}x | "
+                f"{stats['avg_batch_size']:9.1f} | {stats['avg_flush_ms']:12.2f} | {stats['dropped']:7d}"
+            )
+    finally:
+        db = SessionLocal()
+        try:
+            db.query(models.Interaction).filter(models.Interaction.interaction_type == INTERACTION_TYPE).delete()
+            db.commit()
+        finally:
+            db.close()
+
+
+if __name__ == "__main__":
+    main()
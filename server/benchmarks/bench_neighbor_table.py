@@ -0,0 +1,73 @@
+"""
+Benchmark: legacy per-row argsort similarity precompute vs. blockwise
+argpartition neighbor table.
+
+Run from the server directory:
+    python -m benchmarks.bench_neighbor_table --sizes 10000 50000 100000
+
+The legacy builder materializes the dense N x N float64 cosine matrix, so
+it is skipped for sizes whose matrix would exceed --legacy-max-gb.
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from app.ml.neighbors import build_neighbor_table
+from app.ml.vector_index import normalize_embeddings
+
+
+def legacy_builder(product_df: pd.DataFrame, embeddings: np.ndarray, k: int) -> dict:
+    """The pre-neighbor-table _precompute_similarities loop (without cache writes)"""
+    from sklearn.metrics.pairwise import cosine_similarity
+
+    content_sim_matrix = cosine_similarity(embeddings)
+    result = {}
+    for idx, product_id in enumerate(product_df['id']):
+        sim_scores = content_sim_matrix[idx]
+        top_indices = np.argsort(sim_scores)[::-1][1:k + 1]
+        result[product_id] = [
+            {'product_id': int(product_df.iloc[i]['id']), 'score': float(sim_scores[i])}
+            for i in top_indices
+        ]
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 50000, 100000])
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--k", type=int, default=50)
+    parser.add_argument("--block-size", type=int, default=1024)
+    parser.add_argument("--legacy-max-gb", type=float, default=4.0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    print(f"{'N':>8} | {'legacy (s)':>12} | {'blockwise (s)':>13} | {'speedup':>8} | {'table MB':>8}")
+    print("-" * 62)
+
+    for n in args.sizes:
+        embeddings = normalize_embeddings(rng.standard_normal((n, args.dim)))
+        product_df = pd.DataFrame({'id': np.arange(1, n + 1)})
+
+        start = time.perf_counter()
+        table = build_neighbor_table(embeddings, args.k, args.block_size)
+        new_time = time.perf_counter() - start
+
+        legacy_gb = n * n * 8 / 1024 ** 3
+        if legacy_gb <= args.legacy_max_gb:
+            start = time.perf_counter()
+            legacy_builder(product_df, embeddings, args.k)
+            legacy_time = time.perf_counter() - start
+            legacy_col = f"{legacy_time:12.2f}"
+            speedup_col = f"{legacy_time / new_time:7.1f}x"
+        else:
+            legacy_col = f"{'skip ' + format(legacy_gb, '.0f') + 'GB':>12}"
+            speedup_col = f"{'-':>8}"
+
+        print(f"{n:>8} | {legacy_col} | {new_time:13.2f} | {speedup_col} | {table.nbytes / 1024 ** 2:8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""
+Benchmark: training data loading, ORM `.all()` + list-of-dicts vs. streamed
+column-only loading into preallocated arrays.
+
+Run from the server directory:
+    python -m benchmarks.bench_training_load --sizes 1000000 10000000
+
+Each size gets a synthetic SQLite database (products, users' interactions).
+Each loader runs in a fresh subprocess so peak RSS is measured in
+isolation; "peak" is the high-water mark minus the RSS after imports
+(Linux only). The legacy loader holds one ORM object per row (over 1 KB
+each), so it is skipped above --legacy-max rows.
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.core.database import Base
+from app.models import models
+from app.ml.data_loader import load_interactions, load_products
+
+
+def peak_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KB on Linux
+
+
+def current_rss_mb() -> float:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+
+
+def create_database(path: str, n_interactions: int, n_products: int, n_users: int, rng):
+    """Synthetic database with the app schema, filled with raw executemany"""
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    chunk = 500_000
+    now = datetime.utcnow().isoformat(sep=" ")
+
+    with engine.begin() as conn:
+        conn.exec_driver_sql(
+            "INSERT INTO products (id, name, description, category, price, rating, stock_count, brand, tags) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [
+                (pid, f"Product {pid}", f"Description of product {pid}", f"cat{pid % 20}",
+                 float(pid % 500), 4.0, 100, f"brand{pid % 50}", "tag1, tag2")
+                for pid in range(1, n_products + 1)
+            ]
+        )
+        for start in range(0, n_interactions, chunk):
+            size = min(chunk, n_interactions - start)
+            user_ids = rng.integers(1, n_users + 1, size).tolist()
+            product_ids = rng.integers(1, n_products + 1, size).tolist()
+            values = rng.choice([1.0, 2.0, 3.0, 5.0], size).tolist()
+            conn.exec_driver_sql(
+                "INSERT INTO interactions (user_id, product_id, interaction_type, value, timestamp) "
+                "VALUES (?, ?, 'view', ?, ?)",
+                [(u, p, v, now) for u, p, v in zip(user_ids, product_ids, values)]
+            )
+    engine.dispose()
+
+
+def product_record(p: models.Product) -> dict:
+    """HybridRecommenderV2._product_record (importing the engine would load the encoder)"""
+    return {
+        'id': p.id,
+        'name': p.name,
+        'description': p.description or "",
+        'category': p.category or "",
+        'tags': p.tags or "",
+        'brand': p.brand or "",
+        'price': p.price,
+        'rating': p.rating or 0.0,
+        'stock_count': p.stock_count
+    }
+
+
+def legacy_loader(db):
+    """The pre-streaming _load_data / _train_collaborative_filtering loading"""
+    products = db.query(models.Product).all()
+    product_df = pd.DataFrame([product_record(p) for p in products])
+    interactions = db.query(models.Interaction).all()
+    arrays = (
+        np.fromiter((i.user_id for i in interactions), dtype=np.int64, count=len(interactions)),
+        np.fromiter((i.product_id for i in interactions), dtype=np.int64, count=len(interactions)),
+        np.fromiter((i.value or 0.0 for i in interactions), dtype=np.float32, count=len(interactions)),
+    )
+    return product_df, arrays
+
+
+def streaming_loader(db):
+    return load_products(db), load_interactions(db)
+
+
+LOADERS = {'legacy': legacy_loader, 'streaming': streaming_loader}
+
+
+def run_loader(name: str, path: str):
+    """Subprocess entry: run one loader and print its measurements as JSON"""
+    Session = sessionmaker(bind=create_engine(f"sqlite:///{path}"))
+    db = Session()
+    baseline = current_rss_mb()
+    start = time.perf_counter()
+    _, (user_ids, _, _) = LOADERS[name](db)
+    seconds = time.perf_counter() - start
+    print(json.dumps({'seconds': seconds, 'peak_mb': peak_rss_mb() - baseline, 'rows': len(user_ids)}))
+
+
+def measure(name: str, path: str) -> dict:
+    output = subprocess.run(
+        [sys.executable, "-m", "benchmarks.bench_training_load", "--run", name, "--db", path],
+        check=True, capture_output=True, text=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000_000, 10_000_000])
+    parser.add_argument("--products", type=int, default=50_000)
+    parser.add_argument("--users", type=int, default=200_000)
+    parser.add_argument("--legacy-max", type=int, default=2_000_000)
+    parser.add_argument("--run", choices=LOADERS, help=argparse.SUPPRESS)
+    parser.add_argument("--db", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        run_loader(args.run, args.db)
+        return
+
+    rng = np.random.default_rng(42)
+    print(f"{'rows':>10} | {'loader':>9} | {'wall (s)':>9} | {'peak RSS (MB)':>13} | {'MB / 1M rows':>12}")
+    print("-" * 66)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in args.sizes:
+            path = os.path.join(tmp, f"bench_{n}.db")
+            create_database(path, n, args.products, args.users, rng)
+
+            for name in LOADERS:
+                if name == "legacy" and n > args.legacy_max:
+                    print(f"{n:>10} | {name:>9} | {'skip':>9} | {'-':>13} | {'-':>12}")
+                    continue
+                result = measure(name, path)
+                print(
+                    f"{n:>10} | {name:>9} | {result['seconds']:9.1f} | {result['peak_mb']:13.0f} | "
+                    f"{result['peak_mb'] / (n / 1e6):12.0f}"
+                )
+            os.remove(path)
+
+
+if __name__ == "__main__":
+    main()